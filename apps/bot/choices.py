@@ -0,0 +1,8 @@
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+
+class OutboxStatusChoices(models.TextChoices):
+    PENDING = "pending", _("В очереди")
+    SENT = "sent", _("Отправлено")
+    FAILED = "failed", _("Ошибка")
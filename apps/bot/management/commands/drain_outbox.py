@@ -0,0 +1,72 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from apps.bot.choices import OutboxStatusChoices
+from apps.bot.models import OutboxMessage
+
+
+class Command(BaseCommand):
+    help = "Deliver pending outbox messages in batches, retrying failures with exponential backoff"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=20)
+        parser.add_argument("--max-attempts", type=int, default=8)
+        parser.add_argument("--backoff", type=float, default=5, help="Base delay in seconds, doubled per attempt")
+        parser.add_argument("--max-backoff", type=float, default=3600)
+        parser.add_argument("--lease", type=float, default=120, help="Seconds a claimed message stays hidden")
+        parser.add_argument("--poll-interval", type=float, default=2)
+        parser.add_argument("--transport", default=settings.OUTBOX_TRANSPORT)
+        parser.add_argument("--api-url", default=None, help="Override the transport API url, e.g. a local stub")
+        parser.add_argument("--once", action="store_true", help="Drain what is due now and exit")
+
+    def handle(self, *args, **options):
+        self.options = options
+        transport_kwargs = {"api_url": options["api_url"]} if options["api_url"] else {}
+        self.transport = import_string(options["transport"])(**transport_kwargs)
+        while True:
+            batch = self.claim_batch()
+            for outbox_message in batch:
+                self.deliver(outbox_message)
+            if options["once"] and not batch:
+                break
+            if not batch:
+                time.sleep(options["poll_interval"])
+
+    def claim_batch(self):
+        # Claimed rows are pushed forward by the lease, so a crashed worker's batch is retried by another one.
+        now = timezone.now()
+        with transaction.atomic():
+            batch = list(
+                OutboxMessage.objects.select_for_update(skip_locked=True)
+                .filter(status=OutboxStatusChoices.PENDING, next_attempt_at__lte=now)
+                .order_by("next_attempt_at")[:self.options["batch_size"]]
+            )
+            OutboxMessage.objects.filter(pk__in=[outbox_message.pk for outbox_message in batch]).update(
+                next_attempt_at=now + timedelta(seconds=self.options["lease"])
+            )
+        return batch
+
+    def deliver(self, outbox_message):
+        outbox_message.attempts += 1
+        try:
+            self.transport.send(outbox_message)
+        except Exception as e:
+            outbox_message.last_error = repr(e)
+            if outbox_message.attempts >= self.options["max_attempts"]:
+                outbox_message.status = OutboxStatusChoices.FAILED
+            else:
+                delay = min(self.options["backoff"] * 2 ** (outbox_message.attempts - 1), self.options["max_backoff"])
+                outbox_message.next_attempt_at = timezone.now() + timedelta(seconds=delay)
+            self.stderr.write(f"Outbox message {outbox_message.pk} failed: {outbox_message.last_error}")
+        else:
+            outbox_message.status = OutboxStatusChoices.SENT
+            outbox_message.sent_at = timezone.now()
+            outbox_message.last_error = ""
+        outbox_message.save(update_fields=["attempts", "status", "next_attempt_at", "last_error", "sent_at",
+                                           "updated_at"])
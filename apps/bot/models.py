@@ -0,0 +1,30 @@
+from django.db import models
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+from apps.bot.choices import OutboxStatusChoices
+from apps.common.model import BaseModel
+
+
+class OutboxMessage(BaseModel):
+    order = models.ForeignKey(
+        "product.Order", verbose_name=_("Order"), on_delete=models.CASCADE, related_name="outbox_messages"
+    )
+    message = models.TextField(verbose_name=_("Message"))
+    status = models.CharField(max_length=250, verbose_name=_("Status"), choices=OutboxStatusChoices.choices,
+                              default=OutboxStatusChoices.PENDING)
+    attempts = models.PositiveIntegerField(default=0, verbose_name=_("Attempts"))
+    next_attempt_at = models.DateTimeField(default=timezone.now, verbose_name=_("Next attempt at"))
+    last_error = models.TextField(blank=True, verbose_name=_("Last error"))
+    sent_at = models.DateTimeField(blank=True, null=True, verbose_name=_("Sent at"))
+
+    def __str__(self):
+        return f"{self.order_id}: {self.status}"
+
+    class Meta:
+        verbose_name = _("Outbox Message")
+        verbose_name_plural = _("Outbox Messages")
+        indexes = [
+            models.Index(fields=["next_attempt_at"], name="outbox_pending_idx",
+                         condition=models.Q(status=OutboxStatusChoices.PENDING)),
+        ]
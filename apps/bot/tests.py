@@ -0,0 +1,89 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from apps.bot.choices import OutboxStatusChoices
+from apps.bot.models import OutboxMessage
+from apps.bot.utils import FakeTransport, TelegramTransport
+from apps.product.models import Cart, CartItem, Category, Order, ParentCategory, Product
+
+
+class DrainOutboxTests(TestCase):
+    def setUp(self):
+        parent = ParentCategory.objects.create(title="Light", slug="light")
+        category = Category.objects.create(title="Lamps", slug="lamps", parent=parent)
+        product = Product.objects.create(title="Lamp", slug="lamp", category=category, price=10, in_stock_count=5)
+        cart = Cart.objects.create(fingerprint="fp")
+        CartItem.objects.create(cart=cart, product=product)
+        order = Order.objects.create(cart=cart, name="Buyer", phone="1")
+        self.outbox_message = OutboxMessage.objects.get(order=order)
+
+    def drain(self, transport, *args):
+        with mock.patch("apps.bot.management.commands.drain_outbox.import_string", return_value=lambda: transport):
+            call_command("drain_outbox", "--once", *args, stderr=StringIO())
+        self.outbox_message.refresh_from_db()
+
+    def test_delivers_pending_messages(self):
+        transport = FakeTransport()
+        self.drain(transport)
+        self.assertEqual(transport.sent, [self.outbox_message.pk])
+        self.assertEqual(self.outbox_message.status, OutboxStatusChoices.SENT)
+        self.assertEqual(self.outbox_message.attempts, 1)
+        self.assertIsNotNone(self.outbox_message.sent_at)
+
+    def test_failures_back_off_exponentially_until_max_attempts(self):
+        transport = FakeTransport(failures=3)
+        delays = []
+        for _ in range(3):
+            started = timezone.now()
+            self.drain(transport, "--backoff", "10", "--max-attempts", "3")
+            delays.append(round((self.outbox_message.next_attempt_at - started).total_seconds(), -1))
+            # Make the retry due now instead of waiting for it.
+            OutboxMessage.objects.filter(pk=self.outbox_message.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(delays[:2], [10, 20])
+        self.assertEqual(self.outbox_message.status, OutboxStatusChoices.FAILED)
+        self.assertEqual(self.outbox_message.attempts, 3)
+        self.assertIn("Fake transport failure", self.outbox_message.last_error)
+        self.drain(transport)
+        self.assertEqual(transport.sent, [])
+
+    def test_claimed_messages_are_retried_once_the_lease_expires(self):
+        transport = FakeTransport()
+        with mock.patch("apps.bot.management.commands.drain_outbox.Command.deliver"):
+            self.drain(transport, "--lease", "60")
+        # A worker claimed the message and died before delivering it: hidden until the lease runs out.
+        self.assertGreater(self.outbox_message.next_attempt_at, timezone.now() + timedelta(seconds=50))
+        self.drain(transport)
+        self.assertEqual(transport.sent, [])
+        OutboxMessage.objects.filter(pk=self.outbox_message.pk).update(next_attempt_at=timezone.now())
+        self.drain(transport)
+        self.assertEqual(transport.sent, [self.outbox_message.pk])
+        self.assertEqual(self.outbox_message.status, OutboxStatusChoices.SENT)
+
+
+class TelegramTransportTests(TestCase):
+    def setUp(self):
+        parent = ParentCategory.objects.create(title="Light", slug="light")
+        category = Category.objects.create(title="Lamps", slug="lamps", parent=parent)
+        product = Product.objects.create(title="Lamp", slug="lamp", category=category, price=10, in_stock_count=5)
+        cart = Cart.objects.create(fingerprint="fp")
+        CartItem.objects.create(cart=cart, product=product)
+        self.outbox_message = OutboxMessage.objects.get(order=Order.objects.create(cart=cart, name="Buyer", phone="1"))
+
+    @override_settings(TELEGRAM_BOT_TOKEN="123:secret", TELEGRAM_CHANNEL_ID="-100")
+    def test_sends_with_the_configured_bot_and_channel(self):
+        with mock.patch("apps.bot.utils.requests.post") as post:
+            TelegramTransport(api_url="http://telegram.local").send(self.outbox_message)
+        self.assertEqual(post.call_args.args, ("http://telegram.local/bot123:secret/sendDocument",))
+        self.assertEqual(post.call_args.kwargs["data"]["chat_id"], "-100")
+
+    @override_settings(TELEGRAM_BOT_TOKEN="", TELEGRAM_CHANNEL_ID="-100")
+    def test_refuses_to_send_without_a_token(self):
+        with mock.patch("apps.bot.utils.requests.post") as post, self.assertRaises(ImproperlyConfigured):
+            TelegramTransport().send(self.outbox_message)
+        post.assert_not_called()
@@ -1,14 +1,21 @@
 import os
 from pathlib import Path
 
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
 from apps.product.models import Order
 import pandas as pd
 import requests
 
 
-def bot_send_message(order_id, message):
-    token = "6138093434:AAH4QgpH-svw8Q8F3MLW5k0oEeyHYJyznT8"
-    channel_id = "-1001600409662"
+def bot_send_message(order_id, message, api_url=None, timeout=None):
+    token = settings.TELEGRAM_BOT_TOKEN
+    channel_id = settings.TELEGRAM_CHANNEL_ID
+    if not token or not channel_id:
+        raise ImproperlyConfigured("Set TELEGRAM_BOT_TOKEN and TELEGRAM_CHANNEL_ID to send order notifications.")
+    api_url = api_url or settings.TELEGRAM_API_URL
+    timeout = timeout or settings.TELEGRAM_TIMEOUT
     if order_id:
         order = Order.objects.get(id=order_id)
         # create excel file
@@ -16,11 +23,40 @@ def bot_send_message(order_id, message):
         excel_file_path = create_order_excel(order)
 
         # send excel file
-        files = {"document": open(excel_file_path, "rb")}
-        url = f"https://api.telegram.org/bot{token}/sendDocument"
-        params = {"chat_id": channel_id, "caption": message}
-        requests.post(url, data=params, files=files)
-        os.remove(excel_file_path)
+        try:
+            with open(excel_file_path, "rb") as document:
+                url = f"{api_url}/bot{token}/sendDocument"
+                params = {"chat_id": channel_id, "caption": message}
+                response = requests.post(url, data=params, files={"document": document}, timeout=timeout)
+                response.raise_for_status()
+        finally:
+            os.remove(excel_file_path)
+
+
+class TelegramTransport:
+    def __init__(self, api_url=None, timeout=None):
+        self.api_url = api_url
+        self.timeout = timeout
+
+    def send(self, outbox_message):
+        bot_send_message(outbox_message.order_id, outbox_message.message, self.api_url, self.timeout)
+
+
+class FakeTransport:
+    """
+    Keeps the messages it is given instead of sending them, for tests and local runs
+    (``drain_outbox --transport apps.bot.utils.FakeTransport``). The first ``failures`` sends raise.
+    """
+
+    def __init__(self, api_url=None, timeout=None, failures=0):
+        self.sent = []
+        self.failures = failures
+
+    def send(self, outbox_message):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("Fake transport failure")
+        self.sent.append(outbox_message.pk)
 
 
 def create_order_excel(order):
@@ -0,0 +1,173 @@
+import hashlib
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlencode, urlsplit
+
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from django.utils.translation import get_language
+from rest_framework.response import Response
+
+CACHE_TIMEOUT = 60 * 60
+LOCK_TIMEOUT = 10
+LOCK_WAIT = 0.05
+LOCK_ATTEMPTS = 100
+# Absolute URLs in cached payloads are built against this origin and rewritten to the requesting one when served,
+# so a payload cached for one Host header is never served with that host to others.
+ORIGIN = "http://__origin__"
+
+
+def version_key(namespace):
+    return f"{namespace}:version"
+
+
+def modified_key(namespace):
+    return f"{namespace}:modified"
+
+
+def get_cache_version(namespace):
+    version = cache.get(version_key(namespace))
+    if version is None:
+        cache.add(version_key(namespace), int(time.time() * 1000), timeout=None)
+        version = cache.get(version_key(namespace))
+    return version
+
+
+def get_last_modified(namespace):
+    """When the namespace version was last bumped. If that was evicted, nothing older than now can be vouched for."""
+    modified = cache.get(modified_key(namespace))
+    if modified is None:
+        cache.add(modified_key(namespace), time.time(), timeout=None)
+        modified = cache.get(modified_key(namespace))
+    return datetime.fromtimestamp(modified, tz=timezone.utc)
+
+
+def bump_cache_version(namespace):
+    cache.set(modified_key(namespace), time.time(), timeout=None)
+    try:
+        return cache.incr(version_key(namespace))
+    except ValueError:
+        # The version was evicted, a fresh timestamp can't collide with keys built from the old one.
+        version = int(time.time() * 1000)
+        cache.set(version_key(namespace), version, timeout=None)
+        return version
+
+
+def get_or_build(key, build, timeout=CACHE_TIMEOUT):
+    """
+    Return the cached value for ``key`` or build it, letting only one worker rebuild a cold key while the
+    others wait for its result.
+    """
+    value = cache.get(key)
+    if value is not None:
+        return value
+    lock_key = f"{key}:lock"
+    for _ in range(LOCK_ATTEMPTS):
+        if cache.add(lock_key, 1, LOCK_TIMEOUT):
+            try:
+                value = build()
+                cache.set(key, value, timeout)
+                return value
+            finally:
+                cache.delete(lock_key)
+        time.sleep(LOCK_WAIT)
+        value = cache.get(key)
+        if value is not None:
+            return value
+    return build()
+
+
+class OriginRequest:
+    """Wraps a request so that serializers build absolute URLs against ``ORIGIN`` instead of its host."""
+
+    def __init__(self, request=None):
+        self._request = request
+
+    def build_absolute_uri(self, location=None):
+        if location is None:
+            location = self._request.get_full_path() if self._request else "/"
+        return location if urlsplit(location).scheme else ORIGIN + location
+
+    def __getattr__(self, name):
+        return getattr(self._request, name)
+
+
+def get_origin(request):
+    return request.build_absolute_uri("/")[:-1]
+
+
+def rewrite_origin(data, origin):
+    """A copy of serialized ``data`` with ``ORIGIN`` replaced by ``origin`` in every string."""
+    if isinstance(data, str):
+        return data.replace(ORIGIN, origin)
+    if isinstance(data, dict):
+        return {key: rewrite_origin(value, origin) for key, value in data.items()}
+    if isinstance(data, list):
+        return [rewrite_origin(value, origin) for value in data]
+    return data
+
+
+class CachedListMixin:
+    """
+    Cache the serialized ``list()`` payload under a versioned key built from the namespace, active language and
+    query params. Writes bump the namespace version (see ``bump_cache_version``) instead of deleting keys. The
+    payload is serialized against ``ORIGIN`` and gets the requesting origin on the way out.
+    """
+    cache_namespace = None
+    cache_timeout = CACHE_TIMEOUT
+
+    def get_cache_key(self, request):
+        query = urlencode(sorted(request.query_params.lists()), doseq=True)
+        version = get_cache_version(self.cache_namespace)
+        return f"{self.cache_namespace}:{version}:{get_language()}:{request.path}?{query}"
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["request"] = OriginRequest(context["request"])
+        return context
+
+    def list(self, request, *args, **kwargs):
+        data = get_or_build(
+            self.get_cache_key(request),
+            lambda: super(CachedListMixin, self).list(request, *args, **kwargs).data,
+            self.cache_timeout,
+        )
+        return Response(self.personalize(rewrite_origin(data, get_origin(request))))
+
+    def personalize(self, data):
+        return data
+
+
+class ConditionalGetMixin:
+    """
+    ETag and Last-Modified for GET. ``get_validators`` returns the values the ETag is hashed from and the
+    Last-Modified datetime (either may be None); by default the ``cache_namespace`` version and the time it was
+    bumped. A matching ``If-None-Match`` or ``If-Modified-Since`` gets a 304 before the view queries or
+    serializes anything. The active language is part of every ETag, so translations never share one.
+    """
+    cache_namespace = None
+    vary_headers = ("Accept-Language",)
+
+    def get_validators(self, request, *args, **kwargs):
+        if self.cache_namespace is None:
+            return None, None
+        return [self.cache_namespace, get_cache_version(self.cache_namespace)], get_last_modified(self.cache_namespace)
+
+    def get(self, request, *args, **kwargs):
+        parts, last_modified = self.get_validators(request, *args, **kwargs)
+        etag = None
+        if parts is not None:
+            etag = quote_etag(hashlib.md5(":".join(map(str, [get_language(), *parts])).encode()).hexdigest())
+        # HTTP dates have whole seconds, compare in the same unit.
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            if etag:
+                response.headers["ETag"] = etag
+            if timestamp:
+                response.headers["Last-Modified"] = http_date(timestamp)
+            patch_vary_headers(response, self.vary_headers)
+        return response
@@ -0,0 +1,142 @@
+import hashlib
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import FileResponse, Http404
+from PIL import Image, ImageOps
+
+FORMATS = {"webp": ("WEBP", "image/webp"), "jpeg": ("JPEG", "image/jpeg")}
+ORIENTATION_TAG = 0x0112
+DERIVATIVE_NAME = re.compile(r"^(?P<source>.+)/(?P<digest>[0-9a-f]{16})-(?P<width>\d+)w\.(?P<format>webp|jpeg)$")
+SOURCE_INFO_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=SOURCE_INFO_CACHE_SIZE)
+def get_source_info(name):
+    """
+    Content hash and width of an uploaded image, kept in the cache and in the process. ``schedule_derivatives``
+    reads them when the upload is committed, and ``generate_image_derivatives`` for older images, so serializers
+    find them cached. Upload names are unique, so a name never points at different content; the hash only guards
+    against files replaced by hand.
+    """
+    key = f"image-info:{name}"
+    info = cache.get(key)
+    if info is None:
+        info = read_source_info(name)
+        cache.set(key, info, timeout=None)
+    return info
+
+
+def read_source_info(name):
+    path = os.path.join(settings.MEDIA_ROOT, name)
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(chunk)
+    with Image.open(path) as image:
+        # EXIF orientations 5-8 are rotated by 90 degrees, so the visible width is the stored height.
+        width = image.height if image.getexif().get(ORIENTATION_TAG) in (5, 6, 7, 8) else image.width
+    return digest.hexdigest()[:16], width
+
+
+def derivative_name(name, digest, width, image_format):
+    return f"{settings.IMAGE_DERIVATIVE_DIR}/{name}/{digest}-{width}w.{image_format}"
+
+
+def get_widths(source_width):
+    # Never upscale: widths at or above the original collapse into one variant of the original size.
+    widths = [width for width in settings.IMAGE_DERIVATIVE_WIDTHS if width < source_width]
+    return widths + [source_width] if len(widths) < len(settings.IMAGE_DERIVATIVE_WIDTHS) else widths
+
+
+def generate_derivative(name, width, image_format):
+    digest, source_width = get_source_info(name)
+    target = os.path.join(settings.MEDIA_ROOT, derivative_name(name, digest, width, image_format))
+    if os.path.exists(target):
+        return target
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with Image.open(os.path.join(settings.MEDIA_ROOT, name)) as image:
+        image = ImageOps.exif_transpose(image)
+        if width < image.width:
+            image = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+        if image_format == "jpeg" and image.mode != "RGB":
+            image = image.convert("RGB")
+        elif image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "A" in image.getbands() or "transparency" in image.info else "RGB")
+        # Write next to the target and rename, so a concurrent reader never sees a half-written file.
+        temporary = f"{target}.{os.getpid()}.tmp"
+        image.save(temporary, FORMATS[image_format][0], quality=settings.IMAGE_DERIVATIVE_QUALITY)
+        os.replace(temporary, target)
+    return target
+
+
+def generate_derivatives(name):
+    digest, source_width = get_source_info(name)
+    return [
+        generate_derivative(name, width, image_format)
+        for width in get_widths(source_width) for image_format in FORMATS
+    ]
+
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=settings.IMAGE_DERIVATIVE_WORKERS)
+    return _executor
+
+
+def schedule_derivatives(field_file):
+    """Hash a committed upload right away, then render its variants in the worker pool."""
+    if not field_file:
+        return
+    try:
+        get_source_info(field_file.name)
+    except (OSError, ValueError):
+        return
+    get_executor().submit(generate_derivatives, field_file.name)
+
+
+def get_srcset(field_file, request=None):
+    """``{"webp": "<url> 320w, <url> 640w, ...", "jpeg": ...}`` for an image field, or None when it is empty."""
+    if not field_file:
+        return None
+    try:
+        digest, source_width = get_source_info(field_file.name)
+    except (OSError, ValueError):
+        return None
+    srcset = {}
+    for image_format in FORMATS:
+        variants = []
+        for width in get_widths(source_width):
+            url = settings.MEDIA_URL + derivative_name(field_file.name, digest, width, image_format)
+            variants.append(f"{request.build_absolute_uri(url) if request else url} {width}w")
+        srcset[image_format] = ", ".join(variants)
+    return srcset
+
+
+def serve_derivative(request, name):
+    """
+    Fallback for derivative URLs the web server could not find on disk: render the variant, store it under
+    MEDIA_ROOT and serve it. Every later request is answered by the web server straight from the file.
+    """
+    match = DERIVATIVE_NAME.match(name)
+    if not match or match["source"].startswith("/") or ".." in match["source"].split("/"):
+        raise Http404
+    try:
+        digest, source_width = get_source_info(match["source"])
+    except (OSError, ValueError):
+        raise Http404
+    width = int(match["width"])
+    if digest != match["digest"] or width not in get_widths(source_width):
+        raise Http404
+    path = generate_derivative(match["source"], width, match["format"])
+    response = FileResponse(open(path, "rb"), content_type=FORMATS[match["format"]][1])
+    response["Cache-Control"] = "public, max-age=31536000, immutable"
+    return response
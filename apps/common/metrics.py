@@ -0,0 +1,238 @@
+import logging
+import re
+import threading
+import time
+import traceback
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+from rest_framework.renderers import JSONRenderer
+
+logger = logging.getLogger("apps.metrics")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+IN_LIST = re.compile(r"IN \((?:%s, )*%s\)")
+
+_current = ContextVar("request_metrics", default=None)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    """
+    Per-process metrics keyed by view. Each worker exposes its own numbers, Prometheus tells them apart by the
+    scraped instance.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = Counter()
+        self.latency = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+        self.queries = defaultdict(lambda: Histogram(QUERY_COUNT_BUCKETS))
+        self.db_time = Counter()
+        self.serializer_time = Counter()
+        self.response_size = Counter()
+
+    def record(self, view, method, status, stats):
+        with self.lock:
+            self.requests[(view, method, status)] += 1
+            self.latency[(view, method)].observe(stats.duration)
+            self.queries[(view, method)].observe(stats.query_count)
+            self.db_time[(view, method)] += stats.db_time
+            self.serializer_time[(view, method)] += stats.serializer_time
+            self.response_size[(view, method)] += stats.response_size
+
+    def render(self):
+        lines = []
+
+        def labels(view, method, **extra):
+            pairs = {"view": view, "method": method, **extra}
+            return "{" + ",".join(f'{key}="{escape(value)}"' for key, value in pairs.items()) + "}"
+
+        def counter(name, help_text, values):
+            lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} counter"])
+            for key, value in sorted(values.items()):
+                extra = {"status": key[2]} if len(key) > 2 else {}
+                lines.append(f"{name}{labels(key[0], key[1], **extra)} {value}")
+
+        def histogram(name, help_text, values):
+            lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} histogram"])
+            for (view, method), item in sorted(values.items()):
+                for bound, count in zip(item.buckets, item.counts):
+                    lines.append(f"{name}_bucket{labels(view, method, le=bound)} {count}")
+                lines.append(f"{name}_bucket{labels(view, method, le='+Inf')} {item.count}")
+                lines.append(f"{name}_sum{labels(view, method)} {item.sum}")
+                lines.append(f"{name}_count{labels(view, method)} {item.count}")
+
+        with self.lock:
+            counter("http_requests_total", "Requests by view, method and status.", self.requests)
+            histogram("http_request_duration_seconds", "Request latency.", self.latency)
+            histogram("db_queries_per_request", "Database queries issued by one request.", self.queries)
+            counter("db_query_duration_seconds_total", "Time spent in database queries.", self.db_time)
+            counter("serializer_duration_seconds_total", "Time spent building serializer data and rendering it.",
+                    self.serializer_time)
+            counter("http_response_size_bytes_total", "Bytes of response bodies.", self.response_size)
+        return "\n".join(lines) + "\n"
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+registry = Registry()
+
+
+class RequestStats:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.duration = 0
+        self.query_count = 0
+        self.db_time = 0
+        self.serializer_time = 0
+        self.response_size = 0
+        self.in_serializer = False
+        self.shapes = defaultdict(list)
+
+
+def record_query(execute, sql, params, many, context):
+    # Installed on every connection. The stats live in a context variable, which asgiref copies into the worker
+    # threads of sync_to_async, so queries of async views are attributed to their request too.
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.query_count += 1
+        stats.db_time += time.perf_counter() - start
+        if settings.N_PLUS_ONE_DETECTION:
+            stats.shapes[IN_LIST.sub("IN (...)", sql)].append(call_site())
+
+
+def install_query_recorder(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def call_site():
+    # The innermost frame of our own code, which is where the repeated query was triggered from.
+    for frame in reversed(traceback.extract_stack()):
+        if frame.filename.startswith(str(settings.BASE_DIR)) and "/site-packages/" not in frame.filename \
+                and not frame.filename.endswith("apps/common/metrics.py"):
+            return f"{frame.filename}:{frame.lineno} in {frame.name}"
+    return "unknown"
+
+
+@contextmanager
+def timed_serialization():
+    """
+    Count the time spent in the block as serializer time of the current request, if any. Nested blocks (a
+    serializer inside another one, or inside a renderer) are only counted once.
+    """
+    stats = _current.get()
+    if stats is None or stats.in_serializer:
+        yield
+        return
+    stats.in_serializer = True
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.serializer_time += time.perf_counter() - start
+        stats.in_serializer = False
+
+
+class TimedJSONRenderer(JSONRenderer):
+    """The default DRF renderer, timing every response body it renders."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with timed_serialization():
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+class MetricsMiddleware:
+    """
+    Records latency, query count, database time, serializer time and response size of every request under its
+    resolved URL name. Serializer time is what the serializers of ``apps.common.serializer`` and the renderers
+    report through ``timed_serialization``. With N_PLUS_ONE_DETECTION on, it also logs every SQL shape that ran at
+    least N_PLUS_ONE_THRESHOLD times in one request, together with the lines that issued it.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        connection_created.connect(install_query_recorder)
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(connection)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if request.path == "/metrics":
+            return self.get_response(request)
+        stats = RequestStats()
+        token = _current.set(stats)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.record(request, response, stats)
+
+    async def __acall__(self, request):
+        if request.path == "/metrics":
+            return await self.get_response(request)
+        stats = RequestStats()
+        token = _current.set(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.record(request, response, stats)
+
+    def record(self, request, response, stats):
+        stats.duration = time.perf_counter() - stats.start
+        if not response.streaming:
+            stats.response_size = len(response.content)
+        match = request.resolver_match
+        view = (match.view_name or match.route) if match else "unresolved"
+        registry.record(view, request.method, response.status_code, stats)
+        if settings.N_PLUS_ONE_DETECTION:
+            self.report_repeated_queries(view, stats)
+        return response
+
+    def report_repeated_queries(self, view, stats):
+        for sql, sites in stats.shapes.items():
+            if len(sites) >= settings.N_PLUS_ONE_THRESHOLD:
+                top = ", ".join(f"{site} ({count}x)" for site, count in Counter(sites).most_common(3))
+                logger.warning("N+1 in %s: %d identical queries from %s: %s", view, len(sites), top, sql[:300])
+
+
+def metrics_view(request):
+    if request.META.get("REMOTE_ADDR") not in settings.METRICS_ALLOWED_IPS:
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,138 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def invert(field):
+    return field[1:] if field.startswith("-") else f"-{field}"
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination over a composite key such as ``(created_at, id)``.
+
+    The cursor holds the key of the last (or first) row of the page and the next page is fetched with a
+    ``WHERE key < cursor`` seek, so page N costs the same as page 1 as long as an index matches the ordering.
+    Views can pick the key per request with ``get_keyset_ordering()``; the last field must be unique.
+    """
+    cursor_query_param = "cursor"
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    ordering = ("-created_at", "-id")
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset, page_size = self.get_page_queryset(queryset, request, view)
+        return self.set_page(list(queryset[:page_size + 1]), page_size)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        queryset, page_size = self.get_page_queryset(queryset, request, view)
+        return self.set_page([item async for item in queryset[:page_size + 1]], page_size)
+
+    def get_page_queryset(self, queryset, request, view):
+        self.request = request
+        page_size = self.get_page_size(request)
+        self.key = self.get_ordering(view)
+        self.cursor = self.decode_cursor(request)
+        self.reverse = bool(self.cursor and self.cursor["reverse"])
+        ordering = [invert(field) for field in self.key] if self.reverse else list(self.key)
+
+        queryset = queryset.order_by(*ordering)
+        if self.cursor:
+            queryset = queryset.filter(self.seek(ordering, self.cursor["values"]))
+        return queryset, page_size
+
+    def set_page(self, results, page_size):
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if self.reverse:
+            results.reverse()
+
+        self.has_next = has_more if not self.reverse else True
+        self.has_previous = has_more if self.reverse else self.cursor is not None
+        self.first_values = self.get_values(results[0]) if results else None
+        self.last_values = self.get_values(results[-1]) if results else None
+        return results
+
+    def get_paginated_data(self, data):
+        return OrderedDict([
+            ("next", self.get_next_link()),
+            ("previous", self.get_previous_link()),
+            ("results", data),
+        ])
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            page_size = self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def get_ordering(self, view):
+        get_keyset_ordering = getattr(view, "get_keyset_ordering", None)
+        if get_keyset_ordering is not None:
+            return tuple(get_keyset_ordering())
+        return self.ordering
+
+    def get_values(self, instance):
+        return [getattr(instance, field.lstrip("-")) for field in self.key]
+
+    def seek(self, ordering, values):
+        # ``first <= value`` is redundant with the OR below but lets the planner start an index range scan.
+        first = ordering[0].lstrip("-")
+        condition = Q(**{f"{first}__lte" if ordering[0].startswith("-") else f"{first}__gte": values[0]})
+        seek = Q()
+        for index, field in enumerate(ordering):
+            name = field.lstrip("-")
+            equal = {ordering[i].lstrip("-"): values[i] for i in range(index)}
+            seek |= Q(**equal, **{f"{name}__lt" if field.startswith("-") else f"{name}__gt": values[index]})
+        return condition & seek
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            cursor = json.loads(urlsafe_b64decode(encoded.encode("ascii")).decode("utf-8"))
+            if len(cursor["values"]) != len(self.key):
+                raise ValueError
+            return {"values": cursor["values"], "reverse": bool(cursor["reverse"])}
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, values, reverse):
+        cursor = json.dumps({"values": values, "reverse": reverse}, default=str)
+        encoded = urlsafe_b64encode(cursor.encode("utf-8")).decode("ascii")
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or self.last_values is None:
+            return None
+        return self.encode_cursor(self.last_values, False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if self.first_values is None:
+            return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+        return self.encode_cursor(self.first_values, True)
@@ -1,7 +1,26 @@
 from rest_framework import serializers
 
+from apps.common.images import get_srcset
+from apps.common.metrics import timed_serialization
 
-class ImageSerializer(serializers.ModelSerializer):
+
+class TimedSerializerMixin:
+    """Counts building the representation as serializer time of the request (see ``apps.common.metrics``)."""
+
+    def to_representation(self, instance):
+        with timed_serialization():
+            return super().to_representation(instance)
+
+
+class Serializer(TimedSerializerMixin, serializers.Serializer):
+    pass
+
+
+class ModelSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    pass
+
+
+class ImageSerializer(ModelSerializer):
     def to_representation(self, instance):
         try:
             request = self.context.get('request')
@@ -10,3 +29,13 @@ class ImageSerializer(serializers.ModelSerializer):
             return None
         except KeyError:
             print(self.parent)
+
+
+class ImageSrcsetSerializer(ModelSerializer):
+    def to_representation(self, instance):
+        return get_srcset(instance.image, self.context.get('request'))
+
+
+class SrcsetField(serializers.ReadOnlyField):
+    def to_representation(self, value):
+        return get_srcset(value, self.context.get('request'))
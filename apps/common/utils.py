@@ -1,11 +1,40 @@
+import re
+from functools import reduce
+from operator import or_
+
+from django.db.models import Q
 from django.utils.text import slugify
 
+SUFFIX = re.compile(r"-[0-9]+$")
+
 
 def generate_unique_slug(klass, field):
-    origin_slug = slugify(field)
-    unique_slug = origin_slug
-    numb = 1
-    while klass.objects.filter(slug=unique_slug).exists():
-        unique_slug = '%s-%d' % (origin_slug, numb)
-        numb += 1
-        return unique_slug
+    return allocate_unique_slugs(klass, [field])[0]
+
+
+def allocate_unique_slugs(klass, values):
+    """
+    Unique slugs for a batch of values: ``lamp``, then ``lamp-1``, ``lamp-2``... for the next values that slugify
+    to ``lamp``. The slugs already taken are read with one query for the whole batch, an equality test plus one
+    prefix match per distinct slug, all answered from the slug index.
+    """
+    max_length = klass._meta.get_field("slug").max_length
+    origins = [(slugify(value) or klass._meta.model_name)[:max_length - 8].strip("-") for value in values]
+    if not origins:
+        return []
+    unique = set(origins)
+    condition = reduce(or_, (Q(slug__startswith=f"{origin}-") for origin in unique), Q(slug__in=unique))
+    taken = {slug for slug in klass.objects.filter(condition).values_list("slug", flat=True)
+             if slug in unique or SUFFIX.sub("", slug) in unique}
+    next_number = {}
+    slugs = []
+    for origin in origins:
+        slug = origin
+        number = next_number.get(origin, 1)
+        while slug in taken:
+            slug = f"{origin}-{number}"
+            number += 1
+        next_number[origin] = number
+        taken.add(slug)
+        slugs.append(slug)
+    return slugs
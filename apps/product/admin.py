@@ -1,11 +1,16 @@
+import tempfile
+
 from django.contrib import admin
 
 # Register your models here.
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.contrib.admin.options import TabularInline
+from django.http import FileResponse, HttpResponseRedirect, StreamingHttpResponse
+from django.utils import timezone
 
+from .exports import stream_orders_csv, write_orders_xlsx
 from .models import (
-    Banner, Cart, CartItem, Category, Manufacturer, Order, ParentCategory,
+    Banner, Cart, CartItem, Category, InsufficientStock, Manufacturer, Order, ParentCategory,
     Product, ProductGallery
 )
 
@@ -55,7 +60,7 @@ class ProductAdmin(admin.ModelAdmin):
     search_fields = ("title", "manufacturer__title", "category__title", "product_code")
     prepopulated_fields = {"slug": ("title",)}
     autocomplete_fields = ("category", "manufacturer")
-    readonly_fields = ("views_count",)
+    readonly_fields = ("views_count", "sold_count")
     inlines = (ProductGalleryInline,)
 
 
@@ -66,23 +71,43 @@ class CartItemInline(admin.TabularInline):
 
 @admin.register(Cart)
 class CartAdmin(admin.ModelAdmin):
-    list_display = ("id", "fingerprint", "total_price")
+    list_display = ("id", "fingerprint", "items_count", "total_price")
     search_fields = ("fingerprint",)
-    readonly_fields = ("created_at", "updated_at")
+    readonly_fields = ("created_at", "updated_at", "items_count", "total_price", "sale_total_price")
     inlines = (CartItemInline,)
 
-    @admin.display(description="Total Price")
-    def total_price(self, obj):
-        return obj.total_price
-
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     list_display = ("name", "phone", "total_price", "status")
     search_fields = ("name", "phone")
     list_filter = ("status",)
-    readonly_fields = ("created_at", "updated_at")
+    readonly_fields = ("in_stock_subtracted", "stock_lines", "sold_products", "created_at", "updated_at")
+    list_select_related = ("cart",)
+    date_hierarchy = "created_at"
+    actions = ("export_xlsx", "export_csv")
 
     @admin.display(description="Total Price")
     def total_price(self, obj):
         return obj.cart.total_price
+
+    def changeform_view(self, request, object_id=None, form_url="", extra_context=None):
+        # Moving an order out of CANCELLED reserves its stock again, which can fail; nothing of the save is kept.
+        try:
+            return super().changeform_view(request, object_id, form_url, extra_context)
+        except InsufficientStock as error:
+            self.message_user(request, "; ".join(error.messages), messages.ERROR)
+            return HttpResponseRedirect(request.get_full_path())
+
+    @admin.action(description="Export selected orders to XLSX")
+    def export_xlsx(self, request, queryset):
+        file = tempfile.TemporaryFile()
+        write_orders_xlsx(queryset, file)
+        file.seek(0)
+        return FileResponse(file, as_attachment=True, filename=f"orders_{timezone.now():%Y%m%d_%H%M}.xlsx")
+
+    @admin.action(description="Export selected orders to CSV")
+    def export_csv(self, request, queryset):
+        response = StreamingHttpResponse(stream_orders_csv(queryset), content_type="text/csv")
+        response["Content-Disposition"] = f'attachment; filename="orders_{timezone.now():%Y%m%d_%H%M}.csv"'
+        return response
@@ -0,0 +1,193 @@
+import asyncio
+import json
+import weakref
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import prefetch_related_objects
+from django.http import HttpResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from rest_framework.request import Request
+
+from apps.common.metrics import TimedJSONRenderer
+from apps.common.pagination import KeysetPagination
+from apps.product.models import Cart, CartItem, LastSeenProduct, SavedProduct, SearchHistory
+from apps.product.personalization import Personalization
+from apps.product.serializer import CartItemListSerializer, CartSerializer, LastSeenProductSerializer, \
+    SavedProductCreateSerializer, SavedProductSerializer, SearchHistorySerializer
+
+
+_db_slots = weakref.WeakKeyDictionary()
+
+
+def get_db_slots():
+    # One semaphore per event loop; asyncio primitives can't be shared between loops.
+    loop = asyncio.get_running_loop()
+    if loop not in _db_slots:
+        _db_slots[loop] = asyncio.Semaphore(settings.ASYNC_DB_CONCURRENCY)
+    return _db_slots[loop]
+
+
+@method_decorator(transaction.non_atomic_requests, name="dispatch")
+class AsyncView(View):
+    """
+    Base of the async counterparts of the fingerprint-scoped views, served when running under ASGI.
+
+    The queries go through the async ORM; everything a serializer touches (relations, galleries, the saved/in-cart
+    id sets) is loaded before ``.data`` is built, since serializers can't query the database from a coroutine.
+    Responses are rendered with the synchronous views' JSON renderer, so they match them.
+
+    Every async ORM call runs in a thread with its own database connection, so at most ASYNC_DB_CONCURRENCY
+    requests per worker touch the database at once; the rest wait on the event loop, which costs nothing, instead
+    of running Postgres out of connections.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        async with get_db_slots():
+            try:
+                return await super().dispatch(request, *args, **kwargs)
+            finally:
+                # Hand the connection back together with the slot rather than once the response has been sent.
+                await sync_to_async(close_old_connections)()
+
+    @staticmethod
+    def fingerprint(request):
+        return request.headers.get("Fingerprint")
+
+    @staticmethod
+    def render(data, status=200):
+        return HttpResponse(TimedJSONRenderer().render(data), status=status, content_type="application/json")
+
+    async def create(self, request, serializer_class):
+        """Validate and save like DRF's CreateAPIView, with the same 400 bodies; validators may query."""
+        serializer = serializer_class(data=self.parse(request))
+        if not await sync_to_async(serializer.is_valid)():
+            return self.render(serializer.errors, status=400)
+        await sync_to_async(serializer.save)()
+        return self.render(serializer.data, status=201)
+
+    @staticmethod
+    def parse(request):
+        try:
+            data = json.loads(request.body or b"{}")
+        except ValueError:
+            data = request.POST.dict()
+        return data if isinstance(data, dict) else {}
+
+
+class AsyncProductListMixin:
+    serializer_class = None
+    prefetch = "product__gallery"
+
+    def get_queryset(self, request, **kwargs):
+        raise NotImplementedError
+
+    async def get(self, request, *args, **kwargs):
+        paginator = KeysetPagination()
+        page = await paginator.apaginate_queryset(self.get_queryset(request, **kwargs), Request(request), self)
+        await sync_to_async(prefetch_related_objects)(page, self.prefetch)
+        await Personalization.for_request(request).aload()
+        data = self.serializer_class(page, many=True, context={"request": request}).data
+        return self.render(paginator.get_paginated_data(data))
+
+
+class AsyncLastSeenProductListView(AsyncProductListMixin, AsyncView):
+    serializer_class = LastSeenProductSerializer
+
+    def get_queryset(self, request, **kwargs):
+        fingerprint = self.fingerprint(request)
+        if fingerprint:
+            return (
+                LastSeenProduct.objects.filter(fingerprint=fingerprint)
+                .select_related("product__manufacturer", "product__category")
+            )
+        return LastSeenProduct.objects.none()
+
+
+class AsyncSavedProductListView(AsyncProductListMixin, AsyncView):
+    serializer_class = SavedProductSerializer
+
+    def get_queryset(self, request, **kwargs):
+        fingerprint = self.fingerprint(request)
+        if fingerprint:
+            return (
+                SavedProduct.objects.filter(fingerprint=fingerprint)
+                .select_related("product__manufacturer", "product__category")
+            )
+        return SavedProduct.objects.none()
+
+
+class AsyncCartItemListView(AsyncProductListMixin, AsyncView):
+    serializer_class = CartItemListSerializer
+
+    def get_queryset(self, request, cart_id=None, **kwargs):
+        return CartItem.objects.filter(cart_id=cart_id).select_related("product__manufacturer", "product__category")
+
+
+class AsyncSavedProductCreateView(AsyncView):
+    async def post(self, request, *args, **kwargs):
+        return await self.create(request, SavedProductCreateSerializer)
+
+
+class AsyncSavedProductDeleteView(AsyncView):
+    async def delete(self, request, product_id=None, *args, **kwargs):
+        fingerprint = self.fingerprint(request)
+        if fingerprint:
+            saved_product = await SavedProduct.objects.filter(fingerprint=fingerprint, product_id=product_id).afirst()
+            if saved_product:
+                await saved_product.adelete()
+                return self.render({"status": "deleted"})
+            return self.render({"status": "not found"})
+        return self.render({"status": "please provide fingerprint"})
+
+
+class AsyncCartListView(AsyncView):
+    async def get(self, request, *args, **kwargs):
+        fingerprint = self.fingerprint(request)
+        carts = []
+        if fingerprint:
+            carts = [cart async for cart in Cart.objects.filter(fingerprint=fingerprint).order_by("-created_at")]
+        return self.render(CartSerializer(carts, many=True).data)
+
+
+class AsyncCartCreateView(AsyncView):
+    async def post(self, request, *args, **kwargs):
+        return await self.create(request, CartSerializer)
+
+
+class AsyncCartTotalPriceView(AsyncView):
+    async def get(self, request, cart_id=None, *args, **kwargs):
+        if self.fingerprint(request):
+            cart = await Cart.objects.filter(pk=cart_id).afirst()
+            if cart:
+                return self.render(cart.get_summary())
+        return self.render({"total_price": 0, "sale_total_price": 0, "total_savings": 0, 'quantity': 0})
+
+
+class AsyncSearchHistoryListView(AsyncView):
+    async def get(self, request, *args, **kwargs):
+        fingerprint = self.fingerprint(request)
+        queryset = SearchHistory.objects.filter(fingerprint=fingerprint) if fingerprint \
+            else SearchHistory.objects.none()
+        paginator = KeysetPagination()
+        page = await paginator.apaginate_queryset(queryset, Request(request), self)
+        return self.render(paginator.get_paginated_data(SearchHistorySerializer(page, many=True).data))
+
+
+class AsyncSearchHistoryCreateView(AsyncView):
+    async def post(self, request, *args, **kwargs):
+        return await self.create(request, SearchHistorySerializer)
+
+
+class AsyncSearchHistoryDeleteView(AsyncView):
+    async def delete(self, request, pk=None, *args, **kwargs):
+        fingerprint = self.fingerprint(request)
+        if fingerprint:
+            search_history = await SearchHistory.objects.filter(fingerprint=fingerprint, pk=pk).afirst()
+            if search_history:
+                await search_history.adelete()
+                return self.render({"status": "deleted"})
+            return self.render({"status": "not found"})
+        return self.render({"status": "please provide fingerprint"})
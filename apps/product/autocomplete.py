@@ -0,0 +1,228 @@
+import heapq
+import threading
+import time
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Sum
+from django.utils.translation import get_language
+
+from apps.common.cache import bump_cache_version, get_cache_version
+from apps.product.models import Category, Manufacturer, Product
+from apps.product.popular_searches import normalize_query
+
+CACHE_NAMESPACE = "autocomplete"
+DEFAULT_LANGUAGE = ""
+
+
+def title_fields(model):
+    # {"": "title", "ru": "title_ru", ...}; the modeltranslation columns only exist once the model is registered.
+    fields = {DEFAULT_LANGUAGE: "title"}
+    for field in model._meta.concrete_fields:
+        if field.name.startswith("title_"):
+            fields[field.name[len("title_"):]] = field.name
+    return fields
+
+
+def index_keys(*values):
+    """Every word-start suffix of every value, so "led lamp" is found by both "le" and "la"."""
+    keys = set()
+    for value in values:
+        words = normalize_query(value or "").split()
+        for index in range(len(words)):
+            keys.add(" ".join(words[index:]))
+    return keys
+
+
+class AutocompleteIndex:
+    """
+    Prefix index over product, manufacturer and category titles kept in the process memory.
+
+    Each language has a sorted list of ``(key, kind, pk)`` tuples searched with ``bisect``. Narrow prefixes scan
+    their slice of the list; wide ones (one or two letters) walk the entries from the highest score down instead,
+    so a lookup never touches more than a few hundred entries. It is built on the first search, so starting a
+    worker or running a management command never reads the catalog for it.
+    """
+    kinds = {"product": Product, "manufacturer": Manufacturer, "category": Category}
+    scan_limit = 500
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.build_lock = threading.Lock()
+        self.keys = {}
+        self.entries = {}
+        self.ranked = []
+        self.ranked_dirty = False
+        self.version = None
+        self.checked_at = 0
+        self.built_at = 0
+        self.built = False
+
+    def build(self):
+        version = get_cache_version(CACHE_NAMESPACE)
+        keys, entries = {}, {}
+        scores = {
+            kind: dict(
+                Product.objects.filter(is_active=True, **{f"{kind}__isnull": False})
+                .values_list(f"{kind}_id").annotate(score=Sum("views_count"))
+            )
+            for kind in ("manufacturer", "category")
+        }
+        products = Product.objects.filter(is_active=True).values(
+            "pk", "slug", "product_code", "views_count", *title_fields(Product).values()
+        )
+        for product in products.iterator(chunk_size=5000):
+            self.add_entry(keys, entries, "product", product, product["views_count"], product["product_code"])
+        for kind in ("manufacturer", "category"):
+            model = self.kinds[kind]
+            extra = ("slug",) if kind == "category" else ()
+            for instance in model.objects.values("pk", *extra, *title_fields(model).values()).iterator():
+                self.add_entry(keys, entries, kind, instance, scores[kind].get(instance["pk"]) or 0)
+        for language_keys in keys.values():
+            language_keys.sort()
+        with self.lock:
+            self.keys, self.entries = keys, entries
+            self.ranked_dirty = True
+            self.version = version
+            self.checked_at = self.built_at = time.monotonic()
+            self.built = True
+
+    def add_entry(self, keys, entries, kind, row, score, *extra_values):
+        titles = {language: row[field] or row["title"] for language, field in title_fields(self.kinds[kind]).items()}
+        entry = {
+            "type": kind, "id": row["pk"], "slug": row.get("slug"), "titles": titles, "score": score, "keys": {},
+        }
+        for language, title in titles.items():
+            entry["keys"][language] = index_keys(title, *extra_values)
+            keys.setdefault(language, []).extend((key, kind, row["pk"]) for key in entry["keys"][language])
+        entries[(kind, row["pk"])] = entry
+
+    def update(self, kind, instance):
+        """Re-index one object after it was saved; inactive products are dropped from the index."""
+        with self.lock:
+            if not self.built:
+                return
+            previous = self.remove(kind, instance.pk)
+            if kind == "product" and not instance.is_active:
+                return
+            row = {"pk": instance.pk, "slug": getattr(instance, "slug", None)}
+            row.update({field: getattr(instance, field) for field in title_fields(self.kinds[kind]).values()})
+            if kind == "product":
+                score, extra = instance.views_count, (instance.product_code,)
+            else:
+                score, extra = previous["score"] if previous else 0, ()
+            entries = {}
+            self.add_entry({}, entries, kind, row, score, *extra)
+            entry = entries[(kind, instance.pk)]
+            for language, language_keys in entry["keys"].items():
+                target = self.keys.setdefault(language, [])
+                for key in language_keys:
+                    insort(target, (key, kind, instance.pk))
+            self.entries[(kind, instance.pk)] = entry
+            self.ranked_dirty = True
+
+    def remove(self, kind, pk):
+        with self.lock:
+            entry = self.entries.pop((kind, pk), None)
+            if entry is None:
+                return None
+            for language, language_keys in entry["keys"].items():
+                target = self.keys.get(language, [])
+                for key in language_keys:
+                    position = bisect_left(target, (key, kind, pk))
+                    if position < len(target) and target[position] == (key, kind, pk):
+                        del target[position]
+            self.ranked_dirty = True
+            return entry
+
+    def get_ranked(self):
+        if self.ranked_dirty:
+            self.ranked = sorted(self.entries.values(), key=lambda entry: entry["score"], reverse=True)
+            self.ranked_dirty = False
+        return self.ranked
+
+    def refresh(self):
+        """
+        Pick up saves made by other processes by rebuilding when the shared version moved on, and rebuild every
+        AUTOCOMPLETE_MAX_AGE seconds anyway since views_count is flushed with plain UPDATEs that send no signals.
+        Rebuilds after the first one run in a background thread.
+        """
+        now = time.monotonic()
+        if self.built and now - self.checked_at < settings.AUTOCOMPLETE_REFRESH_INTERVAL:
+            return
+        if self.built and now - self.built_at <= settings.AUTOCOMPLETE_MAX_AGE \
+                and get_cache_version(CACHE_NAMESPACE) == self.version:
+            self.checked_at = now
+            return
+        if not self.built:
+            # Only the first build makes requests wait, there is nothing to serve before it.
+            with self.build_lock:
+                if not self.built:
+                    self.build()
+            return
+        if not self.build_lock.acquire(blocking=False):
+            return
+        if time.monotonic() - self.checked_at < settings.AUTOCOMPLETE_REFRESH_INTERVAL:
+            # Another thread's rebuild finished in the meantime.
+            self.build_lock.release()
+            return
+        # Requests keep serving the old index until build() swaps the new one in. A failed rebuild is retried
+        # after the next refresh interval.
+        self.checked_at = now
+        threading.Thread(target=self.rebuild, name="autocomplete-rebuild", daemon=True).start()
+
+    def rebuild(self):
+        try:
+            self.build()
+        finally:
+            # The thread's own database connection, Django only closes request threads' ones.
+            connection.close()
+            self.build_lock.release()
+
+    def applied(self, version):
+        # A local change bumped the shared version; skip the rebuild unless another process changed it too.
+        with self.lock:
+            if self.version is not None and version == self.version + 1:
+                self.version = version
+
+    def search(self, prefix, limit=10, language=None):
+        self.refresh()
+        prefix = normalize_query(prefix)
+        if not prefix:
+            return []
+        with self.lock:
+            language = language if language in self.keys else DEFAULT_LANGUAGE
+            keys = self.keys.get(language, [])
+            start = bisect_left(keys, (prefix,))
+            end = bisect_left(keys, (prefix + "\uffff",), start)
+            if end - start <= self.scan_limit:
+                matches = {(kind, pk) for key, kind, pk in keys[start:end]}
+                found = heapq.nlargest(limit, (self.entries[match] for match in matches),
+                                       key=lambda entry: entry["score"])
+            else:
+                found = []
+                for entry in self.get_ranked():
+                    if any(key.startswith(prefix) for key in entry["keys"][language]):
+                        found.append(entry)
+                        if len(found) == limit:
+                            break
+            return [
+                {"type": entry["type"], "id": entry["id"], "slug": entry["slug"], "title": entry["titles"][language]}
+                for entry in found
+            ]
+
+
+autocomplete_index = AutocompleteIndex()
+
+
+def get_language_code():
+    return (get_language() or "").split("-")[0]
+
+
+def mark_autocomplete_changed(kind, instance=None, deleted=False):
+    if deleted:
+        autocomplete_index.remove(kind, instance.pk)
+    else:
+        autocomplete_index.update(kind, instance)
+    autocomplete_index.applied(bump_cache_version(CACHE_NAMESPACE))
@@ -0,0 +1,68 @@
+from django.db import connection
+from django.utils import timezone
+
+from apps.product.models import Cart, CartItem
+
+ADD = "add"
+SET = "set"
+REMOVE = "remove"
+OPERATIONS = (ADD, SET, REMOVE)
+CART_BATCH_MAX_OPERATIONS = 500
+
+
+def collapse_operations(operations):
+    """
+    Fold an ordered list of ``{"op", "product", "quantity"}`` operations into one final change per product:
+    ``(merge, quantity)`` where ``merge`` means the quantity is added to whatever the cart already holds, and a
+    ``(False, 0)`` change removes the item.
+    """
+    changes = {}
+    for operation in operations:
+        product_id, quantity = operation["product"], operation.get("quantity", 0)
+        merge, current = changes.get(product_id, (True, 0))
+        if operation["op"] == ADD:
+            changes[product_id] = (merge, current + quantity)
+        elif operation["op"] == SET:
+            changes[product_id] = (False, quantity)
+        else:
+            changes[product_id] = (False, 0)
+    return changes
+
+
+def upsert_cart_items(cart_id, rows, merge):
+    """Insert ``(product_id, quantity)`` rows into the cart, adding to or replacing the quantity of existing items."""
+    if not rows:
+        return
+    table = CartItem._meta.db_table
+    now = timezone.now()
+    values = ", ".join(["(%s, %s, %s, %s, %s)"] * len(rows))
+    quantity = f"{table}.quantity + EXCLUDED.quantity" if merge else "EXCLUDED.quantity"
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (cart_id, product_id, quantity, created_at, updated_at) VALUES {values} "
+            f"ON CONFLICT (cart_id, product_id) DO UPDATE SET quantity = {quantity}, updated_at = EXCLUDED.updated_at",
+            [value for product_id, count in rows for value in (cart_id, product_id, count, now, now)],
+        )
+
+
+def apply_cart_operations(cart, operations):
+    """
+    Apply add, set and remove operations to a cart with at most three statements plus one summary refresh,
+    however many products they touch. The caller runs this in a transaction holding a lock on the cart.
+    """
+    changes = collapse_operations(operations)
+    removed = [product_id for product_id, (merge, quantity) in changes.items() if not merge and not quantity]
+    added = [(product_id, quantity) for product_id, (merge, quantity) in changes.items() if merge and quantity]
+    replaced = [(product_id, quantity) for product_id, (merge, quantity) in changes.items() if not merge and quantity]
+    if removed:
+        # A plain DELETE: going through the ORM would fire the per-item summary refresh for every removed row.
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {CartItem._meta.db_table} WHERE cart_id = %s AND product_id = ANY(%s)",
+                [cart.pk, removed],
+            )
+    upsert_cart_items(cart.pk, added, merge=True)
+    upsert_cart_items(cart.pk, replaced, merge=False)
+    Cart.objects.filter(pk=cart.pk).refresh_summary()
+    cart.refresh_from_db(fields=["items_count", "total_price", "sale_total_price"])
+    return cart
@@ -0,0 +1,47 @@
+from django.db.models import Count, Prefetch, Q
+from django.utils.translation import get_language
+
+from apps.common.cache import OriginRequest, get_cache_version, get_or_build
+from apps.product.models import Category, ParentCategory
+from apps.product.serializer import ParentCategorySerializer
+
+CACHE_NAMESPACE = "category"
+
+
+class CategoryTree:
+    """
+    The whole category menu: parent categories with their children and active product counts, serialized once
+    per language and cache version.
+
+    Each process keeps the last tree it served; a request only reads the ``category`` version from the cache to
+    see whether it is still current. Category, ParentCategory and Product writes bump that version. A process
+    that finds its tree stale takes the new one from the cache, and only one of them rebuilds it from the database.
+    Icon URLs are built against ``ORIGIN``; callers rewrite them to the requesting origin.
+    """
+
+    def __init__(self):
+        self.trees = {}
+
+    def build(self):
+        categories = Category.objects.order_by("pk").annotate(
+            product_count=Count("product", filter=Q(product__is_active=True))
+        )
+        parents = (
+            ParentCategory.objects.order_by("pk")
+            .annotate(product_count=Count("categories__product", filter=Q(categories__product__is_active=True)))
+            .prefetch_related(Prefetch("categories", queryset=categories))
+        )
+        data = ParentCategorySerializer(parents, many=True, context={"request": OriginRequest()}).data
+        return [{**parent, "categories": [dict(category) for category in parent["categories"]]} for parent in data]
+
+    def get(self):
+        version = get_cache_version(CACHE_NAMESPACE)
+        language = get_language()
+        cached = self.trees.get(language)
+        if cached is None or cached[0] != version:
+            tree = get_or_build(f"{CACHE_NAMESPACE}:{version}:{language}:tree", self.build)
+            cached = self.trees[language] = (version, tree)
+        return cached[1]
+
+
+category_tree = CategoryTree()
@@ -0,0 +1,78 @@
+from decimal import Decimal
+
+import orjson
+from django.db.models import prefetch_related_objects
+from django.http import HttpResponse
+from django.utils.translation import get_language
+
+from apps.common.cache import ORIGIN, OriginRequest, get_origin
+from apps.common.metrics import timed_serialization
+from apps.product.models import ProductDocument
+from apps.product.serializer import ProductDocumentSerializer
+
+
+def get_stamp(product):
+    # Everything a document shows comes from these three rows, and every write to them (gallery, stock and sold
+    # count changes included) moves one of the timestamps.
+    return "|".join(
+        instance.updated_at.isoformat() if instance else ""
+        for instance in (product, product.category, product.manufacturer)
+    )
+
+
+def encode_default(value):
+    # DRF's encoder writes decimals as numbers.
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError
+
+
+def render_documents(products):
+    prefetch_related_objects(products, "gallery")
+    with timed_serialization():
+        data = ProductDocumentSerializer(products, many=True, context={"request": OriginRequest()}).data
+        return [orjson.dumps(item, default=encode_default).decode() for item in data]
+
+
+def get_product_documents(products, request):
+    """
+    The JSON documents of ``products`` (with ``category`` and ``manufacturer`` loaded) in the active language,
+    in the same order. Stored documents whose stamp no longer matches are rendered again, together with the
+    missing ones, and saved with one upsert.
+    """
+    language = get_language()
+    stamps = {product.pk: get_stamp(product) for product in products}
+    documents = {
+        product_id: body for product_id, stamp, body in ProductDocument.objects.filter(
+            product_id__in=stamps, language=language,
+        ).values_list("product_id", "stamp", "body")
+        if stamp == stamps[product_id]
+    }
+    stale = sorted((product for product in products if product.pk not in documents), key=lambda product: product.pk)
+    if stale:
+        rendered = dict(zip((product.pk for product in stale), render_documents(stale)))
+        # Upserted in id order, so two requests rendering overlapping pages lock the rows in the same order.
+        ProductDocument.objects.bulk_create(
+            [
+                ProductDocument(product_id=product_id, language=language, stamp=stamps[product_id], body=body)
+                for product_id, body in rendered.items()
+            ],
+            update_conflicts=True, unique_fields=["product", "language"], update_fields=["stamp", "body"],
+        )
+        documents.update(rendered)
+    # Documents are shared by every host the API is served from; image URLs are stored against ORIGIN.
+    origin = get_origin(request)
+    return [documents[product.pk].replace(ORIGIN, origin) for product in products]
+
+
+def render_json(data, raw="results"):
+    """
+    A JSON response of the ``data`` dict encoded with orjson. ``data[raw]`` is a list of already encoded
+    documents, spliced in as they are instead of being parsed and encoded again.
+    """
+    data = dict(data)
+    documents = data.pop(raw)
+    with timed_serialization():
+        body = orjson.dumps(data, default=encode_default)
+    array = f'"{raw}":[{",".join(documents)}]'.encode()
+    return HttpResponse(body[:-1] + (b"," if data else b"") + array + b"}", content_type="application/json")
@@ -0,0 +1,73 @@
+import csv
+from decimal import Decimal
+
+from django.db.models import DecimalField, F, Sum, Window
+from django.db.models.functions import Coalesce
+from openpyxl import Workbook
+from openpyxl.utils import get_column_letter
+
+from apps.product.choices import OrderStatusChoices
+
+# (header, width) of every column; widths are fixed because write-only sheets can't be measured afterwards.
+COLUMNS = (
+    ("ID zakaz", 10),
+    ("Status", 16),
+    ("Name", 24),
+    ("Phone", 18),
+    ("Date", 17),
+    ("Order summa", 14),
+    ("Product code", 16),
+    ("Product", 40),
+    ("Price", 12),
+    ("Count", 8),
+    ("Summa", 14),
+)
+STATUS_LABELS = dict(OrderStatusChoices.choices)
+
+
+def iter_order_rows(queryset, chunk_size=2000):
+    """
+    One row per order line, read through a server-side cursor ``chunk_size`` rows at a time. Orders without
+    items still get a row so they show up in the export. The order total is the sum of its lines as exported, so
+    both use the products' current effective prices.
+    """
+    line_total = F("cart__items__product__effective_price") * F("cart__items__quantity")
+    lines = queryset.order_by("pk", "cart__items__pk").values_list(
+        "pk", "status", "name", "phone", "created_at",
+        Coalesce(Window(Sum(line_total), partition_by=[F("pk")]), Decimal("0"), output_field=DecimalField()),
+        "cart__items__product__product_code", "cart__items__product__title",
+        "cart__items__product__effective_price", "cart__items__quantity",
+    )
+    for pk, status, name, phone, created_at, total, code, title, price, quantity in lines.iterator(
+            chunk_size=chunk_size):
+        yield (
+            pk, str(STATUS_LABELS.get(status, status)), name, phone, created_at.strftime("%Y-%m-%d %H:%M"), total,
+            code, title, price, quantity, price * quantity if price is not None and quantity else Decimal("0"),
+        )
+
+
+def write_orders_xlsx(queryset, file, chunk_size=2000):
+    # write_only mode flushes every appended row to a temporary file, so memory doesn't grow with the export.
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("zakaz")
+    for index, (header, width) in enumerate(COLUMNS, start=1):
+        sheet.column_dimensions[get_column_letter(index)].width = width
+    sheet.append([header for header, width in COLUMNS])
+    count = 0
+    for row in iter_order_rows(queryset, chunk_size):
+        sheet.append(row)
+        count += 1
+    workbook.save(file)
+    return count
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def stream_orders_csv(queryset, chunk_size=2000):
+    writer = csv.writer(Echo())
+    yield writer.writerow([header for header, width in COLUMNS])
+    for row in iter_order_rows(queryset, chunk_size):
+        yield writer.writerow(row)
@@ -0,0 +1,81 @@
+from decimal import Decimal
+
+from django.db import connection
+from django.db.models import Case, F, IntegerField, Q, Value, When
+
+PRICE_BUCKETS = (
+    (Decimal("0"), Decimal("100000")),
+    (Decimal("100000"), Decimal("500000")),
+    (Decimal("500000"), Decimal("1000000")),
+    (Decimal("1000000"), Decimal("5000000")),
+    (Decimal("5000000"), None),
+)
+
+# facet name -> columns of its grouping set; the first one is the key, the second (if any) its title.
+FACETS = {
+    "manufacturer": ("manufacturer_id", "manufacturer_title"),
+    "category": ("category_id", "category_title"),
+    "parent_category": ("parent_category_id", "parent_category_title"),
+    "is_sale": ("is_sale",),
+    "is_recommended": ("is_recommended",),
+    "price": ("price_bucket",),
+}
+
+
+def price_bucket():
+    whens = []
+    for index, (low, high) in enumerate(PRICE_BUCKETS):
+        condition = Q(effective_price__gte=low)
+        if high is not None:
+            condition &= Q(effective_price__lt=high)
+        whens.append(When(condition, then=Value(index)))
+    return Case(*whens, output_field=IntegerField())
+
+
+def get_product_facets(queryset):
+    """
+    Count the filtered products per manufacturer, category, parent category, sale/recommended flag and price
+    bucket in one ``GROUP BY GROUPING SETS`` query over the filtered queryset.
+    """
+    inner = queryset.order_by().values(
+        "manufacturer_id", "category_id", "is_sale", "is_recommended",
+        manufacturer_title=F("manufacturer__title"),
+        category_title=F("category__title"),
+        parent_category_id=F("category__parent_id"),
+        parent_category_title=F("category__parent__title"),
+        price_bucket=price_bucket(),
+    )
+    inner_sql, params = inner.query.sql_with_params()
+    columns = [column for group in FACETS.values() for column in group]
+    sets = ", ".join(f"({', '.join(group)})" for group in FACETS.values())
+    # GROUPING(key) is 0 only in the rows of that key's own set, so a NULL key isn't mistaken for another set's row.
+    markers = ", ".join(f"GROUPING({group[0]})" for group in FACETS.values())
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT {', '.join(columns)}, {markers}, COUNT(*) FROM ({inner_sql}) f "
+            f"GROUP BY GROUPING SETS ({sets})",
+            params,
+        )
+        rows = cursor.fetchall()
+
+    facets = {name: [] for name in FACETS}
+    for row in rows:
+        values = dict(zip(columns, row))
+        count = row[-1]
+        for name, grouped in zip(FACETS, row[len(columns):-1]):
+            key = values[FACETS[name][0]]
+            if grouped or key is None:
+                continue
+            if name == "price":
+                low, high = PRICE_BUCKETS[key]
+                facets[name].append({"min": low, "max": high, "count": count})
+            elif len(FACETS[name]) == 2:
+                facets[name].append({"id": key, "title": values[FACETS[name][1]], "count": count})
+            else:
+                facets[name].append({"value": key, "count": count})
+    for name, items in facets.items():
+        if name == "price":
+            items.sort(key=lambda item: item["min"])
+        else:
+            items.sort(key=lambda item: -item["count"])
+    return facets
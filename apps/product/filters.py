@@ -1,17 +1,19 @@
 import django_filters
 
 from apps.product.models import Product, Manufacturer
+from apps.product.search import search_products
 
 
 class ProductFilter(django_filters.FilterSet):
-    min_price = django_filters.NumberFilter(field_name="price", lookup_expr="get")
-    max_price = django_filters.NumberFilter(field_name="price", lookup_expr="lte")
+    min_price = django_filters.NumberFilter(field_name="effective_price", lookup_expr="gte")
+    max_price = django_filters.NumberFilter(field_name="effective_price", lookup_expr="lte")
     manufacturer = django_filters.CharFilter(method="filter_manufacturer")
     category = django_filters.CharFilter(method="filter_category")
-    is_recommended = django_filters.BooleanFilter(method="is_recommended")
-    is_sale = django_filters.BooleanFilter(method="is_sale")
-    is_active = django_filters.BooleanFilter(method="is_active")
+    is_recommended = django_filters.BooleanFilter(field_name="is_recommended")
+    is_sale = django_filters.BooleanFilter(field_name="is_sale")
+    is_active = django_filters.BooleanFilter(field_name="is_active")
     parent_category = django_filters.CharFilter(method="filter_parent_category")
+    search = django_filters.CharFilter(method="filter_search")
 
     def filter_manufacturer(self, queryset, name, value):
         manufacturers = value.split(",")
@@ -23,7 +25,10 @@ class ProductFilter(django_filters.FilterSet):
 
     def filter_parent_category(self, queryset, name, value):
         parent_categories = value.split(",")
-        return queryset.filter(parent__category__id__in=parent_categories)
+        return queryset.filter(category__parent__id__in=parent_categories)
+
+    def filter_search(self, queryset, name, value):
+        return search_products(queryset, value)
 
     class Meta:
         model = Product
@@ -0,0 +1,238 @@
+import csv
+import time
+from itertools import zip_longest
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models.functions import Coalesce
+from openpyxl import load_workbook
+
+from apps.common.cache import bump_cache_version
+from apps.common.utils import allocate_unique_slugs
+from apps.product.autocomplete import CACHE_NAMESPACE as AUTOCOMPLETE_NAMESPACE
+from apps.product.choices import CartStatusChoices
+from apps.product.models import Cart, Category, Manufacturer, Product
+from apps.product.search import update_search_vector
+
+REQUIRED_COLUMNS = ("product_code", "title", "category")
+DECIMAL_COLUMNS = ("price", "sale_price")
+INTEGER_COLUMNS = ("in_stock_count",)
+BOOLEAN_COLUMNS = ("is_active", "is_sale", "is_recommended")
+TEXT_COLUMNS = ("description", "features")
+COLUMNS = REQUIRED_COLUMNS + ("manufacturer",) + DECIMAL_COLUMNS + INTEGER_COLUMNS + BOOLEAN_COLUMNS + TEXT_COLUMNS
+TRUE_VALUES = {"1", "true", "yes", "y", "+", "да", "ha"}
+FALSE_VALUES = {"0", "false", "no", "n", "-", "нет", "yo'q", ""}
+# Prices are numeric(18, 2) and counts are PositiveIntegerField, anything larger fails the whole chunk in the database.
+MAX_DECIMAL = Decimal(10) ** 16
+MAX_INTEGER = 2 ** 31 - 1
+# Caches that hold product data; product saves bump the same ones through signals, bulk writes don't send them.
+CACHE_NAMESPACES = ("manufacturer", "banner", "category", AUTOCOMPLETE_NAMESPACE)
+
+
+def normalize_header(values):
+    return [str(value or "").strip().lower().replace(" ", "_") for value in values]
+
+
+def to_row(header, values):
+    # Short rows get None for their missing trailing cells, so every row has every column of the header.
+    return dict(zip_longest(header, values[:len(header)]))
+
+
+def read_csv(path, delimiter=","):
+    """Yield ``(line number, {column: value})`` for every row of a CSV file without reading it into memory."""
+    with open(path, newline="", encoding="utf-8-sig") as file:
+        reader = csv.reader(file, delimiter=delimiter)
+        header = normalize_header(next(reader, []))
+        for line, values in enumerate(reader, start=2):
+            if any(value.strip() for value in values):
+                yield line, to_row(header, values)
+
+
+def read_xlsx(path, sheet=None):
+    """Like ``read_csv`` for the first (or the named) sheet of a workbook, read in openpyxl's read-only mode."""
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = (workbook[sheet] if sheet else workbook.active).iter_rows(values_only=True)
+        header = normalize_header(next(rows, ()))
+        for line, values in enumerate(rows, start=2):
+            if any(value not in (None, "") for value in values):
+                yield line, to_row(header, values)
+    finally:
+        workbook.close()
+
+
+def clean_text(value):
+    return "" if value is None else str(value).strip()
+
+
+def parse_decimal(value):
+    # JSON and spreadsheet booleans are ints to Python, but not numbers to us.
+    if isinstance(value, bool):
+        raise ValueError(f"{value!r} is not a number")
+    if not isinstance(value, (int, float, Decimal)):
+        value = clean_text(value).replace(" ", "").replace("\xa0", "").replace(",", ".")
+        if not value:
+            return None
+    try:
+        number = Decimal(str(value))
+    except (InvalidOperation, OverflowError):
+        raise ValueError(f"{value!r} is not a number")
+    if not number.is_finite():
+        raise ValueError(f"{value!r} is not a number")
+    if abs(number) >= MAX_DECIMAL:
+        raise ValueError(f"{value!r} is out of range")
+    return number
+
+
+def parse_count(value):
+    number = parse_decimal(value)
+    if number is not None and number > MAX_INTEGER:
+        raise ValueError(f"{value!r} is out of range")
+    return number
+
+
+def parse_boolean(value):
+    if isinstance(value, bool):
+        return value
+    value = clean_text(value).lower()
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    raise ValueError(f"{value!r} is not a yes/no value")
+
+
+class CatalogImporter:
+    """
+    Upserts products by ``product_code`` in chunks. Every chunk costs a fixed number of queries: one for the
+    existing products, one for the slugs taken by new ones, one ``INSERT ... ON CONFLICT`` and one search vector
+    update, plus one refresh of the active carts holding a repriced product. Categories (by slug or title) and
+    manufacturers (by title) are resolved from maps loaded once.
+
+    Only the columns present in the file are updated on existing products, so a feed of codes and prices leaves
+    titles and descriptions alone. New products get the model defaults for missing columns. A file with only one
+    of price and sale_price costs one more UPDATE per chunk to recompute ``effective_price`` from the stored other.
+    """
+
+    def __init__(self, chunk_size=2000, create_manufacturers=False, log=None):
+        self.chunk_size = chunk_size
+        self.create_manufacturers = create_manufacturers
+        self.log = log or (lambda message: None)
+        self.categories = {}
+        for pk, slug, title in Category.objects.values_list("pk", "slug", "title"):
+            self.categories.setdefault(title.strip().casefold(), pk)
+            self.categories[slug] = pk
+        self.manufacturers = {}
+        for pk, title in Manufacturer.objects.order_by("pk").values_list("pk", "title"):
+            self.manufacturers.setdefault(title.strip().casefold(), pk)
+        self.created = self.updated = 0
+        self.errors = []
+
+    def get_manufacturer(self, title):
+        title = clean_text(title)
+        if not title:
+            return None
+        key = title.casefold()
+        if key not in self.manufacturers:
+            if not self.create_manufacturers:
+                raise ValueError(f"unknown manufacturer {title!r}")
+            self.manufacturers[key] = Manufacturer.objects.create(title=title).pk
+        return self.manufacturers[key]
+
+    def parse_row(self, row, columns):
+        values = {"product_code": clean_text(row.get("product_code")), "title": clean_text(row.get("title"))[:250]}
+        if not values["product_code"] or not values["title"]:
+            raise ValueError("product_code and title are required")
+        category = clean_text(row.get("category"))
+        values["category_id"] = self.categories.get(category) or self.categories.get(category.casefold())
+        if values["category_id"] is None:
+            raise ValueError(f"unknown category {category!r}")
+        if "manufacturer" in columns:
+            values["manufacturer_id"] = self.get_manufacturer(row.get("manufacturer"))
+        for column in DECIMAL_COLUMNS:
+            if column in columns:
+                values[column] = parse_decimal(row.get(column))
+        if values.get("price", 0) is None:
+            raise ValueError("price is required")
+        for column in INTEGER_COLUMNS:
+            if column in columns:
+                number = parse_count(row.get(column))
+                values[column] = max(int(number), 0) if number is not None else 0
+        for column in BOOLEAN_COLUMNS:
+            if column in columns:
+                values[column] = parse_boolean(row.get(column))
+        for column in TEXT_COLUMNS:
+            if column in columns:
+                values[column] = clean_text(row.get(column)) or None
+        return values
+
+    def import_rows(self, rows):
+        """Import ``(line number, row)`` pairs as produced by ``read_csv``/``read_xlsx``; returns rows per second."""
+        start = time.perf_counter()
+        columns = None
+        chunk = {}
+        processed = 0
+        for line, row in rows:
+            if columns is None:
+                columns = set(row) & set(COLUMNS)
+                if missing := [column for column in REQUIRED_COLUMNS if column not in row]:
+                    raise ValueError(f"Missing columns: {', '.join(missing)}")
+            processed += 1
+            try:
+                values = self.parse_row(row, columns)
+            except ValueError as error:
+                self.errors.append((line, str(error)))
+                continue
+            # A code that appears twice in one chunk keeps its last row, ON CONFLICT can't touch a row twice.
+            chunk[values["product_code"]] = values
+            if len(chunk) >= self.chunk_size:
+                self.write_chunk(chunk, columns)
+                chunk = {}
+                self.log(f"{processed} rows, {processed / (time.perf_counter() - start):.0f} rows/s")
+        if chunk:
+            self.write_chunk(chunk, columns)
+        if self.created or self.updated:
+            for namespace in CACHE_NAMESPACES:
+                bump_cache_version(namespace)
+        seconds = time.perf_counter() - start
+        return processed / seconds if seconds else 0
+
+    def write_chunk(self, chunk, columns):
+        update_fields = ["title", "category", "updated_at"] + [
+            column for column in ("manufacturer",) + DECIMAL_COLUMNS + INTEGER_COLUMNS + BOOLEAN_COLUMNS + TEXT_COLUMNS
+            if column in columns
+        ]
+        prices = columns & set(DECIMAL_COLUMNS)
+        if len(prices) == len(DECIMAL_COLUMNS):
+            update_fields.append("effective_price")
+        with transaction.atomic():
+            existing = {
+                code: (pk, slug, old_prices) for code, pk, slug, *old_prices in Product.objects.filter(
+                    product_code__in=chunk,
+                ).values_list("product_code", "pk", "slug", *DECIMAL_COLUMNS)
+            }
+            new = [values for code, values in chunk.items() if code not in existing]
+            for values, slug in zip(new, allocate_unique_slugs(Product, [values["title"] for values in new])):
+                values["slug"] = slug
+            repriced = []
+            for code, (pk, slug, old_prices) in existing.items():
+                chunk[code]["slug"] = slug
+                if any(column in prices and chunk[code][column] != old
+                       for column, old in zip(DECIMAL_COLUMNS, old_prices)):
+                    repriced.append(pk)
+            products = [Product(**values) for values in chunk.values()]
+            for product in products:
+                product.effective_price = product.get_effective_price()
+            Product.objects.bulk_create(
+                products, update_conflicts=True, unique_fields=["product_code"], update_fields=update_fields,
+            )
+            if prices and "effective_price" not in update_fields:
+                Product.objects.filter(product_code__in=existing).update(
+                    effective_price=Coalesce("sale_price", "price"),
+                )
+            update_search_vector(Product.objects.filter(product_code__in=chunk))
+            # Bulk writes send no signals, so the stored cart totals are refreshed here, like the price feed does.
+            if repriced:
+                Cart.objects.filter(status=CartStatusChoices.ACTIVE, items__product_id__in=repriced).refresh_summary()
+        self.created += len(new)
+        self.updated += len(chunk) - len(new)
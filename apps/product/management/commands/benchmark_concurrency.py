@@ -0,0 +1,146 @@
+import asyncio
+import json
+import random
+import statistics
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.product.models import Cart
+
+PATHS = (
+    "/product/last-seen-products/",
+    "/product/saved-products/",
+    "/product/cart/list/",
+    "/product/searche/history/",
+    "/product/cart/total-price/{cart_id}/",
+)
+
+
+async def read_response(reader):
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("Connection closed")
+    status = int(status_line.split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    if headers.get("transfer-encoding") == "chunked":
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        await reader.readexactly(int(headers.get("content-length", 0)))
+    return status, headers.get("connection", "").lower() != "close"
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive the fingerprint-scoped endpoints of a running server with many concurrent keep-alive clients and "
+        "report throughput and latency percentiles. Run it once against the WSGI deployment "
+        "(gunicorn gctade.wsgi) and once against the ASGI one (uvicorn gctade.asgi:application) with the same "
+        "worker count, then compare the two JSON files with --compare"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://127.0.0.1:8000")
+        parser.add_argument("--concurrency", type=int, default=1000)
+        parser.add_argument("--requests", type=int, default=20000)
+        parser.add_argument("--fingerprints", type=int, default=1000, help="Distinct fingerprints to spread load over")
+        parser.add_argument("--timeout", type=float, default=30)
+        parser.add_argument("--label", default="")
+        parser.add_argument("--output")
+        parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"))
+
+    def handle(self, *args, **options):
+        if options["compare"]:
+            return self.compare(*options["compare"])
+        carts = list(
+            Cart.objects.filter(items_count__gt=0).order_by("?")
+            .values_list("pk", "fingerprint")[:options["fingerprints"]]
+        )
+        if not carts:
+            raise CommandError("No carts with items found, run seed_catalog first")
+        url = urlsplit(options["url"])
+        result = asyncio.run(self.run(url, carts, options))
+        result["label"] = options["label"]
+        self.stdout.write(
+            f"{options['label'] or url.netloc}: {result['requests']} requests, {result['errors']} errors in "
+            f"{result['seconds']:.1f}s = {result['rps']:.0f} req/s  p50 {result['p50_ms']:.1f}ms  "
+            f"p95 {result['p95_ms']:.1f}ms  p99 {result['p99_ms']:.1f}ms"
+        )
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                json.dump(result, file, indent=2)
+
+    async def run(self, url, carts, options):
+        remaining = options["requests"]
+        latencies, statuses, errors = [], {}, 0
+        rng = random.Random(0)
+
+        async def client():
+            nonlocal remaining, errors
+            reader = writer = None
+            while remaining > 0:
+                remaining -= 1
+                cart_id, fingerprint = rng.choice(carts)
+                path = rng.choice(PATHS).format(cart_id=cart_id)
+                request = (
+                    f"GET {path} HTTP/1.1\r\nHost: {url.netloc}\r\nFingerprint: {fingerprint}\r\n"
+                    f"Connection: keep-alive\r\n\r\n"
+                ).encode()
+                start = time.perf_counter()
+                try:
+                    if writer is None:
+                        reader, writer = await asyncio.open_connection(url.hostname, url.port or 80)
+                    writer.write(request)
+                    status, keep_alive = await asyncio.wait_for(read_response(reader), options["timeout"])
+                except (OSError, ConnectionError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError):
+                    errors += 1
+                    if writer is not None:
+                        writer.close()
+                    reader = writer = None
+                    continue
+                latencies.append((time.perf_counter() - start) * 1000)
+                statuses[status] = statuses.get(status, 0) + 1
+                if not keep_alive:
+                    writer.close()
+                    reader = writer = None
+            if writer is not None:
+                writer.close()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(options["concurrency"])))
+        seconds = time.perf_counter() - start
+        cuts = statistics.quantiles(latencies, n=100, method="inclusive") if len(latencies) > 1 else [0] * 99
+        return {
+            "url": url.geturl(),
+            "concurrency": options["concurrency"],
+            "requests": len(latencies),
+            "errors": errors,
+            "statuses": statuses,
+            "seconds": round(seconds, 3),
+            "rps": round(len(latencies) / seconds, 1) if seconds else 0,
+            "p50_ms": round(cuts[49], 3),
+            "p95_ms": round(cuts[94], 3),
+            "p99_ms": round(cuts[98], 3),
+        }
+
+    def compare(self, base_path, new_path):
+        with open(base_path) as file:
+            base = json.load(file)
+        with open(new_path) as file:
+            new = json.load(file)
+        for key in ("rps", "p50_ms", "p95_ms", "p99_ms", "errors"):
+            change = (new[key] - base[key]) / base[key] if base[key] else 0
+            self.stdout.write(
+                f"{key:<8} {base.get('label') or 'base':>10} {base[key]:>10}  {new.get('label') or 'new':>10} "
+                f"{new[key]:>10}  ({change:+.0%})"
+            )
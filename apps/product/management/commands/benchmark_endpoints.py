@@ -0,0 +1,187 @@
+import json
+import platform
+import statistics
+import time
+
+import django
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from apps.product.choices import CartStatusChoices
+from apps.product.models import Cart, CartItem, Product, SavedProduct, SearchHistory
+from apps.product.tracking import discard_product_views
+
+# Statements the benchmark's own per-request savepoint adds; they are not issued by the endpoint.
+SAVEPOINT_PREFIXES = ("SAVEPOINT", "RELEASE SAVEPOINT", "ROLLBACK TO SAVEPOINT")
+
+
+class Command(BaseCommand):
+    help = ("Request every route of apps/product/urls.py through the test client and write p50/p95/p99 latency and "
+            "query counts to JSON, or compare two such runs with --compare")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=50)
+        parser.add_argument("--warmup", type=int, default=3)
+        parser.add_argument("--output", help="Write the results to this JSON file")
+        parser.add_argument("--only", nargs="*", help="Only run the endpoints with these names")
+        parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"),
+                            help="Compare two result files instead of running the benchmark")
+        parser.add_argument("--threshold", type=float, default=0.25,
+                            help="Relative p95 latency increase that counts as a regression")
+        parser.add_argument("--min-delta-ms", type=float, default=2.0,
+                            help="Ignore latency changes smaller than this, they are noise")
+
+    def handle(self, *args, **options):
+        if options["compare"]:
+            return self.compare(*options["compare"], options["threshold"], options["min_delta_ms"])
+        results = {}
+        # Everything, including the fixtures picked or created here, is rolled back at the end. Product views go to
+        # a throwaway buffer, a Redis one isn't rolled back.
+        with transaction.atomic(), discard_product_views():
+            scenarios = self.get_scenarios()
+            if options["only"]:
+                scenarios = [scenario for scenario in scenarios if scenario["name"] in options["only"]]
+            for scenario in scenarios:
+                result = results[scenario["name"]] = self.run(scenario, options["iterations"], options["warmup"])
+                self.stdout.write(
+                    f"{scenario['name']:<26} {result['status']:>3}  p50 {result['p50_ms']:8.2f}ms  "
+                    f"p95 {result['p95_ms']:8.2f}ms  p99 {result['p99_ms']:8.2f}ms  queries {result['queries']}"
+                )
+            transaction.set_rollback(True)
+        report = {
+            "meta": {
+                "created_at": timezone.now().isoformat(),
+                "iterations": options["iterations"],
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "products": Product.objects.count(),
+            },
+            "endpoints": results,
+        }
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                json.dump(report, file, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def get_scenarios(self):
+        product = Product.objects.filter(is_active=True).order_by("-views_count", "-pk").first()
+        cart = Cart.objects.filter(items_count__gt=0, status=CartStatusChoices.ACTIVE).order_by("-pk").first()
+        if product is None or cart is None:
+            raise CommandError("The database has no products or carts, run seed_catalog first")
+        fingerprint = self.fingerprint = cart.fingerprint
+        item = CartItem.objects.filter(cart=cart).first()
+        saved = SavedProduct.objects.filter(fingerprint=fingerprint).first() \
+            or SavedProduct.objects.create(product=product, fingerprint=fingerprint)
+        search = SearchHistory.objects.filter(fingerprint=fingerprint).first() \
+            or SearchHistory.objects.create(query=product.title, fingerprint=fingerprint)
+        word = product.title.split()[0]
+        self.feed_user = User.objects.create_superuser("benchmark-feed", password=None)
+        return [
+            {"name": "product-list", "path": "/product/list/"},
+            {"name": "product-list-price", "path": "/product/list/?ordering=-price"},
+            {"name": "product-list-search", "path": f"/product/list/?search={word}"},
+            {"name": "product-list-facets", "path": "/product/list/?facets=true"},
+            {"name": "banner-list", "path": "/product/banner/"},
+            {"name": "manufacturer", "path": "/product/manufacturer/"},
+            {"name": "parent-category-list", "path": "/product/categories"},
+            {"name": "product-detail", "path": f"/product/detail/{product.slug}/"},
+            {"name": "last-seen-products", "path": "/product/last-seen-products/"},
+            {"name": "saved-products", "path": "/product/saved-products/"},
+            {"name": "saved-products-create", "method": "post", "path": "/product/saved-products/create/",
+             "data": {"product": product.pk, "fingerprint": fingerprint}},
+            {"name": "saved-products-delete", "method": "delete",
+             "path": f"/product/saved-products/delete/{saved.product_id}/"},
+            {"name": "search-history", "path": "/product/searche/history/"},
+            {"name": "search-history-create", "method": "post", "path": "/product/searche-history/create/",
+             "data": {"query": word, "fingerprint": fingerprint}},
+            {"name": "search-history-delete", "method": "delete",
+             "path": f"/product/searche-history/delete/{search.pk}"},
+            {"name": "popular", "path": "/product/popular-searche-history/?days=7"},
+            {"name": "autocomplete", "path": f"/product/autocomplete/?q={word[:2]}"},
+            {"name": "cart-create", "method": "post", "path": "/product/cart/create/",
+             "data": {"fingerprint": fingerprint}},
+            {"name": "cart-list", "path": "/product/cart/list/"},
+            {"name": "cart-item-create", "method": "post", "path": "/product/cart-item/create/",
+             "data": {"cart": cart.pk, "product": product.pk, "quantity": 1}},
+            {"name": "cart-item-update", "method": "patch", "path": f"/product/cart-item/update/{item.pk}/",
+             "data": {"quantity": item.quantity + 1}},
+            {"name": "cart-item-delete", "method": "delete", "path": f"/product/cart-item/delete/{item.pk}/"},
+            {"name": "cart-item-batch", "method": "post", "path": f"/product/cart-item/batch/{cart.pk}/",
+             "data": {"operations": [{"op": "add", "product": item.product_id, "quantity": 1},
+                                     {"op": "set", "product": product.pk, "quantity": 2}]}},
+            {"name": "cart-item", "path": f"/product/cart-item/{cart.pk}/"},
+            {"name": "cart-total-price", "path": f"/product/cart/total-price/{cart.pk}/"},
+            {"name": "product-feed", "method": "post", "path": "/product/feed/", "login": True,
+             "data": [{"product_code": product.product_code, "price": str(product.price + 1)}]},
+            {"name": "order-create", "method": "post", "path": "/product/order/create/",
+             "data": {"cart": cart.pk, "name": "Benchmark", "phone": "+998900000000"}},
+        ]
+
+    def run(self, scenario, iterations, warmup):
+        client = Client(HTTP_FINGERPRINT=self.fingerprint)
+        if scenario.get("login"):
+            client.force_login(self.feed_user)
+        method = getattr(client, scenario.get("method", "get"))
+        kwargs = {"data": scenario["data"], "content_type": "application/json"} if "data" in scenario else {}
+        timings, queries, status = [], [], None
+        for iteration in range(warmup + iterations):
+            # Every request runs in a savepoint that is rolled back, so writes can be repeated on the same rows.
+            with transaction.atomic():
+                with CaptureQueriesContext(connection) as captured:
+                    start = time.perf_counter()
+                    response = method(scenario["path"], **kwargs)
+                    elapsed = time.perf_counter() - start
+                transaction.set_rollback(True)
+            if iteration < warmup:
+                continue
+            status = response.status_code
+            timings.append(elapsed * 1000)
+            queries.append(sum(
+                not query["sql"].startswith(SAVEPOINT_PREFIXES) for query in captured.captured_queries
+            ))
+        cuts = statistics.quantiles(timings, n=100, method="inclusive") if len(timings) > 1 else timings * 99
+        return {
+            "method": scenario.get("method", "get").upper(),
+            "path": scenario["path"],
+            "status": status,
+            "p50_ms": round(cuts[49], 3),
+            "p95_ms": round(cuts[94], 3),
+            "p99_ms": round(cuts[98], 3),
+            "mean_ms": round(statistics.fmean(timings), 3),
+            "queries": max(queries),
+        }
+
+    def compare(self, base_path, new_path, threshold, min_delta_ms):
+        with open(base_path) as file:
+            base = json.load(file)["endpoints"]
+        with open(new_path) as file:
+            new = json.load(file)["endpoints"]
+        regressions = 0
+        for name in sorted(set(base) | set(new)):
+            if name not in base or name not in new:
+                self.stdout.write(f"{name:<26} only in {'new' if name in new else 'base'}")
+                continue
+            before, after = base[name], new[name]
+            delta = after["p95_ms"] - before["p95_ms"]
+            change = delta / before["p95_ms"] if before["p95_ms"] else 0
+            problems = []
+            if change > threshold and delta > min_delta_ms:
+                problems.append(f"p95 +{change:.0%}")
+            if after["queries"] > before["queries"]:
+                problems.append(f"queries {before['queries']} -> {after['queries']}")
+            if after["status"] != before["status"]:
+                problems.append(f"status {before['status']} -> {after['status']}")
+            line = (f"{name:<26} p95 {before['p95_ms']:8.2f} -> {after['p95_ms']:8.2f}ms ({change:+.0%})  "
+                    f"queries {before['queries']} -> {after['queries']}")
+            if problems:
+                regressions += 1
+                self.stdout.write(self.style.ERROR(f"{line}  REGRESSION: {', '.join(problems)}"))
+            else:
+                self.stdout.write(line)
+        if regressions:
+            raise CommandError(f"{regressions} endpoints regressed")
+        self.stdout.write(self.style.SUCCESS("No regressions"))
@@ -0,0 +1,86 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+
+from apps.product.models import Category, Manufacturer, ParentCategory, Product
+from apps.product.search import search_products, update_search_vector
+
+WORDS = (
+    "cable", "socket", "switch", "lamp", "panel", "breaker", "drill", "pipe", "valve", "pump", "filter", "boiler",
+    "heater", "mixer", "faucet", "sensor", "relay", "motor", "adapter", "bracket", "white", "black", "steel",
+    "copper", "plastic", "double", "single", "outdoor", "indoor", "compact", "pro", "mini", "max", "led", "smart",
+)
+QUERIES = ("cable", "led lamp", "coper", "stel pipe", "BENCH00012", "smart sensor", "breker")
+
+
+class Command(BaseCommand):
+    help = "Benchmark the product search engine against the legacy ILIKE search on a synthetic catalog"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=200000, help="Synthetic products to create, 0 to reuse")
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--keep", action="store_true", help="Keep the synthetic catalog instead of rolling back")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if options["products"]:
+                self.seed(options["products"])
+            with connection.cursor() as cursor:
+                cursor.execute(f"ANALYZE {Product._meta.db_table}")
+            self.stdout.write(f"{'query':<16}{'legacy p50':>12}{'legacy p95':>12}{'search p50':>12}{'search p95':>12}")
+            for query in QUERIES:
+                legacy = self.measure(self.legacy_search(query), options["repeat"])
+                engine = self.measure(search_products(Product.objects.filter(is_active=True), query), options["repeat"])
+                self.stdout.write(f"{query:<16}{legacy[0]:>10.2f}ms{legacy[1]:>10.2f}ms{engine[0]:>10.2f}ms"
+                                  f"{engine[1]:>10.2f}ms")
+            if not options["keep"]:
+                transaction.set_rollback(True)
+
+    def seed(self, count):
+        started = time.perf_counter()
+        rng = random.Random(0)
+        parent = ParentCategory.objects.create(title="Benchmark", slug="benchmark")
+        categories = Category.objects.bulk_create(
+            [Category(title=f"{word} goods", slug=f"benchmark-{word}", parent=parent) for word in WORDS]
+        )
+        manufacturers = Manufacturer.objects.bulk_create([Manufacturer(title=f"{word.title()} Co") for word in WORDS])
+        batch = []
+        for index in range(count):
+            price = rng.randint(1, 5000)
+            # bulk_create skips Product.save, which keeps effective_price in sync.
+            batch.append(Product(
+                title=" ".join(rng.sample(WORDS, 3)),
+                slug=f"benchmark-{index}",
+                product_code=f"BENCH{index:07d}",
+                category=rng.choice(categories),
+                manufacturer=rng.choice(manufacturers),
+                price=price,
+                effective_price=price,
+            ))
+            if len(batch) == 5000:
+                Product.objects.bulk_create(batch)
+                batch = []
+        Product.objects.bulk_create(batch)
+        update_search_vector(Product.objects.filter(slug__startswith="benchmark-"))
+        self.stdout.write(f"Seeded {count} products in {time.perf_counter() - started:.1f}s")
+
+    def legacy_search(self, query):
+        queryset = Product.objects.filter(is_active=True)
+        for term in query.split():
+            queryset = queryset.filter(
+                Q(title__icontains=term) | Q(manufacturer__title__icontains=term)
+                | Q(category__title__icontains=term) | Q(product_code__icontains=term)
+            )
+        return queryset.order_by("-created_at")
+
+    def measure(self, queryset, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            list(queryset[:50])
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings), statistics.quantiles(timings, n=20)[-1]
@@ -0,0 +1,135 @@
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Sum
+
+from apps.product.choices import OrderStatusChoices
+from apps.product.models import Cart, CartItem, Category, InsufficientStock, Manufacturer, Order, Product
+
+FINGERPRINT = "stock-benchmark"
+
+
+class Command(BaseCommand):
+    help = (
+        "Check out many orders against the same few products from concurrent threads and verify that stock is never "
+        "oversold, that an order with one short line takes nothing, and that cancelling gives the stock back. "
+        "Creates its own products and carts and deletes them afterwards"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=32)
+        parser.add_argument("--orders", type=int, default=2000)
+        parser.add_argument("--stock", type=int, default=500, help="Initial stock of the contended product")
+        parser.add_argument("--quantity", type=int, default=2, help="Quantity of the contended product per order")
+
+    def handle(self, *args, **options):
+        hot, scarce = self.create_products(options["stock"])
+        try:
+            carts = self.create_carts(hot, scarce, options["orders"], options["quantity"])
+            self.verify(hot, scarce, options, *self.run(carts, options["threads"]))
+        finally:
+            Cart.objects.filter(fingerprint=FINGERPRINT).delete()
+            Product.objects.filter(pk__in=[hot.pk, scarce.pk]).delete()
+
+    def create_products(self, stock):
+        category = Category.objects.order_by("pk").first()
+        manufacturer = Manufacturer.objects.order_by("pk").first()
+        if category is None or manufacturer is None:
+            raise CommandError("The database has no categories or manufacturers, run seed_catalog first")
+        products = [
+            Product.objects.create(
+                title=f"Stock benchmark {name}", slug=f"stock-benchmark-{name}",
+                product_code=f"STOCK-BENCHMARK-{name.upper()}", category=category, manufacturer=manufacturer,
+                price=100, in_stock_count=count,
+            )
+            for name, count in (("hot", stock), ("scarce", stock // 10))
+        ]
+        return products
+
+    def create_carts(self, hot, scarce, orders, quantity):
+        carts = Cart.objects.bulk_create([Cart(fingerprint=FINGERPRINT) for _ in range(orders)])
+        # Every fourth order also asks for the scarce product, which runs out long before the hot one; those
+        # orders must fail as a whole without taking any of the hot product.
+        items = [CartItem(cart=cart, product=hot, quantity=quantity) for cart in carts]
+        items += [CartItem(cart=cart, product=scarce, quantity=1) for cart in carts[::4]]
+        self.scarce_carts = {cart.pk for cart in carts[::4]}
+        CartItem.objects.bulk_create(items)
+        Cart.objects.filter(fingerprint=FINGERPRINT).refresh_summary()
+        return carts
+
+    def run(self, carts, threads):
+        placed, rejected, latencies = [], [], []
+        lock = threading.Lock()
+
+        def checkout(cart):
+            start = time.perf_counter()
+            try:
+                with transaction.atomic():
+                    order = Order.objects.create(cart=cart, name="Stock benchmark", phone="+998900000000")
+                result = placed
+            except InsufficientStock:
+                order, result = cart, rejected
+            with lock:
+                latencies.append((time.perf_counter() - start) * 1000)
+                result.append(order)
+
+        def worker(chunk):
+            try:
+                for cart in chunk:
+                    checkout(cart)
+            finally:
+                connection.close()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(threads) as executor:
+            list(executor.map(worker, [carts[index::threads] for index in range(threads)]))
+        seconds = time.perf_counter() - start
+        cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+        self.stdout.write(
+            f"{len(carts)} checkouts on {threads} threads in {seconds:.2f}s = {len(carts) / seconds:.0f}/s, "
+            f"{len(placed)} placed, {len(rejected)} rejected, p50 {cuts[49]:.1f}ms p95 {cuts[94]:.1f}ms "
+            f"p99 {cuts[98]:.1f}ms"
+        )
+        return placed, rejected
+
+    def verify(self, hot, scarce, options, placed, rejected):
+        hot.refresh_from_db()
+        scarce.refresh_from_db()
+        sold = dict(
+            CartItem.objects.filter(cart__orders__in=placed).values("product_id")
+            .annotate(total=Sum("quantity")).values_list("product_id", "total")
+        )
+        problems = []
+        if hot.in_stock_count + sold.get(hot.pk, 0) != options["stock"]:
+            problems.append(f"hot product: {options['stock']} - {sold.get(hot.pk, 0)} sold != {hot.in_stock_count}")
+        if scarce.in_stock_count + sold.get(scarce.pk, 0) != options["stock"] // 10:
+            problems.append(f"scarce product: {options['stock'] // 10} - {sold.get(scarce.pk, 0)} sold != "
+                            f"{scarce.in_stock_count}")
+        # Stock only goes down during the run, so anything rejected must still be short at the end.
+        if any(cart.pk not in self.scarce_carts for cart in rejected) and hot.in_stock_count >= options["quantity"]:
+            problems.append("orders were rejected although the hot product was in stock")
+        if any(cart.pk in self.scarce_carts for cart in rejected) \
+                and hot.in_stock_count >= options["quantity"] and scarce.in_stock_count:
+            problems.append("orders were rejected although both products were in stock")
+        if Order.objects.filter(pk__in=[order.pk for order in placed], in_stock_subtracted=False).exists():
+            problems.append("placed orders without in_stock_subtracted")
+
+        # Cancelling every placed order must put all of the stock back.
+        for order in placed:
+            order.status = OrderStatusChoices.CANCELLED
+            order.save()
+        hot.refresh_from_db()
+        scarce.refresh_from_db()
+        if (hot.in_stock_count, scarce.in_stock_count) != (options["stock"], options["stock"] // 10):
+            problems.append(f"after cancelling: stock is {hot.in_stock_count}/{scarce.in_stock_count}")
+
+        if problems:
+            raise CommandError("; ".join(problems))
+        self.stdout.write(self.style.SUCCESS(
+            f"No overselling: {sold.get(hot.pk, 0)} of {options['stock']} hot and {sold.get(scarce.pk, 0)} of "
+            f"{options['stock'] // 10} scarce sold, all of it released again on cancel"
+        ))
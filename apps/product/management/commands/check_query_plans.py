@@ -0,0 +1,99 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from apps.product.models import Cart, Product
+from apps.product.seeding import CatalogSeeder
+from apps.product.tracking import discard_product_views
+
+
+class Command(BaseCommand):
+    help = ("Seed a dataset, request every fingerprint-scoped and catalog endpoint, EXPLAIN each SELECT they run "
+            "and fail if a sequential scan hits a large table")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=20000)
+        parser.add_argument("--fingerprints", type=int, default=5000)
+        parser.add_argument("--views", type=int, default=200000)
+        parser.add_argument("--min-rows", type=int, default=10000,
+                            help="Tables with at least this many rows must not be sequentially scanned")
+        parser.add_argument("--no-seed", action="store_true", help="Use the data already in the database")
+        parser.add_argument("--keep", action="store_true", help="Keep the seeded data instead of rolling back")
+
+    def handle(self, *args, **options):
+        with transaction.atomic(), discard_product_views():
+            seeder = CatalogSeeder(prefix="plan")
+            if not options["no_seed"]:
+                seeder.seed(
+                    products=options["products"], fingerprints=options["fingerprints"], views=options["views"],
+                    saved=options["views"] // 5, carts=options["fingerprints"] * 2,
+                    orders=options["fingerprints"], searches=options["views"] // 2,
+                )
+            large_tables = self.get_large_tables(options["min_rows"])
+            failures = []
+            for name, url in self.get_urls(seeder):
+                with CaptureQueriesContext(connection) as queries:
+                    Client().get(url, HTTP_FINGERPRINT=seeder.fingerprint(1))
+                for query in queries.captured_queries:
+                    if not query["sql"].lstrip().upper().startswith("SELECT"):
+                        continue
+                    scans = self.get_seq_scans(query["sql"]) & large_tables
+                    status = self.style.ERROR(f"SEQ SCAN {', '.join(sorted(scans))}") if scans else "ok"
+                    self.stdout.write(f"{name:<24} {status:<12} {query['sql'][:90]}")
+                    if scans:
+                        failures.append((name, scans, query["sql"]))
+            if not options["keep"]:
+                transaction.set_rollback(True)
+        if failures:
+            raise CommandError(f"{len(failures)} queries sequentially scan large tables")
+        self.stdout.write(self.style.SUCCESS("No sequential scans on large tables"))
+
+    def get_urls(self, seeder):
+        product = Product.objects.filter(is_active=True).order_by("-pk").first()
+        cart = Cart.objects.filter(fingerprint=seeder.fingerprint(1)).first()
+        urls = [
+            ("product-list", "/product/list/"),
+            ("product-list-price", "/product/list/?ordering=-price"),
+            ("product-list-price-range", "/product/list/?min_price=1000&max_price=2000&ordering=price"),
+            ("product-list-views", "/product/list/?ordering=-views_count"),
+            ("product-list-search", "/product/list/?search=led%20lamp"),
+            ("product-list-facets", "/product/list/?facets=true&is_sale=true"),
+            ("last-seen-products", "/product/last-seen-products/"),
+            ("saved-products", "/product/saved-products/"),
+            ("search-history", "/product/searche/history/"),
+            ("cart-list", "/product/cart/list/"),
+            ("popular-searches", "/product/popular-searche-history/?days=7"),
+        ]
+        if product:
+            urls.append(("product-detail", f"/product/detail/{product.slug}/"))
+        if cart:
+            urls.append(("cart-item", f"/product/cart-item/{cart.pk}/"))
+            urls.append(("cart-total-price", f"/product/cart/total-price/{cart.pk}/"))
+        return urls
+
+    def get_large_tables(self, min_rows):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT relname FROM pg_class WHERE relkind = 'r' AND relnamespace = 'public'::regnamespace "
+                "AND reltuples >= %s",
+                [min_rows],
+            )
+            return {row[0] for row in cursor.fetchall()}
+
+    def get_seq_scans(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}")
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        scans = set()
+        nodes = [plan[0]["Plan"]]
+        while nodes:
+            node = nodes.pop()
+            if node["Node Type"] == "Seq Scan":
+                scans.add(node["Relation Name"])
+            nodes.extend(node.get("Plans", []))
+        return scans
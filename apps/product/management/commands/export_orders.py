@@ -0,0 +1,54 @@
+import sys
+from datetime import datetime, time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.product.choices import OrderStatusChoices
+from apps.product.exports import stream_orders_csv, write_orders_xlsx
+from apps.product.models import Order
+
+
+def parse_date(value):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise CommandError(f"Invalid date {value!r}, expected YYYY-MM-DD")
+
+
+class Command(BaseCommand):
+    help = "Export the orders of a date range and their cart lines to XLSX or CSV without loading them into memory"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--start", type=parse_date, help="First day, inclusive (YYYY-MM-DD)")
+        parser.add_argument("--end", type=parse_date, help="Last day, inclusive (YYYY-MM-DD)")
+        parser.add_argument("--status", choices=OrderStatusChoices.values)
+        parser.add_argument("--format", choices=("xlsx", "csv"), default="xlsx")
+        parser.add_argument("--output", help="Target file; CSV goes to stdout when omitted")
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        orders = Order.objects.all()
+        if options["start"]:
+            orders = orders.filter(created_at__gte=timezone.make_aware(datetime.combine(options["start"], time.min)))
+        if options["end"]:
+            end = options["end"] + timedelta(days=1)
+            orders = orders.filter(created_at__lt=timezone.make_aware(datetime.combine(end, time.min)))
+        if options["status"]:
+            orders = orders.filter(status=options["status"])
+
+        if options["format"] == "xlsx":
+            if not options["output"]:
+                raise CommandError("--output is required for XLSX exports")
+            with open(options["output"], "wb") as file:
+                count = write_orders_xlsx(orders, file, options["chunk_size"])
+            self.stdout.write(self.style.SUCCESS(f"{count} order lines written to {options['output']}"))
+            return
+
+        file = open(options["output"], "w", newline="") if options["output"] else sys.stdout
+        try:
+            for line in stream_orders_csv(orders, options["chunk_size"]):
+                file.write(line)
+        finally:
+            if options["output"]:
+                file.close()
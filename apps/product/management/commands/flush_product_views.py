@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.product.tracking import flush_product_views
+
+
+class Command(BaseCommand):
+    help = "Flush buffered product views into ProductView, LastSeenProduct and Product.views_count"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--interval", type=float, default=5, help="Seconds to wait when the buffer is empty")
+        parser.add_argument("--once", action="store_true", help="Drain the buffer and exit")
+
+    def handle(self, *args, **options):
+        while True:
+            flushed = flush_product_views(options["batch_size"])
+            if flushed:
+                self.stdout.write(f"Flushed {flushed} views")
+            elif options["once"]:
+                break
+            else:
+                time.sleep(options["interval"])
@@ -0,0 +1,31 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.common.images import generate_derivatives
+from apps.product.models import Banner, Manufacturer, ParentCategory, ProductGallery
+
+IMAGE_FIELDS = ((ProductGallery, "image"), (Manufacturer, "logo"), (ParentCategory, "icon"), (Banner, "image"))
+
+
+class Command(BaseCommand):
+    help = "Render the WebP/JPEG derivatives of every uploaded image that doesn't have them yet"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=settings.IMAGE_DERIVATIVE_WORKERS)
+
+    def handle(self, *args, **options):
+        names = set()
+        for model, field in IMAGE_FIELDS:
+            names.update(name for name in model.objects.exclude(**{field: ""}).values_list(field, flat=True) if name)
+        rendered = failed = 0
+        with ProcessPoolExecutor(max_workers=options["workers"]) as executor:
+            futures = {executor.submit(generate_derivatives, name): name for name in sorted(names)}
+            for future in as_completed(futures):
+                try:
+                    rendered += len(future.result())
+                except OSError as e:
+                    failed += 1
+                    self.stderr.write(f"{futures[future]}: {e}")
+        self.stdout.write(self.style.SUCCESS(f"{len(names)} images, {rendered} derivatives, {failed} failed"))
@@ -0,0 +1,48 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.product.imports import CatalogImporter, read_csv, read_xlsx
+
+
+class Command(BaseCommand):
+    help = (
+        "Create or update products by product_code from a CSV or XLSX file. Columns: product_code, title, category "
+        "(slug or title), and optionally manufacturer (title), price, sale_price, in_stock_count, is_active, is_sale, "
+        "is_recommended, description, features"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=("csv", "xlsx"), help="Defaults to the file extension")
+        parser.add_argument("--delimiter", default=",", help="CSV delimiter")
+        parser.add_argument("--sheet", help="XLSX sheet name, the active sheet by default")
+        parser.add_argument("--chunk-size", type=int, default=2000)
+        parser.add_argument("--create-manufacturers", action="store_true",
+                            help="Create manufacturers that don't exist yet instead of rejecting their rows")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        if not os.path.exists(path):
+            raise CommandError(f"{path} does not exist")
+        file_format = options["format"] or os.path.splitext(path)[1].lstrip(".").lower()
+        if file_format == "csv":
+            rows = read_csv(path, options["delimiter"])
+        elif file_format == "xlsx":
+            rows = read_xlsx(path, options["sheet"])
+        else:
+            raise CommandError("Can't tell the file format from the extension, pass --format")
+
+        importer = CatalogImporter(options["chunk_size"], options["create_manufacturers"], log=self.stdout.write)
+        try:
+            rate = importer.import_rows(rows)
+        except (ValueError, KeyError) as error:
+            raise CommandError(str(error))
+        for line, message in importer.errors[:20]:
+            self.stderr.write(f"line {line}: {message}")
+        if len(importer.errors) > 20:
+            self.stderr.write(f"... and {len(importer.errors) - 20} more")
+        self.stdout.write(self.style.SUCCESS(
+            f"{importer.created} created, {importer.updated} updated, {len(importer.errors)} skipped, "
+            f"{rate:.0f} rows/s"
+        ))
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.product.models import SearchHistory, SearchQueryBucket
+from apps.product.popular_searches import merge_search_counts, normalize_query, truncate_to_bucket
+
+
+class Command(BaseCommand):
+    help = "Rebuild the hourly popular-search buckets from the full search history, chunk by chunk"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        last_pk = 0
+        total = 0
+        with transaction.atomic():
+            SearchQueryBucket.objects.all().delete()
+            while True:
+                searches = list(
+                    SearchHistory.objects.filter(pk__gt=last_pk).order_by("pk")
+                    .values_list("pk", "query", "created_at")[:chunk_size]
+                )
+                if not searches:
+                    break
+                last_pk = searches[-1][0]
+                total += len(searches)
+                buckets = {}
+                for pk, query, created_at in searches:
+                    normalized = normalize_query(query)
+                    if not normalized:
+                        continue
+                    key = (normalized, truncate_to_bucket(created_at))
+                    label, count = buckets.get(key, (query.strip()[:250], 0))
+                    buckets[key] = (label, count + 1)
+                merge_search_counts([
+                    (normalized, label, bucket, count) for (normalized, bucket), (label, count) in buckets.items()
+                ])
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} searches rolled up into {SearchQueryBucket.objects.count()} buckets"
+        ))
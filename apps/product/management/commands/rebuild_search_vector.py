@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.product.models import Product
+from apps.product.search import update_search_vector
+
+
+class Command(BaseCommand):
+    help = "Rebuild Product.search_vector for the whole catalog, chunk by chunk"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        last_pk = 0
+        updated = 0
+        while True:
+            pks = list(Product.objects.filter(pk__gt=last_pk).order_by("pk").values_list("pk", flat=True)[:chunk_size])
+            if not pks:
+                break
+            last_pk = pks[-1]
+            with transaction.atomic():
+                updated += update_search_vector(Product.objects.filter(pk__in=pks))
+        self.stdout.write(self.style.SUCCESS(f"{updated} products reindexed"))
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from apps.product.choices import OrderStatusChoices
+from apps.product.models import Order, Product
+
+
+def get_sold_counts(product_ids):
+    """How many SOLD orders counted each product, from the products they stored when they entered SOLD."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT product.id::bigint, COUNT(*) FROM {Order._meta.db_table} o "
+            f"CROSS JOIN LATERAL jsonb_array_elements_text(o.sold_products) AS product(id) "
+            f"WHERE o.status = %s AND product.id::bigint = ANY(%s) GROUP BY 1",
+            [OrderStatusChoices.SOLD, product_ids],
+        )
+        return dict(cursor.fetchall())
+
+
+class Command(BaseCommand):
+    help = "Backfill Product.sold_count from sold orders and repair drift, chunk by chunk"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=2000)
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        dry_run = options["dry_run"]
+        last_pk = 0
+        checked = repaired = 0
+        while True:
+            products = list(
+                Product.objects.filter(pk__gt=last_pk).order_by("pk").only("pk", "sold_count")[:chunk_size]
+            )
+            if not products:
+                break
+            last_pk = products[-1].pk
+            checked += len(products)
+            with transaction.atomic():
+                counts = get_sold_counts([product.pk for product in products])
+                drifted = []
+                for product in products:
+                    sold_count = counts.get(product.pk, 0)
+                    if product.sold_count != sold_count:
+                        product.sold_count = sold_count
+                        drifted.append(product)
+                if drifted and not dry_run:
+                    Product.objects.bulk_update(drifted, ["sold_count"])
+            repaired += len(drifted)
+        action = "would be repaired" if dry_run else "repaired"
+        self.stdout.write(self.style.SUCCESS(f"{checked} products checked, {repaired} {action}"))
@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.product.seeding import CatalogSeeder
+
+
+class Command(BaseCommand):
+    help = "Generate a synthetic catalog with views, saved products, carts, orders and search history"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=200000)
+        parser.add_argument("--galleries", type=int, default=2, help="Gallery images per product")
+        parser.add_argument("--fingerprints", type=int, default=100000)
+        parser.add_argument("--views", type=int, default=5000000)
+        parser.add_argument("--saved", type=int, default=500000)
+        parser.add_argument("--carts", type=int, default=500000)
+        parser.add_argument("--items-per-cart", type=int, default=3)
+        parser.add_argument("--orders", type=int, default=500000)
+        parser.add_argument("--searches", type=int, default=1000000)
+        parser.add_argument("--seed", type=int, default=0, help="Random seed, the same seed gives the same data")
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--prefix", default="seed", help="Prefix of generated slugs, codes and fingerprints")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        seeder = CatalogSeeder(
+            seed=options["seed"], batch_size=options["batch_size"], prefix=options["prefix"],
+            log=lambda message: self.stdout.write(f"{time.perf_counter() - start:8.1f}s  {message}"),
+        )
+        with transaction.atomic():
+            seeder.seed(
+                products=options["products"], galleries=options["galleries"], fingerprints=options["fingerprints"],
+                views=options["views"], saved=options["saved"], carts=options["carts"],
+                items_per_cart=options["items_per_cart"], orders=options["orders"], searches=options["searches"],
+            )
+        self.stdout.write(self.style.SUCCESS(f"Seeded in {time.perf_counter() - start:.1f}s"))
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.6 on 2026-10-18 14:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='savedproduct',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saved', to='product.product', verbose_name='Product'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.6 on 2026-10-18 14:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0002_savedproduct_related_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='sold_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Sold count'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='sold_products',
+            field=models.JSONField(default=list, editable=False, verbose_name='Sold products'),
+        ),
+        # For orders already SOLD, their cart's current lines are the best record left of what they sold.
+        migrations.RunSQL(
+            """
+            UPDATE product_order o
+            SET sold_products = s.sold_products
+            FROM (
+                SELECT item.cart_id, json_agg(item.product_id ORDER BY item.product_id) AS sold_products
+                FROM product_cartitem item
+                GROUP BY item.cart_id
+            ) s
+            WHERE o.cart_id = s.cart_id AND o.status = 'sold'
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
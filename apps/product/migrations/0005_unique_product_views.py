@@ -0,0 +1,30 @@
+# Generated by Django 4.2.6 on 2026-10-18 14:59
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0004_product_search'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            """
+            DELETE FROM product_productview a USING product_productview b
+            WHERE a.product_id = b.product_id AND a.fingerprint = b.fingerprint AND a.id > b.id;
+            DELETE FROM product_lastseenproduct a USING product_lastseenproduct b
+            WHERE a.product_id = b.product_id AND a.fingerprint = b.fingerprint AND a.id > b.id;
+            """,
+            migrations.RunSQL.noop,
+        ),
+        migrations.AlterUniqueTogether(
+            name='lastseenproduct',
+            unique_together={('product', 'fingerprint')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='productview',
+            unique_together={('product', 'fingerprint')},
+        ),
+    ]
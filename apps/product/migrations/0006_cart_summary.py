@@ -0,0 +1,46 @@
+# Generated by Django 4.2.6 on 2026-10-18 15:00
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0005_unique_product_views'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='items_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Items count'),
+        ),
+        migrations.AddField(
+            model_name='cart',
+            name='sale_total_price',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0'), editable=False, max_digits=18, verbose_name='Sale total price'),
+        ),
+        migrations.AddField(
+            model_name='cart',
+            name='total_price',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0'), editable=False, max_digits=18, verbose_name='Total price'),
+        ),
+        migrations.RunSQL(
+            """
+            UPDATE product_cart c
+            SET items_count = s.items_count, total_price = s.total_price, sale_total_price = s.sale_total_price
+            FROM (
+                SELECT item.cart_id,
+                       COUNT(item.id) AS items_count,
+                       SUM(item.quantity * product.price) AS total_price,
+                       SUM(item.quantity * COALESCE(product.sale_price, product.price)) AS sale_total_price
+                FROM product_cartitem item
+                JOIN product_product product ON product.id = item.product_id
+                GROUP BY item.cart_id
+            ) s
+            WHERE c.id = s.cart_id
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
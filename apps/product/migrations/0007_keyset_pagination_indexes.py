@@ -0,0 +1,41 @@
+# Generated by Django 4.2.6 on 2026-10-18 15:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0006_cart_summary'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cartitem',
+            index=models.Index(fields=['cart', 'created_at', 'id'], name='cartitem_cart_created_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lastseenproduct',
+            index=models.Index(fields=['fingerprint', 'created_at', 'id'], name='lastseen_fp_created_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['created_at', 'id'], name='product_created_at_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['price', 'id'], name='product_price_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['views_count', 'id'], name='product_views_count_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='savedproduct',
+            index=models.Index(fields=['fingerprint', 'created_at', 'id'], name='savedproduct_fp_created_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='searchhistory',
+            index=models.Index(fields=['fingerprint', 'created_at', 'id'], name='search_fp_created_at_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.6 on 2026-10-18 15:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0007_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cart',
+            index=models.Index(fields=['fingerprint', 'created_at', 'id'], name='cart_fp_created_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cart',
+            index=models.Index(condition=models.Q(('status', 'active')), fields=['fingerprint'], name='cart_active_fp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productview',
+            index=models.Index(fields=['fingerprint', 'created_at'], name='productview_fp_created_at_idx'),
+        ),
+    ]
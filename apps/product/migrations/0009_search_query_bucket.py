@@ -0,0 +1,29 @@
+# Generated by Django 4.2.6 on 2026-10-18 15:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0008_fingerprint_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchQueryBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('query', models.CharField(max_length=250, verbose_name='Query')),
+                ('label', models.CharField(max_length=250, verbose_name='Label')),
+                ('bucket', models.DateTimeField(verbose_name='Bucket')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Count')),
+            ],
+            options={
+                'verbose_name': 'Search Query Bucket',
+                'verbose_name_plural': 'Search Query Buckets',
+                'indexes': [models.Index(fields=['bucket'], name='searchquerybucket_bucket_idx')],
+                'unique_together': {('query', 'bucket')},
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.6 on 2026-10-18 15:33
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0009_search_query_bucket'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            """
+            WITH merged AS (
+                SELECT MIN(id) AS id, cart_id, SUM(quantity) AS quantity
+                FROM product_cartitem GROUP BY cart_id, product_id HAVING COUNT(*) > 1
+            ), kept AS (
+                UPDATE product_cartitem i SET quantity = merged.quantity FROM merged WHERE i.id = merged.id
+                RETURNING i.cart_id, i.product_id, i.id
+            )
+            DELETE FROM product_cartitem a USING kept
+            WHERE a.cart_id = kept.cart_id AND a.product_id = kept.product_id AND a.id <> kept.id;
+            UPDATE product_cart c SET items_count = s.items_count
+            FROM (SELECT cart_id, COUNT(*) AS items_count FROM product_cartitem GROUP BY cart_id) s
+            WHERE c.id = s.cart_id AND c.items_count <> s.items_count;
+            """,
+            migrations.RunSQL.noop,
+        ),
+        migrations.AlterUniqueTogether(
+            name='cartitem',
+            unique_together={('cart', 'product')},
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.6 on 2026-10-18 16:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0010_unique_cart_items'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='stock_lines',
+            field=models.JSONField(default=list, editable=False, verbose_name='Reserved stock'),
+        ),
+        # Orders placed before this holding stock reserved what their cart held then; the current cart is the best
+        # record of that left.
+        migrations.RunSQL(
+            """
+            UPDATE product_order o
+            SET stock_lines = s.stock_lines
+            FROM (
+                SELECT item.cart_id, json_agg(json_build_array(item.product_id, item.quantity) ORDER BY item.product_id)
+                       AS stock_lines
+                FROM product_cartitem item
+                GROUP BY item.cart_id
+            ) s
+            WHERE o.cart_id = s.cart_id AND o.in_stock_subtracted
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.6 on 2026-10-18 15:49
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0011_order_stock_lines'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_price_id_idx',
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='effective_price',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0'), editable=False, max_digits=18, verbose_name='Effective price'),
+        ),
+        migrations.RunSQL(
+            "UPDATE product_product SET effective_price = COALESCE(sale_price, price)",
+            migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['effective_price', 'id'], name='product_effective_price_id_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.6 on 2026-10-18 16:04
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0012_product_effective_price'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('language', models.CharField(max_length=16, verbose_name='Language')),
+                ('stamp', models.CharField(max_length=100, verbose_name='Stamp')),
+                ('body', models.TextField(verbose_name='Body')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='documents', to='product.product', verbose_name='Product')),
+            ],
+            options={
+                'verbose_name': 'Product Document',
+                'verbose_name_plural': 'Product Documents',
+                'unique_together': {('product', 'language')},
+            },
+        ),
+    ]
@@ -1,11 +1,17 @@
 from decimal import Decimal
+from functools import partial
 
 from ckeditor_uploader.fields import RichTextUploadingField
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
 from django.core.exceptions import ValidationError
-from django.db import models
-from django.db.models import Sum, F
+from django.db import connection, models, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest, Upper
 
+from apps.common.cache import bump_cache_version
 from apps.common.model import BaseModel
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 from apps.common.utils import generate_unique_slug
@@ -36,7 +42,7 @@ class ParentCategory(BaseModel):
 
     def save(self, *args, **kwargs):
         if not self.slug:
-            self.slug = generate_unique_slug(Category, self.title)
+            self.slug = generate_unique_slug(ParentCategory, self.title)
         super(ParentCategory, self).save(*args, **kwargs)
 
     def __str__(self):
@@ -80,18 +86,31 @@ class Product(BaseModel):
     price = models.DecimalField(max_digits=18, decimal_places=2, verbose_name=_('Price'), default=Decimal('0'))
     sale_price = models.DecimalField(max_digits=18, decimal_places=2, verbose_name=_('Sale Price'), blank=True,
                                      null=True)
+    # sale_price when the product is on sale, price otherwise. Stored and indexed so price filters and ordering
+    # don't have to compute it per row; kept in sync by save() and by the bulk writers (imports, price feed).
+    effective_price = models.DecimalField(max_digits=18, decimal_places=2, verbose_name=_('Effective price'),
+                                          default=Decimal('0'), editable=False)
     in_stock_count = models.PositiveIntegerField(default=9999, verbose_name=_('In stock count'))
     views_count = models.PositiveIntegerField(default=0, verbose_name=_('Views count'))
+    sold_count = models.PositiveIntegerField(default=0, verbose_name=_('Sold count'))
     is_recommended = models.BooleanField(default=False, verbose_name=_('Is recommended'))
     is_active = models.BooleanField(default=True, verbose_name=_('Active'))
     is_sale = models.BooleanField(default=False, verbose_name=_('Is sale'))
+    search_vector = SearchVectorField(null=True, editable=False)
 
     def get_gallery(self):
         return self.gallery.all()
 
+    def get_effective_price(self):
+        return self.sale_price if self.sale_price is not None else self.price
+
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = generate_unique_slug(Product, self.title)
+        self.effective_price = self.get_effective_price()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and {"price", "sale_price"} & set(update_fields):
+            kwargs["update_fields"] = {*update_fields, "effective_price"}
         super(Product, self).save(*args, **kwargs)
 
     def __str__(self):
@@ -100,6 +119,14 @@ class Product(BaseModel):
     class Meta:
         verbose_name = _("Product")
         verbose_name_plural = _("Products")
+        indexes = [
+            GinIndex(fields=["search_vector"], name="product_search_vector_idx"),
+            GinIndex(fields=["title"], opclasses=["gin_trgm_ops"], name="product_title_trgm_idx"),
+            GinIndex(OpClass(Upper("product_code"), name="gin_trgm_ops"), name="product_code_trgm_idx"),
+            models.Index(fields=["created_at", "id"], name="product_created_at_id_idx"),
+            models.Index(fields=["effective_price", "id"], name="product_effective_price_id_idx"),
+            models.Index(fields=["views_count", "id"], name="product_views_count_id_idx"),
+        ]
 
 
 class ProductView(BaseModel):
@@ -114,6 +141,10 @@ class ProductView(BaseModel):
     class Meta:
         verbose_name = _("ProductView")
         verbose_name_plural = _("ProductViews")
+        unique_together = ("product", "fingerprint")
+        indexes = [
+            models.Index(fields=["fingerprint", "created_at"], name="productview_fp_created_at_idx"),
+        ]
 
 
 class ProductGallery(models.Model):
@@ -130,6 +161,27 @@ class ProductGallery(models.Model):
         verbose_name_plural = _("Product Galleries")
 
 
+class ProductDocument(models.Model):
+    """
+    A product serialized once per language, without the per-fingerprint flags; see ``apps.product.documents``.
+    ``stamp`` records the ``updated_at`` of the product, category and manufacturer it was rendered from.
+    """
+    product = models.ForeignKey(
+        "product.Product", on_delete=models.CASCADE, verbose_name=_("Product"), related_name="documents"
+    )
+    language = models.CharField(max_length=16, verbose_name=_("Language"))
+    stamp = models.CharField(max_length=100, verbose_name=_("Stamp"))
+    body = models.TextField(verbose_name=_("Body"))
+
+    def __str__(self):
+        return f"{self.product_id} ({self.language})"
+
+    class Meta:
+        verbose_name = _("Product Document")
+        verbose_name_plural = _("Product Documents")
+        unique_together = ("product", "language")
+
+
 class LastSeenProduct(BaseModel):
     product = models.ForeignKey(
         "product.Product", verbose_name=_("Product"), on_delete=models.CASCADE, related_name="last_seen"
@@ -142,11 +194,15 @@ class LastSeenProduct(BaseModel):
     class Meta:
         verbose_name = _("LastSeenProduct")
         verbose_name_plural = _("LastSeenProducts")
+        unique_together = ("product", "fingerprint")
+        indexes = [
+            models.Index(fields=["fingerprint", "created_at", "id"], name="lastseen_fp_created_at_idx"),
+        ]
 
 
 class SavedProduct(BaseModel):
     product = models.ForeignKey(
-        "product.Product", verbose_name=_("Product"), on_delete=models.CASCADE, related_name="save"
+        "product.Product", verbose_name=_("Product"), on_delete=models.CASCADE, related_name="saved"
     )
     fingerprint = models.CharField(max_length=250, verbose_name=_("Fingerprint"))
 
@@ -157,6 +213,9 @@ class SavedProduct(BaseModel):
         verbose_name = _("SaveProduct")
         verbose_name_plural = _("SaveProducts")
         unique_together = ("product", "fingerprint")
+        indexes = [
+            models.Index(fields=["fingerprint", "created_at", "id"], name="savedproduct_fp_created_at_idx"),
+        ]
 
 
 class Banner(BaseModel):
@@ -180,14 +239,55 @@ class Banner(BaseModel):
         verbose_name_plural = _("Banners")
 
 
+class CartQuerySet(models.QuerySet):
+    def refresh_summary(self):
+        """Recompute the stored summary of every cart in the queryset with a single grouped UPDATE."""
+        ids_sql, params = self.values("pk").query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                UPDATE {Cart._meta.db_table} c
+                SET items_count = s.items_count, total_price = s.total_price, sale_total_price = s.sale_total_price
+                FROM (
+                    SELECT cart.id,
+                           COUNT(item.id) AS items_count,
+                           COALESCE(SUM(item.quantity * product.price), 0) AS total_price,
+                           COALESCE(SUM(item.quantity * product.effective_price), 0) AS sale_total_price
+                    FROM {Cart._meta.db_table} cart
+                    LEFT JOIN {CartItem._meta.db_table} item ON item.cart_id = cart.id
+                    LEFT JOIN {Product._meta.db_table} product ON product.id = item.product_id
+                    WHERE cart.id IN ({ids_sql})
+                    GROUP BY cart.id
+                ) s
+                WHERE c.id = s.id
+                """,
+                params,
+            )
+
+
 class Cart(BaseModel):
     fingerprint = models.CharField(max_length=250, verbose_name=_("Fingerprint"))
     status = models.CharField(max_length=250, verbose_name=_("Status"), choices=CartStatusChoices.choices,
                               default=CartStatusChoices.ACTIVE)
+    items_count = models.PositiveIntegerField(default=0, verbose_name=_("Items count"), editable=False)
+    total_price = models.DecimalField(max_digits=18, decimal_places=2, verbose_name=_("Total price"),
+                                      default=Decimal('0'), editable=False)
+    sale_total_price = models.DecimalField(max_digits=18, decimal_places=2, verbose_name=_("Sale total price"),
+                                           default=Decimal('0'), editable=False)
+
+    objects = CartQuerySet.as_manager()
 
     @property
-    def total_price(self):
-        return self.items.aggregate(total_price=Sum(F("quantity") * F("product__price")))["total_price"]
+    def total_savings(self):
+        return self.total_price - self.sale_total_price
+
+    def get_summary(self):
+        return {
+            "quantity": self.items_count,
+            "total_price": self.total_price,
+            "sale_total_price": self.sale_total_price,
+            "total_savings": self.total_savings,
+        }
 
     def __str__(self):
         return self.fingerprint
@@ -195,6 +295,11 @@ class Cart(BaseModel):
     class Meta:
         verbose_name = _("Cart")
         verbose_name_plural = _("Carts")
+        indexes = [
+            models.Index(fields=["fingerprint", "created_at", "id"], name="cart_fp_created_at_idx"),
+            models.Index(fields=["fingerprint"], name="cart_active_fp_idx",
+                         condition=models.Q(status=CartStatusChoices.ACTIVE)),
+        ]
 
 
 class CartItem(BaseModel):
@@ -209,6 +314,25 @@ class CartItem(BaseModel):
     class Meta:
         verbose_name = _("Cart Item")
         verbose_name_plural = _("Cart Items")
+        unique_together = ("cart", "product")
+        indexes = [
+            models.Index(fields=["cart", "created_at", "id"], name="cartitem_cart_created_at_idx"),
+        ]
+
+
+class InsufficientStock(ValidationError):
+    def __init__(self, products):
+        self.products = list(products)
+        super().__init__(
+            _("Not enough in stock: %(products)s"), code="insufficient_stock",
+            params={"products": ", ".join(self.products)},
+        )
+
+
+def bump_banner_cache():
+    # Stock and sold counts are written with queryset.update(), which sends no post_save, so the cached banners
+    # (which embed their product) are invalidated here, after commit like the signals do.
+    transaction.on_commit(partial(bump_cache_version, "banner"))
 
 
 class Order(BaseModel):
@@ -218,6 +342,85 @@ class Order(BaseModel):
     status = models.CharField(max_length=250, verbose_name=_("Status"), choices=OrderStatusChoices.choices,
                               default=OrderStatusChoices.IN_MODERATION)
     in_stock_subtracted = models.BooleanField(default=False, verbose_name=_("In stock"))
+    # [[product_id, quantity], ...] as taken out of stock, so cancelling gives back exactly that even if the cart
+    # was edited after the order was placed.
+    stock_lines = models.JSONField(default=list, editable=False, verbose_name=_("Reserved stock"))
+    # Ids of the products counted in sold_count when the order entered SOLD, so leaving SOLD or deleting the order
+    # takes back exactly those.
+    sold_products = models.JSONField(default=list, editable=False, verbose_name=_("Sold products"))
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            previous_status = None
+            if self.pk:
+                row = (
+                    Order.objects.select_for_update().filter(pk=self.pk)
+                    .values_list("status", "in_stock_subtracted", "stock_lines", "sold_products").first()
+                )
+                if row:
+                    previous_status, self.in_stock_subtracted, self.stock_lines, self.sold_products = row
+            cancelled = self.status == OrderStatusChoices.CANCELLED
+            if not cancelled and not self.in_stock_subtracted \
+                    and previous_status in (None, OrderStatusChoices.CANCELLED):
+                self.reserve_stock()
+                self.in_stock_subtracted = True
+            elif cancelled and self.in_stock_subtracted:
+                self.release_stock()
+                self.in_stock_subtracted = False
+                self.stock_lines = []
+            sold, was_sold = self.status == OrderStatusChoices.SOLD, previous_status == OrderStatusChoices.SOLD
+            if sold and not was_sold:
+                self.sold_products = list(
+                    CartItem.objects.filter(cart_id=self.cart_id).order_by("product_id")
+                    .values_list("product_id", flat=True)
+                )
+                self.adjust_sold_count(1)
+            elif was_sold and not sold:
+                self.adjust_sold_count(-1)
+                self.sold_products = []
+            if kwargs.get("update_fields") is not None:
+                kwargs["update_fields"] = {
+                    *kwargs["update_fields"], "in_stock_subtracted", "stock_lines", "sold_products",
+                }
+            super(Order, self).save(*args, **kwargs)
+
+    def get_stock_lines(self):
+        # Always in product order, so concurrent orders lock the product rows in the same order and can't deadlock.
+        return (
+            CartItem.objects.filter(cart_id=self.cart_id).order_by("product_id").values_list("product_id", "quantity")
+        )
+
+    def reserve_stock(self):
+        """
+        Take every line of the order out of stock, or none of them. Each line is a conditional UPDATE that only
+        matches while enough stock is left, so concurrent checkouts never oversell and never wait on a read lock.
+        The row lock each UPDATE takes is held until the surrounding transaction commits (the whole request under
+        ATOMIC_REQUESTS), so checkouts of the same product queue behind each other for that long.
+        """
+        lines = [[product_id, quantity] for product_id, quantity in self.get_stock_lines()]
+        with transaction.atomic():
+            short = [
+                product_id for product_id, quantity in lines
+                if not Product.objects.filter(pk=product_id, in_stock_count__gte=quantity)
+                .update(in_stock_count=F("in_stock_count") - quantity, updated_at=timezone.now())
+            ]
+            if short:
+                raise InsufficientStock(Product.objects.filter(pk__in=short).values_list("title", flat=True))
+            bump_banner_cache()
+        self.stock_lines = lines
+
+    def release_stock(self):
+        for product_id, quantity in self.stock_lines:
+            Product.objects.filter(pk=product_id).update(
+                in_stock_count=F("in_stock_count") + quantity, updated_at=timezone.now(),
+            )
+        bump_banner_cache()
+
+    def adjust_sold_count(self, delta):
+        Product.objects.filter(pk__in=self.sold_products).update(
+            sold_count=Greatest(F("sold_count") + delta, 0), updated_at=timezone.now()
+        )
+        bump_banner_cache()
 
     def __str__(self):
         return self.name
@@ -237,3 +440,24 @@ class SearchHistory(BaseModel):
     class Meta:
         verbose_name = _("Search History")
         verbose_name_plural = _("Search Histories")
+        indexes = [
+            models.Index(fields=["fingerprint", "created_at", "id"], name="search_fp_created_at_idx"),
+        ]
+
+
+class SearchQueryBucket(models.Model):
+    query = models.CharField(max_length=250, verbose_name=_("Query"))
+    label = models.CharField(max_length=250, verbose_name=_("Label"))
+    bucket = models.DateTimeField(verbose_name=_("Bucket"))
+    count = models.PositiveIntegerField(default=0, verbose_name=_("Count"))
+
+    def __str__(self):
+        return self.query
+
+    class Meta:
+        verbose_name = _("Search Query Bucket")
+        verbose_name_plural = _("Search Query Buckets")
+        unique_together = ("query", "bucket")
+        indexes = [
+            models.Index(fields=["bucket"], name="searchquerybucket_bucket_idx"),
+        ]
@@ -0,0 +1,90 @@
+from apps.product.choices import CartStatusChoices
+from apps.product.models import CartItem, SavedProduct
+
+
+class Personalization:
+    """
+    Per-request lookup of fingerprint-scoped product state.
+
+    Saved and in-cart product ids are loaded once per request as id sets, so serializing N products costs a
+    fixed number of queries.
+    """
+
+    def __init__(self, fingerprint=None):
+        self.fingerprint = fingerprint
+        self._saved_ids = None
+        self._cart_ids = None
+
+    @classmethod
+    def for_request(cls, request):
+        if request is None:
+            return cls()
+        personalization = getattr(request, "_personalization", None)
+        if personalization is None:
+            personalization = cls(request.headers.get("Fingerprint"))
+            request._personalization = personalization
+        return personalization
+
+    @property
+    def saved_ids(self):
+        if self._saved_ids is None:
+            if self.fingerprint:
+                self._saved_ids = set(
+                    SavedProduct.objects.filter(fingerprint=self.fingerprint).values_list("product_id", flat=True)
+                )
+            else:
+                self._saved_ids = set()
+        return self._saved_ids
+
+    @property
+    def cart_ids(self):
+        if self._cart_ids is None:
+            if self.fingerprint:
+                self._cart_ids = set(
+                    CartItem.objects.filter(
+                        cart__fingerprint=self.fingerprint, cart__status=CartStatusChoices.ACTIVE
+                    ).values_list("product_id", flat=True)
+                )
+            else:
+                self._cart_ids = set()
+        return self._cart_ids
+
+    async def aload(self):
+        """Load both id sets ahead of serialization, which can't query the database from an async view."""
+        self._saved_ids, self._cart_ids = set(), set()
+        if self.fingerprint:
+            saved = SavedProduct.objects.filter(fingerprint=self.fingerprint).values_list("product_id", flat=True)
+            self._saved_ids = {product_id async for product_id in saved}
+            cart = CartItem.objects.filter(
+                cart__fingerprint=self.fingerprint, cart__status=CartStatusChoices.ACTIVE
+            ).values_list("product_id", flat=True)
+            self._cart_ids = {product_id async for product_id in cart}
+        return self
+
+    def is_in_saved(self, product):
+        return product.pk in self.saved_ids
+
+    def is_in_cart(self, product):
+        return product.pk in self.cart_ids
+
+    def get_stamp(self, product_ids=None):
+        """
+        A validator part that changes whenever the flags of ``product_ids`` (of any product when None) change.
+        A fingerprint's flags change without touching any ``updated_at``, so personalized responses drop
+        Last-Modified and rely on this in their ETag.
+        """
+        saved, cart = self.saved_ids, self.cart_ids
+        if product_ids is not None:
+            saved, cart = saved & set(product_ids), cart & set(product_ids)
+        return f"{sorted(saved)}:{sorted(cart)}"
+
+    def overlay(self, data):
+        data["is_in_saved"] = data["id"] in self.saved_ids
+        data["is_in_cart"] = data["id"] in self.cart_ids
+        return data
+
+    def overlay_json(self, product_id, document):
+        """``overlay`` for a JSON encoded object: the flags are spliced in before its closing brace."""
+        saved = "true" if product_id in self.saved_ids else "false"
+        cart = "true" if product_id in self.cart_ids else "false"
+        return f'{document[:-1]},"is_in_saved":{saved},"is_in_cart":{cart}}}'
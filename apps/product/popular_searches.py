@@ -0,0 +1,78 @@
+import re
+import unicodedata
+from datetime import timedelta
+
+from django.db import connection
+from django.db.models import Sum
+from django.utils import timezone
+
+from apps.common.cache import get_or_build
+from apps.product.models import SearchQueryBucket
+
+POPULAR_SEARCHES_TIMEOUT = 60
+WINDOWS = (1, 7, 30)
+
+TRANSLITERATION = str.maketrans({
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "yo", "ж": "j", "з": "z", "и": "i",
+    "й": "y", "к": "k", "л": "l", "м": "m", "н": "n", "о": "o", "п": "p", "р": "r", "с": "s", "т": "t",
+    "у": "u", "ф": "f", "х": "x", "ц": "ts", "ч": "ch", "ш": "sh", "щ": "sh", "ъ": "", "ы": "i", "ь": "",
+    "э": "e", "ю": "yu", "я": "ya", "ў": "o", "қ": "q", "ғ": "g", "ҳ": "h",
+})
+
+
+def normalize_query(query):
+    query = unicodedata.normalize("NFKC", query).casefold().translate(TRANSLITERATION)
+    # Uzbek Latin spells o'/g' with assorted apostrophes; drop them so "qo‘ng‘iroq" and "qo'ng'iroq" match.
+    query = re.sub(r"['`‘’ʻʼ]", "", query)
+    return " ".join(re.sub(r"[^\w\s]", " ", query).split())[:250]
+
+
+def truncate_to_bucket(searched_at):
+    return searched_at.replace(minute=0, second=0, microsecond=0)
+
+
+def merge_search_counts(rows):
+    """
+    Add ``(query, label, bucket, count)`` rows to the hourly buckets in one upsert. A bucket keeps the label it was
+    created with, and the popular list shows the label of the query's earliest bucket in the window, so the first
+    spelling seen wins.
+    """
+    if not rows:
+        return
+    table = SearchQueryBucket._meta.db_table
+    values = ", ".join(["(%s, %s, %s, %s)"] * len(rows))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (query, label, bucket, count) VALUES {values} "
+            f"ON CONFLICT (query, bucket) DO UPDATE SET count = {table}.count + EXCLUDED.count",
+            [value for row in rows for value in row],
+        )
+
+
+def record_search(query, searched_at=None):
+    normalized = normalize_query(query)
+    if normalized:
+        merge_search_counts([(normalized, query.strip()[:250], truncate_to_bucket(searched_at or timezone.now()), 1)])
+
+
+def get_popular_searches(days=30, limit=5):
+    """
+    Top queries over the last ``days`` days summed from the hourly buckets, so the cost depends on the number of
+    distinct queries in the window rather than on the size of the search history.
+    """
+    def build():
+        since = timezone.now() - timedelta(days=days)
+        rows = (
+            SearchQueryBucket.objects.filter(bucket__gte=since)
+            .values("query")
+            .annotate(total=Sum("count"))
+            .order_by("-total", "query")[:limit]
+        )
+        rows = list(rows)
+        labels = dict(
+            SearchQueryBucket.objects.filter(bucket__gte=since, query__in=[row["query"] for row in rows])
+            .order_by("query", "bucket").distinct("query").values_list("query", "label")
+        )
+        return [{"query": labels[row["query"]], "count": row["total"]} for row in rows]
+
+    return get_or_build(f"popular-searches:{days}:{limit}", build, POPULAR_SEARCHES_TIMEOUT)
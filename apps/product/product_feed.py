@@ -0,0 +1,129 @@
+import codecs
+import csv
+import time
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework.parsers import BaseParser
+
+from apps.common.cache import bump_cache_version
+from apps.product.choices import CartStatusChoices
+from apps.product.imports import clean_text, parse_count, parse_decimal
+from apps.product.models import Cart, Product
+
+FEED_FIELDS = ("price", "sale_price", "in_stock_count")
+# The product payloads cached under these namespaces embed prices.
+CACHE_NAMESPACES = ("banner", "manufacturer")
+
+
+class CSVParser(BaseParser):
+    """Reads a ``text/csv`` body into a list of dicts keyed by the header row without buffering the whole body."""
+    media_type = "text/csv"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get("encoding", settings.DEFAULT_CHARSET)
+        reader = csv.reader(codecs.getreader(encoding)(stream))
+        header = [name.strip().lower() for name in next(reader, [])]
+        # Empty cells mean "leave as it is", except sale_price where an empty cell ends the sale.
+        return [
+            {name: value for name, value in zip(header, values) if value.strip() or name == "sale_price"}
+            for values in reader if any(value.strip() for value in values)
+        ]
+
+
+def parse_feed_rows(rows):
+    """
+    Validate feed rows into ``{product_code: (price, set_sale_price, sale_price, in_stock_count)}``; ``None``
+    means "unchanged". A code that appears more than once keeps its last row. Returns the rows and the errors.
+    """
+    parsed, errors = {}, []
+    for index, row in enumerate(rows):
+        try:
+            if not isinstance(row, dict):
+                raise ValueError("expected an object")
+            code = clean_text(row.get("product_code"))
+            if not code:
+                raise ValueError("product_code is required")
+            price = parse_decimal(row.get("price"))
+            sale_price = parse_decimal(row.get("sale_price"))
+            stock = parse_count(row.get("in_stock_count"))
+            if any(value is not None and value < 0 for value in (price, sale_price, stock)):
+                raise ValueError("values can't be negative")
+            if stock is not None and stock != int(stock):
+                raise ValueError("in_stock_count must be a whole number")
+            if price is None and "sale_price" not in row and stock is None:
+                raise ValueError(f"nothing to update, expected one of {', '.join(FEED_FIELDS)}")
+            parsed[code] = (price, "sale_price" in row, sale_price, None if stock is None else int(stock))
+        except ValueError as error:
+            errors.append({"row": index, "error": str(error)})
+    return parsed, errors
+
+
+def apply_feed_chunk(chunk, now):
+    """
+    One statement for the whole chunk: the UPDATE ... FROM (VALUES ...) only touches rows where a value differs,
+    and the outer SELECT tells updated, unchanged and unknown codes apart from the same snapshot.
+    """
+    table = Product._meta.db_table
+    values = ", ".join(["(%s, %s::numeric, %s::boolean, %s::numeric, %s::integer)"] * len(chunk))
+    new_price = "COALESCE(v.price, p.price)"
+    new_sale_price = "CASE WHEN v.set_sale_price THEN v.sale_price ELSE p.sale_price END"
+    new_stock = "COALESCE(v.in_stock_count, p.in_stock_count)"
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            WITH v (product_code, price, set_sale_price, sale_price, in_stock_count) AS (VALUES {values}),
+            updated AS (
+                UPDATE {table} p
+                SET price = {new_price}, sale_price = {new_sale_price}, in_stock_count = {new_stock},
+                    effective_price = COALESCE({new_sale_price}, {new_price}), updated_at = %s
+                FROM v
+                WHERE p.product_code = v.product_code
+                  AND (p.price IS DISTINCT FROM {new_price} OR p.sale_price IS DISTINCT FROM {new_sale_price}
+                       OR p.in_stock_count IS DISTINCT FROM {new_stock})
+                RETURNING p.id
+            )
+            SELECT v.product_code, p.id, updated.id IS NOT NULL,
+                   p.price IS DISTINCT FROM {new_price} OR p.sale_price IS DISTINCT FROM {new_sale_price}
+            FROM v
+            LEFT JOIN {table} p ON p.product_code = v.product_code
+            LEFT JOIN updated ON updated.id = p.id
+            """,
+            [value for code, row in chunk for value in (code, *row)] + [now],
+        )
+        return cursor.fetchall()
+
+
+def apply_product_feed(rows, chunk_size=None):
+    """
+    Apply ``{product_code: row}`` from ``parse_feed_rows`` in chunks, each in its own transaction so a large feed
+    doesn't hold thousands of row locks against checkouts until it's done. Carts holding a repriced product get
+    their stored totals refreshed.
+    """
+    chunk_size = chunk_size or settings.PRODUCT_FEED_CHUNK_SIZE
+    items = list(rows.items())
+    now = timezone.now()
+    report = {"rows": len(items), "updated": 0, "unchanged": 0, "unknown": [], "chunks": []}
+    start = time.perf_counter()
+    for offset in range(0, len(items), chunk_size):
+        chunk_start = time.perf_counter()
+        with transaction.atomic():
+            result = apply_feed_chunk(items[offset:offset + chunk_size], now)
+            repriced = [pk for code, pk, updated, price_changed in result if updated and price_changed]
+            if repriced:
+                Cart.objects.filter(status=CartStatusChoices.ACTIVE, items__product_id__in=repriced).refresh_summary()
+        unknown = [code for code, pk, updated, price_changed in result if pk is None]
+        updated = sum(1 for code, pk, is_updated, price_changed in result if is_updated)
+        report["updated"] += updated
+        report["unchanged"] += len(result) - updated - len(unknown)
+        report["unknown"] += unknown
+        report["chunks"].append({
+            "rows": len(result), "updated": updated, "unknown": len(unknown),
+            "ms": round((time.perf_counter() - chunk_start) * 1000, 1),
+        })
+    if report["updated"]:
+        for namespace in CACHE_NAMESPACES:
+            bump_cache_version(namespace)
+    report["ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return report
@@ -0,0 +1,69 @@
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramSimilarity
+from django.db import connection
+from django.db.models import F, FloatField, Q
+from django.db.models.functions import Cast
+
+from apps.product.models import Category, Manufacturer, Product
+
+SEARCH_CONFIG = "simple"
+
+
+def title_columns(model):
+    # Covers the original title plus every title_<lang> column added by modeltranslation.
+    return [field.column for field in model._meta.concrete_fields if field.name == "title"
+            or field.name.startswith("title_")]
+
+
+def concat_sql(alias, columns):
+    return " || ' ' || ".join(f"coalesce({alias}.{column}, '')" for column in columns)
+
+
+def search_vector_sql():
+    return f"""
+        setweight(to_tsvector('{SEARCH_CONFIG}', {concat_sql("p", title_columns(Product))}), 'A')
+        || setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(p.product_code, '')), 'A')
+        || setweight(to_tsvector('{SEARCH_CONFIG}', coalesce((
+            SELECT {concat_sql("m", title_columns(Manufacturer))}
+            FROM {Manufacturer._meta.db_table} m WHERE m.id = p.manufacturer_id
+        ), '')), 'B')
+        || setweight(to_tsvector('{SEARCH_CONFIG}', coalesce((
+            SELECT {concat_sql("c", title_columns(Category))}
+            FROM {Category._meta.db_table} c WHERE c.id = p.category_id
+        ), '')), 'C')
+    """
+
+
+def update_search_vector(queryset):
+    ids_sql, params = queryset.values("pk").query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {Product._meta.db_table} p SET search_vector = {search_vector_sql()} WHERE p.id IN ({ids_sql})",
+            params,
+        )
+        return cursor.rowcount
+
+
+def build_search_query(value):
+    terms = re.findall(r"\w+", value.lower())
+    if not terms:
+        return None
+    return SearchQuery(" & ".join(f"{term}:*" for term in terms), config=SEARCH_CONFIG, search_type="raw")
+
+
+def search_products(queryset, value):
+    value = value.strip()
+    query = build_search_query(value)
+    if query is None:
+        return queryset
+    # Cast to double precision so the rank survives the round trip through a pagination cursor exactly.
+    return (
+        queryset.annotate(rank=Cast(SearchRank(F("search_vector"), query) + TrigramSimilarity("title", value),
+                                    FloatField()))
+        .filter(
+            Q(search_vector=query) | Q(title__trigram_similar=value) | Q(manufacturer__title__trigram_similar=value)
+            | Q(category__title__trigram_similar=value) | Q(product_code__istartswith=value)
+        )
+        .order_by("-rank", "-created_at")
+    )
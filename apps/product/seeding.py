@@ -0,0 +1,150 @@
+import random
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+
+from apps.product.choices import CartStatusChoices, OrderStatusChoices
+from apps.product.models import Banner, Cart, CartItem, Category, LastSeenProduct, Manufacturer, Order, \
+    ParentCategory, Product, ProductGallery, ProductView, SavedProduct, SearchHistory
+from apps.product.search import update_search_vector
+
+WORDS = (
+    "cable", "socket", "switch", "lamp", "panel", "breaker", "drill", "pipe", "valve", "pump", "filter", "boiler",
+    "heater", "mixer", "faucet", "sensor", "relay", "motor", "adapter", "bracket", "white", "black", "steel",
+    "copper", "plastic", "double", "single", "outdoor", "indoor", "compact", "pro", "mini", "max", "led", "smart",
+)
+
+
+class CatalogSeeder:
+    """
+    Generates a synthetic catalog with fingerprint-scoped history in bulk. Rows are written in batches so the
+    sizes can go up to millions without holding them in memory.
+    """
+
+    def __init__(self, seed=0, batch_size=5000, prefix="seed", log=None):
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        self.prefix = prefix
+        self.log = log or (lambda message: None)
+
+    def fingerprint(self, index):
+        return f"{self.prefix}-{index:032x}"
+
+    def bulk_create(self, model, rows):
+        batch = []
+        created = 0
+        for row in rows:
+            batch.append(row)
+            if len(batch) == self.batch_size:
+                model.objects.bulk_create(batch)
+                created += len(batch)
+                batch = []
+        if batch:
+            model.objects.bulk_create(batch)
+            created += len(batch)
+        self.log(f"{model._meta.verbose_name_plural}: {created}")
+        return created
+
+    def seed(self, products=10000, galleries=1, fingerprints=2000, views=50000, saved=10000, carts=5000,
+             items_per_cart=3, orders=2000, searches=20000):
+        rng = self.rng
+        parents = ParentCategory.objects.bulk_create([
+            ParentCategory(title=f"{self.prefix} {word}", slug=f"{self.prefix}-{word}") for word in WORDS[:10]
+        ])
+        categories = Category.objects.bulk_create([
+            Category(title=f"{word} {other}", slug=f"{self.prefix}-{word}-{other}", parent=rng.choice(parents))
+            for word in WORDS[:10] for other in WORDS[10:20]
+        ])
+        manufacturers = Manufacturer.objects.bulk_create(
+            [Manufacturer(title=f"{word.title()} {index}") for index in range(6) for word in WORDS]
+        )
+
+        def product_rows():
+            for index in range(products):
+                price = Decimal(rng.randint(100, 500000))
+                on_sale = rng.random() < 0.2
+                sale_price = (price * Decimal("0.8")).quantize(Decimal("1")) if on_sale else None
+                yield Product(
+                    title=" ".join(rng.sample(WORDS, 3)),
+                    slug=f"{self.prefix}-product-{index}",
+                    product_code=f"{self.prefix.upper()}{index:08d}",
+                    category=rng.choice(categories),
+                    manufacturer=rng.choice(manufacturers),
+                    price=price,
+                    sale_price=sale_price,
+                    effective_price=sale_price if on_sale else price,
+                    is_sale=on_sale,
+                    is_recommended=rng.random() < 0.05,
+                    is_active=rng.random() < 0.95,
+                    views_count=rng.randint(0, 10000),
+                )
+
+        self.bulk_create(Product, product_rows())
+        product_ids = list(
+            Product.objects.filter(slug__startswith=f"{self.prefix}-product-").values_list("pk", flat=True)
+        )
+        self.bulk_create(ProductGallery, (
+            ProductGallery(product_id=product_id, image=f"product/gallery/{self.prefix}-{product_id}-{index}.jpg")
+            for product_id in product_ids for index in range(galleries)
+        ))
+        Banner.objects.bulk_create([
+            Banner(title=f"{self.prefix} banner {index}", sub_title=word, image=f"banner/{self.prefix}-{index}.jpg",
+                   url="https://example.com", product_id=rng.choice(product_ids), order=index)
+            for index, word in enumerate(WORDS[:5])
+        ])
+
+        def unique_pairs(count):
+            per_fingerprint, remainder = divmod(count, fingerprints)
+            for index in range(fingerprints):
+                size = min(per_fingerprint + (index < remainder), len(product_ids))
+                for product_id in rng.sample(product_ids, size):
+                    yield product_id, self.fingerprint(index)
+
+        self.bulk_create(ProductView, (
+            ProductView(product_id=product_id, fingerprint=fingerprint)
+            for product_id, fingerprint in unique_pairs(views)
+        ))
+        self.bulk_create(LastSeenProduct, (
+            LastSeenProduct(product_id=product_id, fingerprint=fingerprint)
+            for product_id, fingerprint in unique_pairs(views)
+        ))
+        self.bulk_create(SavedProduct, (
+            SavedProduct(product_id=product_id, fingerprint=fingerprint)
+            for product_id, fingerprint in unique_pairs(saved)
+        ))
+
+        self.bulk_create(Cart, (
+            Cart(fingerprint=self.fingerprint(rng.randrange(fingerprints)),
+                 status=CartStatusChoices.ACTIVE if rng.random() < 0.3 else CartStatusChoices.INACTIVE)
+            for _ in range(carts)
+        ))
+        cart_ids = list(
+            Cart.objects.filter(fingerprint__startswith=f"{self.prefix}-").order_by("pk").values_list("pk", flat=True)
+        )
+        self.bulk_create(CartItem, (
+            CartItem(cart_id=cart_id, product_id=product_id, quantity=rng.randint(1, 5))
+            for cart_id in cart_ids
+            for product_id in rng.sample(product_ids, min(rng.randint(1, items_per_cart * 2 - 1), len(product_ids)))
+        ))
+        self.bulk_create(Order, (
+            Order(cart_id=cart_id, name=f"Customer {index}", phone=f"+99890{index:07d}",
+                  status=rng.choice(OrderStatusChoices.values))
+            for index, cart_id in enumerate(rng.sample(cart_ids, min(orders, len(cart_ids))))
+        ))
+        self.bulk_create(SearchHistory, (
+            SearchHistory(query=" ".join(rng.sample(WORDS, rng.randint(1, 2))),
+                          fingerprint=self.fingerprint(rng.randrange(fingerprints)))
+            for _ in range(searches)
+        ))
+
+        update_search_vector(Product.objects.filter(slug__startswith=f"{self.prefix}-product-"))
+        Cart.objects.filter(fingerprint__startswith=f"{self.prefix}-").refresh_summary()
+        call_command("reconcile_sold_count", stdout=StringIO())
+        call_command("rebuild_popular_searches", stdout=StringIO())
+        self.analyze()
+
+    def analyze(self):
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
@@ -1,38 +1,50 @@
 from rest_framework import serializers
 
-from apps.common.serializer import ImageSerializer
-from apps.product.choices import CartStatusChoices, OrderStatusChoices
+from apps.common.serializer import ImageSerializer, ImageSrcsetSerializer, ModelSerializer, Serializer, SrcsetField
+from apps.product.cart_operations import ADD, CART_BATCH_MAX_OPERATIONS, OPERATIONS, SET, upsert_cart_items
 from apps.product.models import Manufacturer, Category, ParentCategory, Product, Cart, Order, LastSeenProduct, \
-    SavedProduct, Banner, CartItem, SearchHistory
+    SavedProduct, Banner, CartItem, SearchHistory, InsufficientStock
+from apps.product.personalization import Personalization
 
 
-class ManufacturerSerializer(serializers.ModelSerializer):
+class ManufacturerSerializer(ModelSerializer):
+    logo_srcset = SrcsetField(source="logo")
+
     class Meta:
         model = Manufacturer
-        fields = ("id", "title", "logo")
+        fields = ("id", "title", "logo", "logo_srcset")
 
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(ModelSerializer):
     class Meta:
         model = Category
         fields = ("id", "title", "slug", "parent")
 
 
-class ParentCategorySerializer(serializers.ModelSerializer):
-    categories = CategorySerializer(many=True, read_only=True)
+class CategoryTreeSerializer(CategorySerializer):
+    product_count = serializers.IntegerField(read_only=True)
+
+    class Meta(CategorySerializer.Meta):
+        fields = CategorySerializer.Meta.fields + ("product_count",)
+
+
+class ParentCategorySerializer(ModelSerializer):
+    categories = CategoryTreeSerializer(many=True, read_only=True)
+    icon_srcset = SrcsetField(source="icon")
+    product_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = ParentCategory
-        fields = ("id", "title", "slug", "icon", "categories")
+        fields = ("id", "title", "slug", "icon", "icon_srcset", "product_count", "categories")
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(ModelSerializer):
     category = CategorySerializer(read_only=True)
     manufacturer = ManufacturerSerializer(read_only=True)
-    gallery = ImageSerializer(many=True, source="get_gallery")
+    gallery = ImageSerializer(many=True, read_only=True)
+    gallery_srcset = ImageSrcsetSerializer(source="gallery", many=True, read_only=True)
     is_in_saved = serializers.SerializerMethodField()
     is_in_cart = serializers.SerializerMethodField()
-    sold_count = serializers.SerializerMethodField()
 
     class Meta:
         model = Product
@@ -51,6 +63,7 @@ class ProductSerializer(serializers.ModelSerializer):
             "is_active",
             "is_sale",
             "gallery",
+            "gallery_srcset",
             "is_in_saved",
             "is_in_cart",
             "sold_count",
@@ -58,29 +71,22 @@ class ProductSerializer(serializers.ModelSerializer):
         )
 
     def get_is_in_saved(self, obj):
-        request = self.context.get("request")
-        if request:
-            fingerprint = request.headers.get("Fingerprint")
-            if fingerprint:
-                return obj.saved.filter(fingerprint=fingerprint).exists()
-        return False
+        return Personalization.for_request(self.context.get("request")).is_in_saved(obj)
 
     def get_is_in_cart(self, obj):
-        request = self.context.get("request")
-        if request:
-            fingerprint = request.headers.get("Fingerprint")
-            if fingerprint:
-                return obj.cart_item.filter(cart__fingerprint=fingerprint,
-                                            cart__status=CartStatusChoices.ACTIVE).exists()
-        return False
+        return Personalization.for_request(self.context.get("request")).is_in_cart(obj)
+
 
-    def get_sold_count(self, obj):
-        cart = Cart.objects.filter(items__product=obj)
-        order = Order.objects.filter(cart__in=cart, status=OrderStatusChoices.SOLD)
-        return order.count()
+class ProductDocumentSerializer(ProductSerializer):
+    # The flags depend on the fingerprint, they are spliced into the stored document per request.
+    is_in_saved = None
+    is_in_cart = None
 
+    class Meta(ProductSerializer.Meta):
+        fields = tuple(field for field in ProductSerializer.Meta.fields if field not in ("is_in_saved", "is_in_cart"))
 
-class LastSeenProductSerializer(serializers.ModelSerializer):
+
+class LastSeenProductSerializer(ModelSerializer):
     product = ProductSerializer(read_only=True)
 
     class Meta:
@@ -88,7 +94,7 @@ class LastSeenProductSerializer(serializers.ModelSerializer):
         fields = ("id", "product")
 
 
-class SavedProductSerializer(serializers.ModelSerializer):
+class SavedProductSerializer(ModelSerializer):
     product = ProductSerializer(read_only=True)
 
     class Meta:
@@ -96,35 +102,71 @@ class SavedProductSerializer(serializers.ModelSerializer):
         fields = ("id", "product", "fingerprint")
 
 
-class SavedProductCreateSerializer(serializers.ModelSerializer):
+class SavedProductCreateSerializer(ModelSerializer):
     class Meta:
         model = SavedProduct
         fields = ("id", "product", "fingerprint")
 
 
-class BannerSerializer(serializers.ModelSerializer):
+class BannerSerializer(ModelSerializer):
     product = ProductSerializer(read_only=True)
+    image_srcset = SrcsetField(source="image")
 
     class Meta:
         model = Banner
-        fields = ("id", "title", "sub_title", "image", "is_active", "url", "product", "order")
-
+        fields = ("id", "title", "sub_title", "image", "image_srcset", "is_active", "url", "product", "order")
 
-class CartSerializer(serializers.ModelSerializer):
-    product = ProductSerializer(read_only=True)
 
+class CartSerializer(ModelSerializer):
     class Meta:
         model = Cart
         fields = ("id", "fingerprint")
 
 
-class CartItemCreateSerializer(serializers.ModelSerializer):
+class CartItemCreateSerializer(ModelSerializer):
     class Meta:
         model = CartItem
         fields = ("id", "cart", "product", "quantity")
 
+    def get_validators(self):
+        # Adding a product that is already in the cart increases its quantity instead of failing; moving an item
+        # onto a product the cart already holds still does.
+        return [] if self.instance is None else super().get_validators()
+
+    def create(self, validated_data):
+        cart, product = validated_data["cart"], validated_data["product"]
+        # One upsert, so concurrent adds of the same product all count.
+        upsert_cart_items(cart.pk, [(product.pk, validated_data.get("quantity", 1))], merge=True)
+        Cart.objects.filter(pk=cart.pk).refresh_summary()
+        return CartItem.objects.get(cart=cart, product=product)
+
 
-class CartItemListSerializer(serializers.ModelSerializer):
+class CartOperationSerializer(Serializer):
+    op = serializers.ChoiceField(choices=OPERATIONS)
+    product = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=0, required=False)
+
+    def validate(self, data):
+        if data["op"] == ADD and not data.get("quantity"):
+            raise serializers.ValidationError({"quantity": "Must be at least 1."})
+        if data["op"] == SET and "quantity" not in data:
+            raise serializers.ValidationError({"quantity": "This field is required."})
+        return data
+
+
+class CartBatchSerializer(Serializer):
+    operations = serializers.ListField(child=CartOperationSerializer(), min_length=1,
+                                       max_length=CART_BATCH_MAX_OPERATIONS)
+
+    def validate_operations(self, operations):
+        product_ids = {operation["product"] for operation in operations}
+        known = set(Product.objects.filter(pk__in=product_ids).values_list("pk", flat=True))
+        if unknown := sorted(product_ids - known):
+            raise serializers.ValidationError(f"Unknown products: {', '.join(map(str, unknown))}")
+        return operations
+
+
+class CartItemListSerializer(ModelSerializer):
     product = ProductSerializer()
 
     class Meta:
@@ -132,7 +174,7 @@ class CartItemListSerializer(serializers.ModelSerializer):
         fields = ("id", "cart", "product", "quantity")
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(ModelSerializer):
     class Meta:
         model = Order
         fields = ("id", "cart", "name", "phone")
@@ -142,8 +184,14 @@ class OrderSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Cart should not be empty")
         return data
 
+    def create(self, validated_data):
+        try:
+            return super().create(validated_data)
+        except InsufficientStock as error:
+            raise serializers.ValidationError({"cart": error.messages, "products": error.products})
+
 
-class SearchHistorySerializer(serializers.ModelSerializer):
+class SearchHistorySerializer(ModelSerializer):
     class Meta:
         model = SearchHistory
         fields = ("id", "query", "fingerprint")
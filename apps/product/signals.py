@@ -1,15 +1,23 @@
+from functools import partial
 
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_save, pre_delete, post_delete
 from django.dispatch import receiver
 from django.utils import timezone
 
-from apps.bot.utils import bot_send_message
-from apps.product.choices import CartStatusChoices
-from apps.product.models import Order
+from apps.bot.models import OutboxMessage
+from apps.common.cache import bump_cache_version
+from apps.common.images import schedule_derivatives
+from apps.product.autocomplete import mark_autocomplete_changed
+from apps.product.choices import CartStatusChoices, OrderStatusChoices
+from apps.product.models import Order, Product, Manufacturer, Category, Banner, ParentCategory, Cart, CartItem, \
+    SearchHistory, ProductGallery
+from apps.product.popular_searches import record_search
+from apps.product.search import update_search_vector
 
 
 @receiver(post_save, sender=Order)
-def send_order_created_message(sender, instance, created, **kwargs):
+def queue_order_created_message(sender, instance, created, **kwargs):
     if created:
         total_price = instance.cart.total_price
         formatted_price = f"{total_price:,.0f}".replace(",", " ").replace(".00", "") + "so'm"
@@ -27,4 +35,93 @@ def send_order_created_message(sender, instance, created, **kwargs):
         http://localhost:8000/admin/product/order/{instance.id}/change"""
         instance.cart.status = CartStatusChoices.INACTIVE
         instance.cart.save()
-        bot_send_message(instance.pk, message)
+        OutboxMessage.objects.create(order=instance, message=message)
+
+
+@receiver(pre_delete, sender=Order)
+def release_order_sold_count(sender, instance, **kwargs):
+    if instance.status == OrderStatusChoices.SOLD:
+        instance.adjust_sold_count(-1)
+
+
+@receiver(pre_delete, sender=Order)
+def release_order_stock(sender, instance, **kwargs):
+    if instance.in_stock_subtracted:
+        instance.release_stock()
+
+
+@receiver(post_save, sender=Product)
+def update_product_search_vector(sender, instance, **kwargs):
+    update_search_vector(Product.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=Manufacturer)
+def update_manufacturer_products_search_vector(sender, instance, created, **kwargs):
+    if not created:
+        update_search_vector(Product.objects.filter(manufacturer=instance))
+
+
+@receiver(post_save, sender=Category)
+def update_category_products_search_vector(sender, instance, created, **kwargs):
+    if not created:
+        update_search_vector(Product.objects.filter(category=instance))
+
+
+CACHE_NAMESPACES = {
+    Banner: ("banner",),
+    ParentCategory: ("category",),
+    Category: ("category", "banner"),
+    Manufacturer: ("manufacturer", "banner"),
+    Product: ("manufacturer", "banner", "category"),
+}
+
+
+@receiver([post_save, post_delete])
+def bump_catalog_cache_version(sender, **kwargs):
+    # After commit: bumped any earlier, a concurrent request could cache the old rows under the new version.
+    for namespace in CACHE_NAMESPACES.get(sender, ()):
+        transaction.on_commit(partial(bump_cache_version, namespace))
+
+
+@receiver([post_save, post_delete], sender=CartItem)
+def refresh_cart_summary(sender, instance, **kwargs):
+    Cart.objects.filter(pk=instance.cart_id).refresh_summary()
+
+
+@receiver(post_save, sender=Product)
+def refresh_active_carts_summary(sender, instance, created, **kwargs):
+    if not created:
+        Cart.objects.filter(status=CartStatusChoices.ACTIVE, items__product=instance).refresh_summary()
+
+
+@receiver(post_save, sender=SearchHistory)
+def count_search_query(sender, instance, created, **kwargs):
+    if created:
+        record_search(instance.query, instance.created_at)
+
+
+AUTOCOMPLETE_KINDS = {Product: "product", Manufacturer: "manufacturer", Category: "category"}
+
+
+@receiver([post_save, post_delete])
+def update_autocomplete_index(sender, instance, **kwargs):
+    kind = AUTOCOMPLETE_KINDS.get(sender)
+    if kind:
+        deleted = kwargs.get("signal") is post_delete
+        transaction.on_commit(partial(mark_autocomplete_changed, kind, instance, deleted))
+
+
+@receiver([post_save, post_delete], sender=ProductGallery)
+def touch_gallery_product(sender, instance, **kwargs):
+    # The product detail ETag is derived from the product's updated_at, which has to cover its gallery.
+    Product.objects.filter(pk=instance.product_id).update(updated_at=timezone.now())
+
+
+IMAGE_FIELDS = {ProductGallery: "image", Manufacturer: "logo", ParentCategory: "icon", Banner: "image"}
+
+
+@receiver(post_save)
+def render_image_derivatives(sender, instance, **kwargs):
+    field = IMAGE_FIELDS.get(sender)
+    if field:
+        transaction.on_commit(partial(schedule_derivatives, getattr(instance, field)))
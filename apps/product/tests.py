@@ -1,3 +1,859 @@
-from django.test import TestCase
+import json
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.test import Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+
+from apps.common.cache import bump_cache_version
+from apps.common.images import get_source_info, get_srcset
+from apps.common.metrics import registry
+from apps.common.utils import allocate_unique_slugs
+from apps.product.async_views import AsyncCartCreateView, AsyncSavedProductCreateView, AsyncSearchHistoryCreateView
+from apps.product.autocomplete import CACHE_NAMESPACE as AUTOCOMPLETE_CACHE_NAMESPACE, AutocompleteIndex
+from apps.product.category_tree import category_tree
+from apps.product.choices import OrderStatusChoices
+from apps.product.exports import iter_order_rows
+from apps.product.imports import CatalogImporter
+from apps.product.models import (
+    Banner, Cart, CartItem, Category, InsufficientStock, LastSeenProduct, Manufacturer, Order, ParentCategory, Product,
+    ProductDocument, ProductGallery, SavedProduct,
+)
+from apps.product.popular_searches import get_popular_searches, record_search
+from apps.product.product_feed import apply_product_feed, parse_feed_rows
+from apps.product.search import concat_sql, search_products, title_columns
+from apps.product.serializer import ManufacturerSerializer
+from apps.product.tracking import MemoryViewBuffer, flush_product_views, get_view_buffer, record_product_view
+
+LOCMEM_CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CachedListTests(TestCase):
+    url = "/product/manufacturer/"
+
+    def setUp(self):
+        cache.clear()
+        self.manufacturer = Manufacturer.objects.create(title="Acme", logo="manufacturer/acme.png")
+
+    def get(self, host="shop.example"):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, HTTP_HOST=host)
+        self.assertEqual(response.status_code, 200)
+        reads = [query["sql"] for query in queries.captured_queries if "product_manufacturer" in query["sql"]]
+        return response.json(), reads
+
+    def test_miss_then_hit(self):
+        data, reads = self.get()
+        self.assertEqual([item["title"] for item in data], ["Acme"])
+        self.assertTrue(reads)
+        cached, reads = self.get()
+        self.assertEqual(cached, data)
+        self.assertEqual(reads, [])
+
+    def test_save_invalidates_after_commit(self):
+        self.get()
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.manufacturer.title = "Acme Corp"
+            self.manufacturer.save()
+        # Until the transaction commits, readers keep the old version.
+        self.assertEqual(self.get()[0][0]["title"], "Acme")
+        for callback in callbacks:
+            callback()
+        data, reads = self.get()
+        self.assertEqual(data[0]["title"], "Acme Corp")
+        self.assertTrue(reads)
+
+    def test_delete_invalidates(self):
+        self.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.manufacturer.delete()
+        self.assertEqual(self.get()[0], [])
+
+    def test_urls_follow_the_requesting_host(self):
+        poisoned, _ = self.get(host="evil.example")
+        self.assertTrue(poisoned[0]["logo"].startswith("http://evil.example/media/"))
+        data, reads = self.get()
+        self.assertEqual(reads, [])
+        self.assertEqual(data[0]["logo"], "http://shop.example/media/manufacturer/acme.png")
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+@override_settings(CACHES=LOCMEM_CACHES)
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        parent = ParentCategory.objects.create(title="Light", slug="light")
+        category = Category.objects.create(title="Lamps", slug="lamps", parent=parent)
+        self.manufacturer = Manufacturer.objects.create(title="Acme", logo="manufacturer/acme.png")
+        self.lamp = Product.objects.create(title="Lamp", slug="lamp", category=category, price=10, in_stock_count=5)
+        Banner.objects.create(title="Lamp", sub_title="Sale", image="banner/lamp.png", url="https://shop.example/",
+                              product=self.lamp)
+
+    def test_matching_validators_get_304_without_serializing(self):
+        response = self.client.get("/product/manufacturer/")
+        self.assertEqual(response.status_code, 200)
+        etag, last_modified = response["ETag"], response["Last-Modified"]
+        with mock.patch.object(ManufacturerSerializer, "to_representation") as to_representation, \
+                CaptureQueriesContext(connection) as queries:
+            for headers in ({"HTTP_IF_NONE_MATCH": etag}, {"HTTP_IF_MODIFIED_SINCE": last_modified}):
+                response = self.client.get("/product/manufacturer/", **headers)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response["ETag"], etag)
+        to_representation.assert_not_called()
+        # Only the savepoints of ATOMIC_REQUESTS, no reads.
+        self.assertFalse([query for query in queries.captured_queries if "SAVEPOINT" not in query["sql"]])
+
+    def test_write_changes_the_etag(self):
+        etag = self.client.get("/product/manufacturer/")["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.manufacturer.title = "Acme Corp"
+            self.manufacturer.save()
+        response = self.client.get("/product/manufacturer/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(response.json()[0]["title"], "Acme Corp")
+
+    def test_stock_changes_invalidate_banners(self):
+        cart = Cart.objects.create(fingerprint="fp")
+        CartItem.objects.create(cart=cart, product=self.lamp, quantity=2)
+        etag = self.client.get("/product/banner/")["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            order = Order.objects.create(cart=cart, name="Buyer", phone="1")
+        response = self.client.get("/product/banner/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]["product"]["in_stock_count"], 3)
+        for status in (OrderStatusChoices.SOLD, OrderStatusChoices.CANCELLED):
+            etag = response["ETag"]
+            with self.captureOnCommitCallbacks(execute=True):
+                order.status = status
+                order.save()
+            response = self.client.get("/product/banner/", HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200, status)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CategoryTreeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        category_tree.trees.clear()
+        ParentCategory.objects.create(title="Light", slug="light", icon="category/light.png")
+
+    def test_icon_urls_follow_the_requesting_host(self):
+        poisoned = self.client.get("/product/categories", HTTP_HOST="evil.example").json()
+        self.assertEqual(poisoned[0]["icon"], "http://evil.example/media/category/light.png")
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get("/product/categories", HTTP_HOST="shop.example").json()
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(data[0]["icon"], "http://shop.example/media/category/light.png")
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ImageSourceInfoTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        get_source_info.cache_clear()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root.name))
+
+    def upload(self):
+        buffer = BytesIO()
+        Image.new("RGB", (800, 600)).save(buffer, "PNG")
+        return SimpleUploadedFile("acme.png", buffer.getvalue(), content_type="image/png")
+
+    def test_uploads_are_hashed_when_committed_not_when_serialized(self):
+        with mock.patch("apps.common.images.get_executor") as executor, \
+                self.captureOnCommitCallbacks(execute=True):
+            manufacturer = Manufacturer.objects.create(title="Acme", logo=self.upload())
+        executor().submit.assert_called_once()
+        get_source_info.cache_clear()
+        with mock.patch("apps.common.images.read_source_info", side_effect=AssertionError) as read:
+            srcset = get_srcset(manufacturer.logo)
+        read.assert_not_called()
+        self.assertEqual([item.split()[-1] for item in srcset["webp"].split(", ")], ["320w", "640w", "800w"])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class MetricsTests(TestCase):
+    def test_serializer_time_covers_building_the_data(self):
+        cache.clear()
+        Manufacturer.objects.create(title="Acme")
+        Manufacturer.objects.create(title="Bolt")
+        key = ("product:manufacturer", "GET")
+        before = registry.serializer_time[key]
+
+        def slow_srcset(field, value):
+            time.sleep(0.05)
+
+        # A field of the serializer, nested in its list and in the renderer: counted once per item, not per level.
+        with mock.patch("apps.common.serializer.SrcsetField.to_representation", slow_srcset):
+            response = self.client.get("/product/manufacturer/")
+        self.assertEqual([item["title"] for item in response.json()], ["Acme", "Bolt"])
+        self.assertGreaterEqual(registry.serializer_time[key] - before, 0.1)
+        self.assertLess(registry.serializer_time[key] - before, 0.2)
+
+
+class ProductSearchTests(TestCase):
+    def setUp(self):
+        parent = ParentCategory.objects.create(title="Light", slug="light")
+        lamps = Category.objects.create(title="Lamps", slug="lamps", parent=parent)
+        shades = Category.objects.create(title="Lampshades", slug="lampshades", parent=parent)
+        lumenworks = Manufacturer.objects.create(title="Lumenworks", logo="manufacturer/lumenworks.png")
+        lampco = Manufacturer.objects.create(title="Lampco", logo="manufacturer/lampco.png")
+        Product.objects.create(title="Desk lamp", slug="desk-lamp", category=lamps, manufacturer=lumenworks, price=10)
+        Product.objects.create(title="Cord", slug="cord", category=lamps, price=10)
+        Product.objects.create(title="Shade", slug="shade", category=shades, manufacturer=lampco, price=10)
+
+    def search(self, value):
+        response = self.client.get("/product/list/", {"search": value})
+        self.assertEqual(response.status_code, 200, value)
+        return [product["title"] for product in response.json()["results"]]
+
+    def test_search_without_terms_lists_products(self):
+        for value in ("!!!", "  "):
+            self.assertEqual(len(self.search(value)), 3, value)
+
+    def test_title_matches_rank_above_manufacturer_and_category_matches(self):
+        self.assertEqual(self.search("lamp"), ["Desk lamp", "Shade", "Cord"])
+
+    def test_misspelt_manufacturer_and_category_titles_match(self):
+        self.assertEqual(self.search("umenworks"), ["Desk lamp"])
+        self.assertEqual(self.search("ampshades"), ["Shade"])
+
+    def test_search_covers_translated_title_columns(self):
+        fields = [SimpleNamespace(name=name, column=name) for name in ("id", "title", "title_en", "title_ru", "slug")]
+        model = SimpleNamespace(_meta=SimpleNamespace(concrete_fields=fields))
+        self.assertEqual(title_columns(model), ["title", "title_en", "title_ru"])
+        self.assertEqual(concat_sql("p", title_columns(model)),
+                         "coalesce(p.title, '') || ' ' || coalesce(p.title_en, '') || ' ' || coalesce(p.title_ru, '')")
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        parent = ParentCategory.objects.create(title="Light", slug="light")
+        category = Category.objects.create(title="Lamps", slug="lamps", parent=parent)
+        # Few distinct values per key, so most page boundaries fall inside a run of equal keys.
+        created_at = timezone.now().replace(microsecond=123456)
+        for index in range(7):
+            product = Product.objects.create(
+                title="Lamp lamp" if index % 3 == 0 else "Lamp", slug=f"lamp-{index}", category=category,
+                price=Decimal("10.50") if index % 2 else Decimal("20.25"), views_count=index % 3,
+            )
+            Product.objects.filter(pk=product.pk).update(created_at=created_at - timedelta(seconds=index // 3))
+
+    def walk(self, params):
+        url, forward = "/product/list/", []
+        params = {**params, "page_size": 2}
+        while url:
+            data = self.client.get(url, params if not forward else None).json()
+            forward.append([product["id"] for product in data["results"]])
+            url, previous = data["next"], data["previous"]
+        backward = [forward[-1]]
+        while previous:
+            data = self.client.get(previous).json()
+            backward.append([product["id"] for product in data["results"]])
+            previous = data["previous"]
+        return forward, backward[::-1]
+
+    def test_walks_forward_and_back_across_equal_keys(self):
+        cases = {
+            "price": ("effective_price", "id"), "-price": ("-effective_price", "-id"),
+            "views_count": ("views_count", "id"), "-views_count": ("-views_count", "-id"),
+            "created_at": ("created_at", "id"), "-created_at": ("-created_at", "-id"),
+        }
+        for ordering, key in cases.items():
+            with self.subTest(ordering=ordering):
+                forward, backward = self.walk({"ordering": ordering})
+                expected = list(Product.objects.order_by(*key).values_list("pk", flat=True))
+                self.assertEqual(sum(forward, []), expected)
+                self.assertEqual(backward, forward)
+
+    def test_walks_search_results_by_rank(self):
+        forward, backward = self.walk({"search": "lamp"})
+        expected = list(
+            search_products(Product.objects.all(), "lamp").order_by("-rank", "-id").values_list("pk", flat=True)
+        )
+        self.assertEqual(len(set(search_products(Product.objects.all(), "lamp").values_list("rank", flat=True))), 2)
+        self.assertEqual(sum(forward, []), expected)
+        self.assertEqual(backward, forward)
+
+
+class CatalogImportTests(TestCase):
+    def setUp(self):
+        parent = ParentCategory.objects.create(title="Light", slug="light")
+        self.category = Category.objects.create(title="Lamps", slug="lamps", parent=parent)
+
+    def test_slugs_are_unique_within_a_batch_and_against_numbered_ones(self):
+        for slug in ("lamp", "lamp-2", "lamp-x", "lampshade"):
+            Product.objects.create(title=slug, slug=slug, category=self.category, price=1)
+        self.assertEqual(
+            allocate_unique_slugs(Product, ["Lamp", "Lamp", "lamp!", "Lampshade", "Desk", "desk", "!!!"]),
+            ["lamp-1", "lamp-3", "lamp-4", "lampshade-1", "desk", "desk-1", "product"],
+        )
+
+    def test_repricing_refreshes_active_carts(self):
+        lamp = Product.objects.create(title="Lamp", slug="lamp", category=self.category, price=10, product_code="L")
+        shade = Product.objects.create(title="Shade", slug="shade", category=self.category, price=5,
+                                       product_code="S")
+        cart = Cart.objects.create(fingerprint="fp")
+        CartItem.objects.create(cart=cart, product=lamp, quantity=2)
+        CartItem.objects.create(cart=cart, product=shade)
+        CatalogImporter().import_rows([
+            (2, {"product_code": "L", "title": "Lamp", "category": "lamps", "price": "12", "sale_price": "9"}),
+            (3, {"product_code": "S", "title": "Shade", "category": "lamps", "price": "5", "sale_price": ""}),
+        ])
+        cart.refresh_from_db()
+        self.assertEqual((cart.total_price, cart.sale_total_price), (29, 23))
+
+
+class ProductFacetTests(TestCase):
+    def setUp(self):
+        self.light = ParentCategory.objects.create(title="Light", slug="light")
+        self.garden = ParentCategory.objects.create(title="Garden", slug="garden")
+        lamps = Category.objects.create(title="Lamps", slug="lamps", parent=self.light)
+        tools = Category.objects.create(title="Tools", slug="tools", parent=self.garden)
+        Product.objects.create(title="Lamp", slug="lamp", category=lamps, price=10)
+        Product.objects.create(title="Spade", slug="spade", category=tools, price=10)
+
+    def test_parent_category_filter_narrows_results_and_facets(self):
+        response = self.client.get("/product/list/", {"parent_category": f"{self.light.pk}", "facets": "1"})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([product["title"] for product in data["results"]], ["Lamp"])
+        self.assertEqual([(item["id"], item["count"]) for item in data["facets"]["parent_category"]],
+                         [(self.light.pk, 1)])
+
+
+class ProductDocumentTests(TestCase):
+    def setUp(self):
+        parent = ParentCategory.objects.create(title="Light", slug="light")
+        self.category = Category.objects.create(title="Lamps", slug="lamps", parent=parent)
+        self.manufacturer = Manufacturer.objects.create(title="Acme", logo="manufacturer/acme.png")
+        self.lamp, self.shade, self.bulb = (
+            Product.objects.create(title=title, slug=title.lower(), category=self.category,
+                                   manufacturer=self.manufacturer, price=10)
+            for title in ("Lamp", "Shade", "Bulb")
+        )
+
+    def get(self, **params):
+        response = self.client.get("/product/list/", {"ordering": "created_at", **params}, HTTP_HOST="shop.example",
+                                   HTTP_FINGERPRINT="fp")
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def lamp_document(self):
+        return next(product for product in self.get()["results"] if product["id"] == self.lamp.pk)
+
+    def test_stale_documents_are_rendered_again(self):
+        self.get()
+        self.assertEqual(ProductDocument.objects.count(), 3)
+        self.category.title = "Desk lamps"
+        self.category.save()
+        self.assertEqual(self.lamp_document()["category"]["title"], "Desk lamps")
+        self.manufacturer.title = "Acme Corp"
+        self.manufacturer.save()
+        self.assertEqual(self.lamp_document()["manufacturer"]["title"], "Acme Corp")
+        ProductGallery.objects.create(product=self.lamp, image="product/gallery/lamp.png")
+        self.assertEqual(len(self.lamp_document()["gallery"]), 1)
+        self.assertEqual(ProductDocument.objects.count(), 3)
+
+    def test_origin_follows_the_requesting_host(self):
+        self.client.get("/product/list/", HTTP_HOST="evil.example")
+        self.assertNotIn("evil.example", ProductDocument.objects.get(product=self.lamp).body)
+        logo = self.lamp_document()["manufacturer"]["logo"]
+        self.assertEqual(logo, "http://shop.example/media/manufacturer/acme.png")
+
+    def test_flags_are_spliced_into_their_own_product(self):
+        SavedProduct.objects.create(fingerprint="fp", product=self.shade)
+        cart = Cart.objects.create(fingerprint="fp")
+        CartItem.objects.create(cart=cart, product=self.bulb)
+        flags = {product["title"]: (product["is_in_saved"], product["is_in_cart"]) for product in self.get()["results"]}
+        self.assertEqual(flags, {"Lamp": (False, False), "Shade": (True, False), "Bulb": (False, True)})
+
+    def test_empty_page(self):
+        data = self.get(search="nothing", facets="1")
+        self.assertEqual((data["next"], data["previous"], data["results"]), (None, None, []))
+        self.assertIn("facets", data)
+
+
+class ProductQueryCountTests(TestCase):
+    """The product endpoints run a fixed number of queries however many products, images and flags they show."""
+
+    def setUp(self):
+        parent = ParentCategory.objects.create(title="Light", slug="light")
+        self.category = Category.objects.create(title="Lamps", slug="lamps", parent=parent)
+        self.manufacturer = Manufacturer.objects.create(title="Acme", logo="manufacturer/acme.png")
+        self.add_products(3)
+
+    def add_products(self, count):
+        for index in range(Product.objects.count(), Product.objects.count() + count):
+            product = Product.objects.create(title=f"Lamp {index}", slug=f"lamp-{index}", category=self.category,
+                                             manufacturer=self.manufacturer, price=10)
+            ProductGallery.objects.create(product=product, image=f"product/gallery/{index}.png")
+            SavedProduct.objects.create(fingerprint="fp", product=product)
+
+    def get(self, url, queries):
+        # Two more for the savepoint ATOMIC_REQUESTS wraps the test client's request in.
+        with self.assertNumQueries(queries + 2):
+            response = self.client.get(url, HTTP_FINGERPRINT="fp")
+        self.assertEqual(response.status_code, 200)
+
+    def test_product_list(self):
+        # Products, stored documents, gallery, document upsert, saved and in-cart ids; then only the reads.
+        self.get("/product/list/", 6)
+        self.get("/product/list/", 4)
+        self.add_products(5)
+        self.get("/product/list/", 6)
+
+    def test_product_detail(self):
+        # Validators, saved and in-cart ids, the product, its stored document, gallery and document upsert.
+        self.get("/product/detail/lamp-0/", 7)
+        self.get("/product/detail/lamp-0/", 5)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class QueryPlanCheckTests(TestCase):
+    options = {"products": 200, "fingerprints": 20, "views": 400}
+
+    def setUp(self):
+        cache.clear()
+        get_view_buffer().pop(10 ** 6)
+
+    def test_reports_every_endpoint_query(self):
+        out = StringIO()
+        call_command("check_query_plans", min_rows=10 ** 9, stdout=out, **self.options)
+        self.assertIn("product-detail", out.getvalue())
+        self.assertIn("No sequential scans on large tables", out.getvalue())
+        # The seeded rows and the product views of the requests are rolled back.
+        self.assertFalse(Product.objects.exists())
+        self.assertEqual(get_view_buffer().pop(10), [])
+
+    def test_fails_on_a_sequential_scan_of_a_large_table(self):
+        # A catalog this small is always scanned sequentially, so reporting the product table as large must fail.
+        with mock.patch("apps.product.management.commands.check_query_plans.Command.get_large_tables",
+                        return_value={Product._meta.db_table}), self.assertRaises(CommandError):
+            call_command("check_query_plans", stdout=StringIO(), **self.options)
+
+
+class EffectivePriceTests(TestCase):
+    def setUp(self):
+        parent = ParentCategory.objects.create(title="Light", slug="light")
+        self.lamps = Category.objects.create(title="Lamps", slug="lamps", parent=parent)
+        self.lamp = Product.objects.create(
+            title="Lamp", slug="lamp", product_code="L1", category=self.lamps, price=100, sale_price=60,
+        )
+        self.shade = Product.objects.create(
+            title="Shade", slug="shade", product_code="S1", category=self.lamps, price=40,
+        )
+
+    def effective_prices(self):
+        return dict(Product.objects.values_list("product_code", "effective_price"))
+
+    def test_save_keeps_effective_price_in_sync(self):
+        self.assertEqual(self.effective_prices(), {"L1": Decimal("60"), "S1": Decimal("40")})
+        self.lamp.sale_price = None
+        self.lamp.save(update_fields=["sale_price"])
+        self.shade.sale_price = 30
+        self.shade.save()
+        self.assertEqual(self.effective_prices(), {"L1": Decimal("100"), "S1": Decimal("30")})
+
+    def test_importer_updates_effective_price(self):
+        row = {"product_code": "L1", "title": "Lamp", "category": "lamps"}
+        CatalogImporter().import_rows([(2, {**row, "price": "120", "sale_price": ""})])
+        self.assertEqual(self.effective_prices()["L1"], Decimal("120"))
+        # Only one price column present: the other keeps its stored value.
+        CatalogImporter().import_rows([(2, {**row, "sale_price": "90"})])
+        self.assertEqual(self.effective_prices()["L1"], Decimal("90"))
+
+    def test_feed_updates_effective_price(self):
+        rows, errors = parse_feed_rows([
+            {"product_code": "L1", "sale_price": ""},
+            {"product_code": "S1", "price": "35"},
+        ])
+        self.assertEqual(errors, [])
+        apply_product_feed(rows)
+        self.assertEqual(self.effective_prices(), {"L1": Decimal("100"), "S1": Decimal("35")})
+
+    @override_settings(CACHES=LOCMEM_CACHES)
+    def test_price_filters_read_the_sale_price(self):
+        cache.clear()
+        response = self.client.get("/product/list/", {"min_price": "50", "max_price": "70"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([product["title"] for product in response.json()["results"]], ["Lamp"])
+        response = self.client.get("/product/list/", {"min_price": "80"})
+        self.assertEqual(response.json()["results"], [])
+
+
+class ProductViewFlushTests(TestCase):
+    def setUp(self):
+        parent = ParentCategory.objects.create(title="Light", slug="light")
+        category = Category.objects.create(title="Lamps", slug="lamps", parent=parent)
+        self.product = Product.objects.create(title="Lamp", slug="lamp", category=category, price=10)
+        patcher = mock.patch("apps.product.tracking._view_buffer", MemoryViewBuffer())
+        self.buffer = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_failed_flush_keeps_the_events(self):
+        for fingerprint in ("a", "b", None):
+            record_product_view(self.product.pk, fingerprint)
+        with mock.patch("apps.product.tracking.increment_views_count", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                flush_product_views()
+        self.assertEqual([event[1] for event in self.buffer.events], ["a", "b", None])
+        self.assertEqual(flush_product_views(), 3)
+        self.assertEqual(self.buffer.events, [])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.views_count, 3)
+        self.assertEqual(LastSeenProduct.objects.filter(product=self.product).count(), 2)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, AUTOCOMPLETE_REFRESH_INTERVAL=0)
+class AutocompleteRefreshTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        parent = ParentCategory.objects.create(title="Light", slug="light")
+        category = Category.objects.create(title="Lamps", slug="lamps", parent=parent)
+        Product.objects.create(title="Desk lamp", slug="desk-lamp", category=category, price=10)
+
+    def test_stale_index_is_served_while_it_rebuilds(self):
+        index = AutocompleteIndex()
+        index.build()
+        bump_cache_version(AUTOCOMPLETE_CACHE_NAMESPACE)
+        started, release = threading.Event(), threading.Event()
+
+        def build():
+            started.set()
+            release.wait(5)
+
+        with mock.patch.object(index, "build", side_effect=build) as rebuild:
+            self.assertEqual([item["title"] for item in index.search("desk")], ["Desk lamp"])
+            self.assertTrue(started.wait(5))
+            # Still rebuilding: the old index answers and no second rebuild starts.
+            self.assertEqual([item["title"] for item in index.search("desk l")], ["Desk lamp"])
+            release.set()
+            self.assertTrue(index.build_lock.acquire(timeout=5))
+            index.build_lock.release()
+        self.assertEqual(rebuild.call_count, 1)
+
+
+class OrderExportTests(TestCase):
+    def test_order_total_is_the_sum_of_its_exported_lines(self):
+        parent = ParentCategory.objects.create(title="Light", slug="light")
+        category = Category.objects.create(title="Lamps", slug="lamps", parent=parent)
+        lamp = Product.objects.create(title="Lamp", slug="lamp", category=category, price=10, in_stock_count=5)
+        shade = Product.objects.create(title="Shade", slug="shade", category=category, price=4, in_stock_count=5)
+        cart = Cart.objects.create(fingerprint="fp")
+        CartItem.objects.create(cart=cart, product=lamp, quantity=2)
+        CartItem.objects.create(cart=cart, product=shade, quantity=1)
+        Order.objects.create(cart=cart, name="Buyer", phone="1")
+        empty = Order.objects.create(cart=Cart.objects.create(fingerprint="fp"), name="Empty", phone="2")
+        # Prices moved after the order was placed; the stored cart total still has the old ones.
+        lamp.sale_price = 8
+        lamp.save()
+        rows = list(iter_order_rows(Order.objects.exclude(pk=empty.pk)))
+        self.assertEqual([row[-1] for row in rows], [16, 4])
+        self.assertEqual({row[5] for row in rows}, {20})
+        self.assertEqual([row[5] for row in iter_order_rows(Order.objects.filter(pk=empty.pk))], [0])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class PopularSearchTests(TestCase):
+    def test_first_spelling_of_a_query_is_shown(self):
+        cache.clear()
+        now = timezone.now()
+        for query, hours in (("Lamp", 3), ("LAMP", 2), ("lamp", 0), ("lamp", 0), ("desk", 0)):
+            record_search(query, now - timedelta(hours=hours))
+        self.assertEqual(get_popular_searches(), [{"query": "Lamp", "count": 4}, {"query": "desk", "count": 1}])
+
+
+class AsyncCreateViewTests(TestCase):
+    """The async create views must answer exactly like the DRF views they stand in for under ASGI."""
+
+    def setUp(self):
+        parent = ParentCategory.objects.create(title="Light", slug="light")
+        category = Category.objects.create(title="Lamps", slug="lamps", parent=parent)
+        self.product = Product.objects.create(title="Lamp", slug="lamp", category=category, price=10)
+        # Like the test client does for request_finished: closing the connection would end the test transaction.
+        patcher = mock.patch("apps.product.async_views.close_old_connections")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, view, url, data):
+        request = RequestFactory().post(url, data, content_type="application/json")
+        response = async_to_sync(view.as_view())(request)
+        return response.status_code, json.loads(response.content)
+
+    def assert_same(self, async_view, url, data):
+        # settings.ASYNC_FINGERPRINT_VIEWS is off here, so the test client reaches the DRF view.
+        with transaction.atomic():
+            status, body = self.post(async_view, url, data)
+            transaction.set_rollback(True)
+        expected = self.client.post(url, data, content_type="application/json")
+        self.assertEqual((status, body.keys() if status == 201 else body),
+                         (expected.status_code, expected.json().keys() if status == 201 else expected.json()))
+
+    def test_saved_product_create(self):
+        url = "/product/saved-products/create/"
+        for data in ({"product": self.product.pk}, {"product": 0, "fingerprint": "fp"},
+                     {"product": self.product.pk, "fingerprint": "fp"}):
+            self.assert_same(AsyncSavedProductCreateView, url, data)
+        SavedProduct.objects.create(product=self.product, fingerprint="dup")
+        self.assert_same(AsyncSavedProductCreateView, url,
+                         {"product": self.product.pk, "fingerprint": "dup"})
+
+    def test_cart_create(self):
+        for data in ({}, {"fingerprint": ""}, {"fingerprint": "fp"}):
+            self.assert_same(AsyncCartCreateView, "/product/cart/create/", data)
+
+    def test_search_history_create(self):
+        for data in ({"query": "lamp"}, {"query": "lamp", "fingerprint": "fp"},
+                     {"query": "x" * 300, "fingerprint": "a"}):
+            self.assert_same(AsyncSearchHistoryCreateView, "/product/searche-history/create/", data)
+
+
+class FeedParsingTests(TestCase):
+    def test_malformed_numbers_are_row_errors(self):
+        rows = [
+            {"product_code": "A", "price": True},
+            {"product_code": "B", "price": float("nan")},
+            {"product_code": "C", "price": "NaN"},
+            {"product_code": "D", "in_stock_count": "Infinity"},
+            {"product_code": "E", "in_stock_count": "1e40"},
+            {"product_code": "F", "price": "12,50", "in_stock_count": 3},
+        ]
+        parsed, errors = parse_feed_rows(rows)
+        self.assertEqual([error["row"] for error in errors], [0, 1, 2, 3, 4])
+        self.assertEqual(parsed, {"F": (Decimal("12.50"), False, None, 3)})
+
+    def test_feed_endpoint_lists_malformed_csv_rows(self):
+        user = User.objects.create_superuser("feed", password="feed")
+        self.client.force_login(user)
+        body = "product_code,price,in_stock_count\nA,NaN,\nB,,Infinity\n"
+        response = self.client.post("/product/feed/", body, content_type="text/csv")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([error["row"] for error in response.json()["invalid"]], [0, 1])
+
+    def test_importer_reports_malformed_cells(self):
+        parent = ParentCategory.objects.create(title="Light", slug="light")
+        Category.objects.create(title="Lamps", slug="lamps", parent=parent)
+        importer = CatalogImporter()
+        importer.import_rows([
+            (2, {"product_code": "A", "title": "A", "category": "lamps", "price": "Infinity", "in_stock_count": ""}),
+            (3, {"product_code": "B", "title": "B", "category": "lamps", "price": "1", "in_stock_count": "inf"}),
+            (4, {"product_code": "C", "title": "C", "category": "lamps", "price": "1", "in_stock_count": "2"}),
+        ])
+        self.assertEqual([line for line, message in importer.errors], [2, 3])
+        self.assertEqual(Product.objects.get(product_code="C").in_stock_count, 2)
+
+
+class SoldCountTests(TestCase):
+    def setUp(self):
+        parent = ParentCategory.objects.create(title="Light", slug="light")
+        category = Category.objects.create(title="Lamps", slug="lamps", parent=parent)
+        self.lamp, self.shade, self.bulb = (
+            Product.objects.create(title=title, slug=title.lower(), category=category, price=10, in_stock_count=10)
+            for title in ("Lamp", "Shade", "Bulb")
+        )
+
+    def sold_counts(self):
+        return [product.sold_count for product in Product.objects.order_by("pk")]
+
+    def set_status(self, order, status):
+        order.status = status
+        order.save()
+
+    def test_sold_count_follows_the_products_counted_when_sold(self):
+        cart = Cart.objects.create(fingerprint="fp")
+        CartItem.objects.create(cart=cart, product=self.lamp)
+        CartItem.objects.create(cart=cart, product=self.shade)
+        order = Order.objects.create(cart=cart, name="Buyer", phone="1")
+        self.set_status(order, OrderStatusChoices.SOLD)
+        self.assertEqual(self.sold_counts(), [1, 1, 0])
+        # Edited in the admin after the sale: leaving SOLD takes back what was counted, not the current lines.
+        CartItem.objects.filter(cart=cart, product=self.shade).delete()
+        CartItem.objects.create(cart=cart, product=self.bulb)
+        self.set_status(order, OrderStatusChoices.CANCELLED)
+        self.assertEqual(self.sold_counts(), [0, 0, 0])
+        self.set_status(order, OrderStatusChoices.SOLD)
+        self.assertEqual(self.sold_counts(), [1, 0, 1])
+        CartItem.objects.filter(cart=cart, product=self.bulb).delete()
+        out = StringIO()
+        call_command("reconcile_sold_count", "--dry-run", stdout=out)
+        self.assertIn("3 products checked, 0 would be repaired", out.getvalue())
+        order.delete()
+        self.assertEqual(self.sold_counts(), [0, 0, 0])
+
+
+class CartSummaryTests(TestCase):
+    def setUp(self):
+        parent = ParentCategory.objects.create(title="Light", slug="light")
+        category = Category.objects.create(title="Lamps", slug="lamps", parent=parent)
+        self.lamp = Product.objects.create(title="Lamp", slug="lamp", category=category, price=10, sale_price=8)
+        self.shade = Product.objects.create(title="Shade", slug="shade", category=category, price=5)
+        self.cart = Cart.objects.create(fingerprint="fp")
+
+    def assertSummaryFresh(self):
+        items = CartItem.objects.filter(cart=self.cart).select_related("product")
+        expected = (
+            len(items),
+            sum((item.quantity * item.product.price for item in items), Decimal(0)),
+            sum((item.quantity * item.product.get_effective_price() for item in items), Decimal(0)),
+        )
+        self.cart.refresh_from_db()
+        self.assertEqual((self.cart.items_count, self.cart.total_price, self.cart.sale_total_price), expected)
+
+    def test_stored_summary_follows_lines_and_prices(self):
+        response = self.client.post("/product/cart-item/create/",
+                                    {"cart": self.cart.pk, "product": self.lamp.pk, "quantity": 2},
+                                    content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+        shade = CartItem.objects.create(cart=self.cart, product=self.shade, quantity=1)
+        self.assertSummaryFresh()
+        response = self.client.patch(f"/product/cart-item/update/{shade.pk}/", {"quantity": 4},
+                                     content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        self.assertSummaryFresh()
+        self.lamp.sale_price = None
+        self.lamp.price = 12
+        self.lamp.save()
+        self.assertSummaryFresh()
+        response = self.client.delete(f"/product/cart-item/delete/{shade.pk}/")
+        self.assertEqual(response.status_code, 204)
+        self.assertSummaryFresh()
+        self.assertEqual(self.cart.items_count, 1)
+
+
+class OrderAdminTests(TestCase):
+    def setUp(self):
+        parent = ParentCategory.objects.create(title="Light", slug="light")
+        category = Category.objects.create(title="Lamps", slug="lamps", parent=parent)
+        self.lamp = Product.objects.create(title="Lamp", slug="lamp", category=category, price=10, in_stock_count=1)
+        self.client.force_login(User.objects.create_superuser("admin", password="admin"))
+
+    def order(self, status=OrderStatusChoices.IN_MODERATION):
+        cart = Cart.objects.create(fingerprint="fp")
+        CartItem.objects.create(cart=cart, product=self.lamp)
+        order = Order.objects.create(cart=cart, name="Buyer", phone="1")
+        order.status = status
+        order.save()
+        return order
+
+    def test_reopening_an_order_without_stock_is_reported(self):
+        cancelled = self.order(OrderStatusChoices.CANCELLED)
+        self.order()
+        url = f"/admin/product/order/{cancelled.pk}/change/"
+        response = self.client.post(url, {
+            "cart": cancelled.cart_id, "name": "Buyer", "phone": "1", "status": OrderStatusChoices.IN_MODERATION,
+        }, follow=True)
+        self.assertEqual(response.redirect_chain, [(url, 302)])
+        self.assertContains(response, "Not enough in stock: Lamp")
+        cancelled.refresh_from_db()
+        self.assertEqual(cancelled.status, OrderStatusChoices.CANCELLED)
+        self.lamp.refresh_from_db()
+        self.assertEqual(self.lamp.in_stock_count, 0)
+
+
+class OrderStockTests(TransactionTestCase):
+    """Checkouts run in their own threads and connections, the way concurrent requests do."""
+
+    def setUp(self):
+        parent = ParentCategory.objects.create(title="Light", slug="light")
+        category = Category.objects.create(title="Lamps", slug="lamps", parent=parent)
+        self.hot = Product.objects.create(title="Hot", slug="hot", category=category, price=10, in_stock_count=5)
+        self.scarce = Product.objects.create(title="Scarce", slug="scarce", category=category, price=10,
+                                             in_stock_count=1)
+
+    def make_cart(self, *lines):
+        cart = Cart.objects.create(fingerprint="fp")
+        CartItem.objects.bulk_create(CartItem(cart=cart, product=product, quantity=quantity)
+                                     for product, quantity in lines)
+        return cart
+
+    def checkout(self, cart):
+        try:
+            return Order.objects.create(cart=cart, name="Buyer", phone="1")
+        except InsufficientStock:
+            return None
+        finally:
+            connection.close()
+
+    def stock(self, product):
+        product.refresh_from_db()
+        return product.in_stock_count
+
+    def test_concurrent_checkouts_never_oversell(self):
+        carts = [self.make_cart((self.hot, 2)) for _ in range(8)]
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            orders = [order for order in executor.map(self.checkout, carts) if order]
+        self.assertEqual(len(orders), 2)
+        self.assertEqual(self.stock(self.hot), 1)
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_short_order_takes_nothing(self):
+        self.assertIsNone(self.checkout(self.make_cart((self.hot, 1), (self.scarce, 2))))
+        self.assertEqual((self.stock(self.hot), self.stock(self.scarce)), (5, 1))
+
+    def test_cancelling_restores_what_was_reserved(self):
+        cart = self.make_cart((self.hot, 2), (self.scarce, 1))
+        order = self.checkout(cart)
+        self.assertEqual((self.stock(self.hot), self.stock(self.scarce)), (3, 0))
+        # Editing the ordered cart must not change what cancelling gives back.
+        CartItem.objects.filter(cart=cart, product=self.hot).update(quantity=4)
+        CartItem.objects.filter(cart=cart, product=self.scarce).delete()
+        order.status = OrderStatusChoices.CANCELLED
+        order.save()
+        self.assertEqual((self.stock(self.hot), self.stock(self.scarce)), (5, 1))
+        order.delete()
+        self.assertEqual((self.stock(self.hot), self.stock(self.scarce)), (5, 1))
+
+
+class CartItemTests(TransactionTestCase):
+    def setUp(self):
+        parent = ParentCategory.objects.create(title="Light", slug="light")
+        category = Category.objects.create(title="Lamps", slug="lamps", parent=parent)
+        self.lamp = Product.objects.create(title="Lamp", slug="lamp", category=category, price=10)
+        self.shade = Product.objects.create(title="Shade", slug="shade", category=category, price=5)
+        self.cart = Cart.objects.create(fingerprint="fp")
+
+    def add(self, quantity):
+        try:
+            return Client().post("/product/cart-item/create/",
+                                 {"cart": self.cart.pk, "product": self.lamp.pk, "quantity": quantity},
+                                 content_type="application/json").status_code
+        finally:
+            connection.close()
+
+    def test_concurrent_adds_all_count(self):
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            statuses = list(executor.map(self.add, [1] * 16))
+        self.assertEqual(statuses, [201] * 16)
+        self.assertEqual(CartItem.objects.get(cart=self.cart, product=self.lamp).quantity, 16)
+        self.cart.refresh_from_db()
+        self.assertEqual(self.cart.items_count, 1)
+        self.assertEqual(self.cart.total_price, 160)
+
+    def test_update_onto_a_product_already_in_the_cart_is_rejected(self):
+        CartItem.objects.create(cart=self.cart, product=self.lamp)
+        shade = CartItem.objects.create(cart=self.cart, product=self.shade)
+        response = self.client.patch(f"/product/cart-item/update/{shade.pk}/", {"product": self.lamp.pk},
+                                     content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        response = self.client.patch(f"/product/cart-item/update/{shade.pk}/", {"quantity": 3},
+                                     content_type="application/json")
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,134 @@
+import json
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+import redis
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils.module_loading import import_string
+
+from apps.product.models import LastSeenProduct, Product, ProductView
+
+
+class MemoryViewBuffer:
+    """In-process buffer, only visible to the process that records views. Meant for tests and runserver."""
+
+    def __init__(self):
+        self.events = []
+        self.lock = threading.Lock()
+
+    def push(self, event):
+        with self.lock:
+            self.events.append(event)
+
+    def pop(self, count):
+        with self.lock:
+            events = self.events[:count]
+            del self.events[:count]
+        return events
+
+    def restore(self, events):
+        with self.lock:
+            self.events[:0] = events
+
+
+class RedisViewBuffer:
+    key = "product:views"
+
+    def __init__(self, url=None):
+        self.client = redis.Redis.from_url(url or settings.REDIS_URL)
+
+    def push(self, event):
+        self.client.rpush(self.key, json.dumps(event))
+
+    def pop(self, count):
+        pipeline = self.client.pipeline()
+        pipeline.lrange(self.key, 0, count - 1)
+        pipeline.ltrim(self.key, count, -1)
+        events, _ = pipeline.execute()
+        return [json.loads(event) for event in events]
+
+    def restore(self, events):
+        """Put popped events back at the head of the list, in their order, for the next flush to pick up."""
+        if events:
+            self.client.lpush(self.key, *[json.dumps(event) for event in reversed(events)])
+
+
+_view_buffer = None
+
+
+def get_view_buffer():
+    global _view_buffer
+    if _view_buffer is None:
+        _view_buffer = import_string(settings.PRODUCT_VIEW_BUFFER)()
+    return _view_buffer
+
+
+@contextmanager
+def discard_product_views():
+    """
+    Record views into a throwaway in-process buffer, for commands that request product pages and roll their writes
+    back: events pushed to Redis would survive the rollback and be flushed into views_count later.
+    """
+    global _view_buffer
+    previous, _view_buffer = _view_buffer, MemoryViewBuffer()
+    try:
+        yield
+    finally:
+        _view_buffer = previous
+
+
+def record_product_view(product_id, fingerprint=None):
+    get_view_buffer().push([product_id, fingerprint, time.time()])
+
+
+def increment_views_count(counts):
+    values = ", ".join(["(%s, %s)"] * len(counts))
+    params = [value for item in counts.items() for value in item]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {Product._meta.db_table} p SET views_count = p.views_count + v.count "
+            f"FROM (VALUES {values}) AS v(id, count) WHERE p.id = v.id",
+            params,
+        )
+
+
+def flush_product_views(batch_size=5000):
+    """
+    Drain up to ``batch_size`` buffered views into the database: one upsert each for ProductView and
+    LastSeenProduct and one UPDATE for the aggregated views_count increments. If writing them fails, the events
+    go back to the buffer.
+    """
+    buffer = get_view_buffer()
+    events = buffer.pop(batch_size)
+    if not events:
+        return 0
+    try:
+        save_product_views(events)
+    except Exception:
+        # The writes share one transaction, so none of them happened.
+        buffer.restore(events)
+        raise
+    return len(events)
+
+
+def save_product_views(events):
+    counts = Counter(product_id for product_id, fingerprint, viewed_at in events)
+    existing = set(Product.objects.filter(pk__in=counts).values_list("pk", flat=True))
+    counts = {product_id: count for product_id, count in counts.items() if product_id in existing}
+    pairs = sorted({
+        (product_id, fingerprint) for product_id, fingerprint, viewed_at in events
+        if fingerprint and product_id in existing
+    })
+    with transaction.atomic():
+        for model in (ProductView, LastSeenProduct):
+            model.objects.bulk_create(
+                [model(product_id=product_id, fingerprint=fingerprint) for product_id, fingerprint in pairs],
+                update_conflicts=True,
+                unique_fields=["product", "fingerprint"],
+                update_fields=["updated_at"],
+            )
+        if counts:
+            increment_views_count(counts)
@@ -1,12 +1,28 @@
+from django.conf import settings
 from django.urls import path
 
+from apps.product import async_views
 from apps.product.views import BannerListView, ProductListView, ManufacturerListView, ParentCategoryListView, \
     ProductDetailView, LastSeenProductListView, SavedProductListView, SavedProductCreateView, SavedProductDeleteView, \
     CartCreateView, CartListView, CartItemCreateView, CartItemUpdateView, OrderCreateView, CartItemDeleteView, \
-    CartItemListView, CartTotalPriceView, SearchHistoryListView, SearchHistoryCreateView, SearchHistoryDeleteView
+    CartItemListView, CartTotalPriceView, SearchHistoryListView, SearchHistoryCreateView, SearchHistoryDeleteView, \
+    PopularSearchHistoryAPIView, AutocompleteView, CartItemBatchView, ProductFeedView
 
 app_name = 'product'
 
+if settings.ASYNC_FINGERPRINT_VIEWS:
+    LastSeenProductListView = async_views.AsyncLastSeenProductListView
+    SavedProductListView = async_views.AsyncSavedProductListView
+    SavedProductCreateView = async_views.AsyncSavedProductCreateView
+    SavedProductDeleteView = async_views.AsyncSavedProductDeleteView
+    CartCreateView = async_views.AsyncCartCreateView
+    CartListView = async_views.AsyncCartListView
+    CartItemListView = async_views.AsyncCartItemListView
+    CartTotalPriceView = async_views.AsyncCartTotalPriceView
+    SearchHistoryListView = async_views.AsyncSearchHistoryListView
+    SearchHistoryCreateView = async_views.AsyncSearchHistoryCreateView
+    SearchHistoryDeleteView = async_views.AsyncSearchHistoryDeleteView
+
 urlpatterns = [
     path('list/', ProductListView.as_view(), name='product-list'),
     path('banner/', BannerListView.as_view(), name='banner-list'),
@@ -20,7 +36,9 @@ urlpatterns = [
     path("searche/history/", SearchHistoryListView.as_view(), name='search-history'),
     path("searche-history/create/", SearchHistoryCreateView.as_view()),
     path("searche-history/delete/<int:pk>", SearchHistoryDeleteView.as_view(), name='search-history-delete'),
-    path("popular-searche-history/", PopularSearcheHistoryAPIView.as_view(), name='popular'),
+    path("popular-searche-history/", PopularSearchHistoryAPIView.as_view(), name='popular'),
+    path("autocomplete/", AutocompleteView.as_view(), name='autocomplete'),
+    path("feed/", ProductFeedView.as_view(), name="product-feed"),
 
     # Cart & Order
     path("cart/create/", CartCreateView.as_view(), name='cart'),
@@ -28,7 +46,8 @@ urlpatterns = [
     path("cart-item/create/", CartItemCreateView.as_view(), name="cart-item-create"),
     path("cart-item/update/<int:pk>/", CartItemUpdateView.as_view(), name="cart-item-update"),
     path("cart-item/delete/<int:pk>/", CartItemDeleteView.as_view()),
+    path("cart-item/batch/<int:cart_id>/", CartItemBatchView.as_view(), name="cart-item-batch"),
     path("cart-item/<int:cart_id>/", CartItemListView.as_view(), name='cart-item'),
-    path("cart/total-price/", CartTotalPriceView.as_view(), name='cart-total-price'),
+    path("cart/total-price/<int:cart_id>/", CartTotalPriceView.as_view(), name='cart-total-price'),
     path("order/create/", OrderCreateView.as_view(), name='order')
 ]
@@ -1,94 +1,227 @@
-from django.db.models import Count
-from django.shortcuts import render
+from django.conf import settings
+from django.db import transaction
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404, render
+from django.utils.decorators import method_decorator
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import generics, filters
+from rest_framework import generics
+from rest_framework.authentication import BasicAuthentication, SessionAuthentication
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import JSONParser
+from rest_framework.permissions import BasePermission
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from apps.common.cache import CachedListMixin, ConditionalGetMixin, get_origin, rewrite_origin
+from apps.common.pagination import KeysetPagination
+from apps.product.autocomplete import autocomplete_index, get_language_code
+from apps.product.cart_operations import apply_cart_operations
+from apps.product.category_tree import CACHE_NAMESPACE as CATEGORY_CACHE_NAMESPACE, category_tree
+from apps.product.choices import CartStatusChoices
+from apps.product.documents import get_product_documents, render_json
+from apps.product.facets import get_product_facets
 from apps.product.filters import ManufacturerFilter, ProductFilter
-from apps.product.models import Banner, Manufacturer, Product, ParentCategory, ProductView, LastSeenProduct, \
-    SavedProduct, Cart, CartItem, Order, SearchHistory
+from apps.product.models import Banner, Manufacturer, Product, ParentCategory, LastSeenProduct, SavedProduct, \
+    Cart, CartItem, Order, SearchHistory
+from apps.product.personalization import Personalization
+from apps.product.popular_searches import WINDOWS, get_popular_searches
+from apps.product.search import build_search_query
+from apps.product.product_feed import CSVParser, apply_product_feed, parse_feed_rows
 from apps.product.serializer import BannerSerializer, ManufacturerSerializer, ProductSerializer, \
     ParentCategorySerializer, LastSeenProductSerializer, SavedProductSerializer, SavedProductCreateSerializer, \
-    CartSerializer, CartItemCreateSerializer, CartItemListSerializer, OrderSerializer, SearchHistorySerializer
+    CartSerializer, CartItemCreateSerializer, CartItemListSerializer, OrderSerializer, SearchHistorySerializer, \
+    CartBatchSerializer
+from apps.product.tracking import record_product_view
 
 
 # Create your views here.
-class BannerListView(generics.ListAPIView):
+class BannerListView(ConditionalGetMixin, CachedListMixin, generics.ListAPIView):
     queryset = Banner.objects.all()
     serializer_class = BannerSerializer
+    cache_namespace = "banner"
+    vary_headers = ("Accept-Language", "Fingerprint")
+
+    def get_validators(self, request, *args, **kwargs):
+        parts, last_modified = super().get_validators(request, *args, **kwargs)
+        personalization = Personalization.for_request(request)
+        if not personalization.fingerprint:
+            return parts, last_modified
+        return parts + [personalization.get_stamp()], None
 
     def get_queryset(self):
-        return Banner.objects.filter(is_active=True).order_by('order')
+        return (
+            Banner.objects.filter(is_active=True)
+            .order_by('order')
+            .select_related("product__manufacturer", "product__category")
+            .prefetch_related("product__gallery")
+        )
+
+    def personalize(self, data):
+        personalization = Personalization.for_request(self.request)
+        for banner in data:
+            if banner["product"]:
+                personalization.overlay(banner["product"])
+        return data
 
 
 class ProductListView(generics.ListAPIView):
+    """
+    Products are served from their pre-rendered documents (see ``apps.product.documents``), only the
+    per-fingerprint flags are added per request.
+    """
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
-    filter_backends = (DjangoFilterBackend, filters.OrderingFilter, filters.SearchFilter)
+    filter_backends = (DjangoFilterBackend,)
     filterset_class = ProductFilter
-    ordering_fields = ('price', "views_count", "created_at", "-price", "-view_count", "-created_at")
-    search_fields = ('title', "manufacturer__title", "category__title", "product_code")
+    pagination_class = KeysetPagination
+    ordering_fields = ("price", "views_count", "created_at")
+    # ?ordering=price sorts by what the customer pays, the sale price when there is one.
+    ordering_columns = {"price": "effective_price"}
 
     def get_queryset(self):
-        return Product(
-            Product.objects.filter(is_active=True)
-            .order_by("-created_at")
-            .select_related("manufacturer", "category")
-            .prefetch_related("gallery")
-        )
-
-
-class ManufacturerListView(generics.ListAPIView):
+        return Product.objects.filter(is_active=True).order_by("-created_at").select_related("manufacturer", "category")
+
+    def get_keyset_ordering(self):
+        ordering = self.request.query_params.get("ordering", "")
+        field = ordering.lstrip("-")
+        if field in self.ordering_fields:
+            descending = ordering.startswith("-")
+            column = self.ordering_columns.get(field, field)
+            return f"-{column}" if descending else column, "-id" if descending else "id"
+        # search_products only annotates a rank when the value has something to search for.
+        if build_search_query(self.request.query_params.get("search", "").strip()) is not None:
+            return "-rank", "-id"
+        return "-created_at", "-id"
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        personalization = Personalization.for_request(request)
+        documents = [
+            personalization.overlay_json(product.pk, document)
+            for product, document in zip(page, get_product_documents(page, request))
+        ]
+        data = self.paginator.get_paginated_data(documents)
+        if request.query_params.get("facets") in ("1", "true"):
+            data["facets"] = get_product_facets(queryset)
+        return render_json(data)
+
+
+class ManufacturerListView(ConditionalGetMixin, CachedListMixin, generics.ListAPIView):
     queryset = Manufacturer.objects.all()
     serializer_class = ManufacturerSerializer
+    cache_namespace = "manufacturer"
     filter_backends = (DjangoFilterBackend,)
     filterset_class = ManufacturerFilter
 
 
-class ParentCategoryListView(generics.ListAPIView):
+@method_decorator(transaction.non_atomic_requests, name="dispatch")
+class ParentCategoryListView(ConditionalGetMixin, generics.ListAPIView):
+    """
+    The category menu, served from the in-memory ``category_tree``. The filters of ``filterset_fields`` are
+    applied to the tree in Python, so a request doesn't touch the database.
+    """
     queryset = ParentCategory.objects.all()
     serializer_class = ParentCategorySerializer
+    cache_namespace = CATEGORY_CACHE_NAMESPACE
     filter_backends = (DjangoFilterBackend,)
     filterset_fields = ("id", "categories__id", "slug", "categories__slug")
 
+    def list(self, request, *args, **kwargs):
+        filters = {}
+        for name in self.filterset_fields:
+            value = request.query_params.get(name)
+            if value:
+                if name.endswith("id") and not value.isdigit():
+                    raise ValidationError({name: ["Enter a number."]})
+                filters[name] = int(value) if name.endswith("id") else value
+        tree = category_tree.get()
+        parents = [parent for parent in tree if self.matches(parent, filters)]
+        return Response(rewrite_origin(parents, get_origin(request)))
+
+    @staticmethod
+    def matches(parent, filters):
+        if any(parent[name] != filters[name] for name in ("id", "slug") if name in filters):
+            return False
+        children = [(name[len("categories__"):], value) for name, value in filters.items() if "__" in name]
+        return not children or any(
+            all(category[name] == value for name, value in children) for category in parent["categories"]
+        )
+
 
-class ProductDetailView(generics.RetrieveAPIView):
+class ProductDetailView(ConditionalGetMixin, generics.RetrieveAPIView):
+    """
+    Validated by the ``updated_at`` of the product, its category and its manufacturer, read with one query before
+    anything is serialized. Gallery, stock and sold count changes touch the product's ``updated_at`` too.
+    """
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     lookup_field = "slug"
+    vary_headers = ("Accept-Language", "Fingerprint")
 
-    def get_filtered_queryset(self):
-        fingerprint = self.request.Meta.get("HTTP_fingerprint", None)
-        if fingerprint:
-            ProductView.objects.get_or_create(product=self.get_object(), fingerprint=fingerprint)
-            LastSeenProduct.objects.get_or_create(product=self.get_object(), fingerprint=fingerprint)
-        return ProductView.objects.filter(is_active=True)
+    def get_queryset(self):
+        return Product.objects.filter(is_active=True).select_related("manufacturer", "category")
+
+    def get_validators(self, request, *args, **kwargs):
+        row = (
+            Product.objects.filter(is_active=True, slug=kwargs[self.lookup_field])
+            .values_list("pk", "updated_at", "category__updated_at", "manufacturer__updated_at").first()
+        )
+        if row is None:
+            return None, None
+        self.product_id, *stamps = row
+        stamps = [stamp for stamp in stamps if stamp is not None]
+        personalization = Personalization.for_request(request)
+        if not personalization.fingerprint:
+            return [self.product_id, *stamps], max(stamps)
+        return [self.product_id, *stamps, personalization.get_stamp([self.product_id])], None
 
     def get(self, request, *args, **kwargs):
-        self.queryset = self.get_filtered_queryset()
-        return super().get(request, *args, **kwargs)
+        response = super().get(request, *args, **kwargs)
+        if response.status_code == 304:
+            # A client showing its cached copy still counts as a view.
+            record_product_view(self.product_id, request.headers.get("Fingerprint"))
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        record_product_view(instance.pk, request.headers.get("Fingerprint"))
+        document = get_product_documents([instance], request)[0]
+        document = Personalization.for_request(request).overlay_json(instance.pk, document)
+        return HttpResponse(document.encode(), content_type="application/json")
 
 
 class LastSeenProductListView(generics.ListAPIView):
     queryset = LastSeenProduct.objects.all()
     serializer_class = LastSeenProductSerializer
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
-        fingerprint = self.request.Meta.get("HTTP_fingerprint", None)
+        fingerprint = self.request.headers.get("Fingerprint")
         if fingerprint:
-            return LastSeenProduct.objects.filter(fingerprint=fingerprint).order_by("-created_at")
+            return (
+                LastSeenProduct.objects.filter(fingerprint=fingerprint)
+                .order_by("-created_at")
+                .select_related("product__manufacturer", "product__category")
+                .prefetch_related("product__gallery")
+            )
         return LastSeenProduct.objects.none()
 
 
 class SavedProductListView(generics.ListAPIView):
     queryset = SavedProduct.objects.all()
     serializer_class = SavedProductSerializer
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
-        fingerprint = self.request.Meta.get("HTTP_fingerprint", None)
+        fingerprint = self.request.headers.get("Fingerprint")
         if fingerprint:
-            return SavedProduct.objects.filter(fingerprint=fingerprint).order_by("-created_at")
+            return (
+                SavedProduct.objects.filter(fingerprint=fingerprint)
+                .order_by("-created_at")
+                .select_related("product__manufacturer", "product__category")
+                .prefetch_related("product__gallery")
+            )
         return SavedProduct.objects.none()
 
 
@@ -104,7 +237,7 @@ class SavedProductDeleteView(generics.UpdateAPIView):
 
     def delete(self, request, *args, **kwargs):
         product_id = self.kwargs.get("product_id")
-        fingerprint = self.request.Meta.get("HTTP_fingerprint", None)
+        fingerprint = self.request.headers.get("Fingerprint")
         if fingerprint:
             saved_product = SavedProduct.objects.filter(fingerprint=fingerprint, product_id=product_id).first()
             if saved_product:
@@ -124,7 +257,7 @@ class CartListView(generics.ListAPIView):
     serializer_class = CartSerializer
 
     def get_queryset(self):
-        fingerprint = self.request.Meta.get("HTTP_fingerprint", None)
+        fingerprint = self.request.headers.get("Fingerprint")
         if fingerprint:
             return Cart.objects.filter(fingerprint=fingerprint).order_by("-created_at")
         return Cart.objects.none()
@@ -145,38 +278,78 @@ class CartItemDeleteView(generics.DestroyAPIView):
     serializer_class = CartItemCreateSerializer
 
 
+class CanChangeProducts(BasePermission):
+    def has_permission(self, request, view):
+        return request.user.has_perm("product.change_product")
+
+
+@method_decorator(transaction.non_atomic_requests, name="dispatch")
+class ProductFeedView(APIView):
+    """
+    Bulk price and stock updates keyed by ``product_code``, for the ERP. The body is a JSON list (or
+    ``{"items": [...]}``) of ``{"product_code", "price", "sale_price", "in_stock_count"}`` objects, or a CSV with
+    those columns. Fields left out are not changed; a null sale_price ends the sale. Callers authenticate as a
+    user with the change_product permission.
+    """
+    authentication_classes = (BasicAuthentication, SessionAuthentication)
+    permission_classes = (CanChangeProducts,)
+    parser_classes = (JSONParser, CSVParser)
+
+    def post(self, request, *args, **kwargs):
+        rows = request.data.get("items") if isinstance(request.data, dict) else request.data
+        if not isinstance(rows, list):
+            raise ValidationError({"items": ["Expected a list of rows."]})
+        if len(rows) > settings.PRODUCT_FEED_MAX_ROWS:
+            raise ValidationError({"items": [f"At most {settings.PRODUCT_FEED_MAX_ROWS} rows per request."]})
+        parsed, errors = parse_feed_rows(rows)
+        report = apply_product_feed(parsed)
+        report["invalid"] = errors
+        return Response(report)
+
+
+class CartItemBatchView(APIView):
+    """
+    Apply a list of ``{"op": "add" | "set" | "remove", "product": id, "quantity": n}`` operations to an active cart
+    of the caller in one transaction and return the updated cart summary.
+    """
+
+    def post(self, request, *args, **kwargs):
+        serializer = CartBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            cart = get_object_or_404(
+                Cart.objects.select_for_update(), pk=self.kwargs.get("cart_id"),
+                fingerprint=request.headers.get("Fingerprint"), status=CartStatusChoices.ACTIVE,
+            )
+            apply_cart_operations(cart, serializer.validated_data["operations"])
+        return Response(cart.get_summary())
+
+
 class CartItemListView(generics.ListAPIView):
     queryset = CartItem.objects.all()
     serializer_class = CartItemListSerializer
+    pagination_class = KeysetPagination
     lookup_field = "cart_id"
 
     def get_queryset(self):
         cart_id = self.kwargs.get("cart_id")
-        return CartItem.objects.filter(cart_id=cart_id).order_by("-created_at")
+        return (
+            CartItem.objects.filter(cart_id=cart_id)
+            .order_by("-created_at")
+            .select_related("product__manufacturer", "product__category")
+            .prefetch_related("product__gallery")
+        )
 
 
 class CartTotalPriceView(APIView):
     def get(self, request, *args, **kwargs):
-        fingerprint = self.request.Meta.get("HTTP_fingerprint", None)
+        fingerprint = self.request.headers.get("Fingerprint")
         cart_id = self.kwargs.get("cart_id")
         if fingerprint:
-            cart = Cart.objects.get(pk=cart_id)
+            cart = Cart.objects.filter(pk=cart_id).first()
             if cart:
-                total_quantity = cart.items.count()
-                total_price = cart.total_price
-
-                total_savings = 0
-                for cart_item in cart.items.all():
-                    product = cart_item.product
-                    if product.sale_price is not None:
-                        savings_par_item = (product.price - product) * cart_item.quantity
-                        total_savings += savings_par_item
-                return Response({
-                    "quantity": total_quantity,
-                    "total_price": total_price,
-                    "total_savings": total_savings,
-                })
-        return Response({"total_price": 0, "total_savings": 0, 'quantity': 0})
+                return Response(cart.get_summary())
+        return Response({"total_price": 0, "sale_total_price": 0, "total_savings": 0, 'quantity': 0})
 
 
 class OrderCreateView(generics.CreateAPIView):
@@ -192,9 +365,10 @@ class SearchHistoryCreateView(generics.CreateAPIView):
 class SearchHistoryListView(generics.ListAPIView):
     queryset = SearchHistory.objects.all()
     serializer_class = SearchHistorySerializer
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
-        fingerprint = self.request.Meta.get("HTTP_fingerprint", None)
+        fingerprint = self.request.headers.get("Fingerprint")
         if fingerprint:
             return SearchHistory.objects.filter(fingerprint=fingerprint).order_by("-created_at")
         return SearchHistory.objects.none()
@@ -207,9 +381,9 @@ class SearchHistoryDeleteView(generics.DestroyAPIView):
 
     def delete(self, request, *args, **kwargs):
         pk = self.kwargs.get("pk")
-        fingerprint = self.request.Meta.get("HTTP_fingerprint", None)
+        fingerprint = self.request.headers.get("Fingerprint")
         if fingerprint:
-            search_history = SearchHistory.objects.filter(fingerprint=fingerprint).first()
+            search_history = SearchHistory.objects.filter(fingerprint=fingerprint, pk=pk).first()
             if search_history:
                 search_history.delete()
                 return Response({"status": "deleted"})
@@ -220,11 +394,11 @@ class SearchHistoryDeleteView(generics.DestroyAPIView):
 class PopularSearchHistoryAPIView(APIView):
     def get(self, request, *args, **kwargs):
         try:
-            popular_searches = (
-                SearchHistory.objects.values("query").annotate(count=Count("query")).order_by("-count")[:5]
-            )
-            popular_searches_list = list({"popular_searches": popular_searches})
-            return Response({"popular_searches_list": popular_searches_list})
+            days = int(request.query_params.get("days", 30))
+            limit = max(1, min(int(request.query_params.get("limit", 5)), 50))
+            if days not in WINDOWS:
+                return Response({"error": f"days must be one of {', '.join(map(str, WINDOWS))}"}, status=400)
+            return Response({"popular_searches_list": get_popular_searches(days, limit)})
         except Exception as e:
             return Response({"error": str(e)})
 
@@ -234,13 +408,15 @@ class OrderCreateView(generics.CreateAPIView):
     serializer_class = OrderSerializer
 
 
-class PopularSearchHistoryListView(generics.ListAPIView):
+class PopularSearchHistoryListView(PopularSearchHistoryAPIView):
+    pass
+
+
+class AutocompleteView(APIView):
     def get(self, request, *args, **kwargs):
         try:
-            popular_searches = (
-                SearchHistory.objects.values("query").annotate(count=Count("query")).order_by("-count")[:5]
-            )
-            popular_searches_list = list(popular_searches.values("query", "count"))
-            return Response({"popular_searches_list": popular_searches_list})
-        except Exception as e:
-            return Response({"error": str(e)})
+            limit = max(1, min(int(request.query_params.get("limit", 10)), 50))
+        except ValueError:
+            limit = 10
+        suggestions = autocomplete_index.search(request.query_params.get("q", ""), limit, get_language_code())
+        return Response({"suggestions": suggestions})
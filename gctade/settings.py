@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -35,6 +36,7 @@ DJANGO_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'core.apps.CoreConfig',
 ]
 CUSTOM_APPS = ["apps.product", "apps.bot"]
@@ -49,6 +51,7 @@ THIRD_PARTY_APPS = [
 INSTALLED_APPS = THIRD_PARTY_APPS + DJANGO_APPS + CUSTOM_APPS
 
 MIDDLEWARE = [
+    'apps.common.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -94,6 +97,44 @@ DATABASES = {
     }
 }
 
+REDIS_URL = "redis://localhost:6379/1"
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": REDIS_URL,
+    }
+}
+
+PRODUCT_VIEW_BUFFER = "apps.product.tracking.RedisViewBuffer"
+# Route the fingerprint-scoped endpoints to the async views in apps/product/async_views.py. Only worth turning on
+# (ASYNC_FINGERPRINT_VIEWS=1) for deployments served by an ASGI server through gctade/asgi.py.
+ASYNC_FINGERPRINT_VIEWS = os.environ.get("ASYNC_FINGERPRINT_VIEWS") == "1"
+ASYNC_DB_CONCURRENCY = 20
+AUTOCOMPLETE_REFRESH_INTERVAL = 30
+AUTOCOMPLETE_MAX_AGE = 15 * 60
+PRODUCT_FEED_CHUNK_SIZE = 1000
+PRODUCT_FEED_MAX_ROWS = 50000
+
+METRICS_ALLOWED_IPS = ("127.0.0.1",)
+
+REST_FRAMEWORK = {
+    "DEFAULT_RENDERER_CLASSES": (
+        "apps.common.metrics.TimedJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
+}
+
+# Log SQL that repeats N_PLUS_ONE_THRESHOLD or more times within one request, with the lines that issued it.
+N_PLUS_ONE_DETECTION = False
+N_PLUS_ONE_THRESHOLD = 5
+
+TELEGRAM_API_URL = "https://api.telegram.org"
+TELEGRAM_TIMEOUT = 10
+TELEGRAM_BOT_TOKEN = os.environ.get("TELEGRAM_BOT_TOKEN", "")
+TELEGRAM_CHANNEL_ID = os.environ.get("TELEGRAM_CHANNEL_ID", "")
+OUTBOX_TRANSPORT = "apps.bot.utils.TelegramTransport"
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -138,6 +179,13 @@ STATIC_ROOT = BASE_DIR / "static"
 
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
+
+# Resized WebP/JPEG copies of uploaded images, written under MEDIA_ROOT/IMAGE_DERIVATIVE_DIR. The web server should
+# serve them straight from disk and fall back to Django (try_files) for variants that were not rendered yet.
+IMAGE_DERIVATIVE_DIR = "derivatives"
+IMAGE_DERIVATIVE_WIDTHS = (320, 640, 1024, 1600)
+IMAGE_DERIVATIVE_QUALITY = 80
+IMAGE_DERIVATIVE_WORKERS = 2
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
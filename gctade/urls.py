@@ -14,11 +14,17 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
 
+from apps.common.images import serve_derivative
+from apps.common.metrics import metrics_view
+
 urlpatterns = [
+    path(f"{settings.MEDIA_URL.lstrip('/')}{settings.IMAGE_DERIVATIVE_DIR}/<path:name>", serve_derivative),
     path("ckeditor/", include("ckeditor_uploader.urls")),
     path('admin/', admin.site.urls),
-    path('product/', include('apps.product.urls'))
+    path('product/', include('apps.product.urls')),
+    path("metrics", metrics_view),
 ]